@@ -0,0 +1,5 @@
+import sys
+
+# dataclass(slots=True) w app/core/fsm.py — na starszym Pythonie import i tak by padł, tylko mniej czytelnie
+if sys.version_info < (3, 10):
+    raise RuntimeError(f"Python 3.10+ is required (running {sys.version.split()[0]})")
@@ -1,5 +1,8 @@
+from typing import Optional
 from pydantic import BaseModel, Field
 
 class WebhookIn(BaseModel):
     session_id: str = Field(min_length=1, max_length=128)
     message: str = Field(min_length=1, max_length=2000)
+    # opcjonalny identyfikator wiadomości — ponowiony request z tym samym id dostaje zapamiętaną odpowiedź
+    message_id: Optional[str] = Field(default=None, max_length=128)
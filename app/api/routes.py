@@ -1,9 +1,11 @@
 from fastapi import APIRouter
 from .webhook_tawk import router as tawk_router
+from .routes_metrics import router as metrics_router
 import os
 
 router = APIRouter()
 router.include_router(tawk_router)
+router.include_router(metrics_router)
 
 if os.getenv("APP_ENV","dev") == "dev":
     from .routes_debug import router as debug_router
@@ -1,7 +1,14 @@
 import os
-from fastapi import APIRouter
-from app.services.sd_api import fetch_devices_raw, get_last_fetch_log
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.services.sd_api import fetch_devices_raw, get_fetch_log, get_last_fetch_log, get_breaker_state
 from app.services.recommender import _inventory  # użyjemy tej samej normalizacji
+from app.services.inventory import get_snapshot
+from app.db.repo import stats_all
+from app.api.webhook_tawk import _dedup, get_engine
+from app.core.ratelimit import stats_all as ratelimit_stats
+from app.core import tracing
+from app.core.profiling import MODES as PROFILE_MODES, PROFILER
 
 router = APIRouter(prefix="/debug", tags=["debug"])
 
@@ -63,5 +70,64 @@ def clean_norm():
     return {"count": len(items), "items": show}
 
 @router.get("/fetch-log")
-def fetch_log():
-    return {"tries": get_last_fetch_log()}
+def fetch_log(all: bool = False):
+    # domyślnie próby najnowszego fetcha; all=true — wszystkie zapamiętane (pole "fetch" je grupuje)
+    return {"tries": get_fetch_log() if all else get_last_fetch_log()}
+
+@router.get("/breaker")
+def breaker():
+    return get_breaker_state()
+
+@router.get("/inventory")
+def inventory_meta():
+    return get_snapshot().meta()
+
+@router.get("/sessions")
+def sessions():
+    # live, limity i liczniki wyrzuconych sesji per repozytorium + paski locków sesji
+    return {"repos": stats_all(), "locks": get_engine().locks.stats()}
+
+@router.get("/ratelimit")
+def ratelimit():
+    # kubełki per IP i per sesja: dozwolone/odrzucone, klucze w pamięci, sprzątnięte
+    return {"limiters": ratelimit_stats()}
+
+@router.get("/dedup")
+def dedup():
+    # ponowione webhooki: trafienia = odpowiedzi z cache bez ruszania FSM
+    return _dedup.stats()
+
+@router.get("/traces")
+def traces(session_id: Optional[str] = None, limit: int = Query(default=50, ge=1, le=1000)):
+    # próbkowane ślady tur (TRACE_SAMPLE_RATE), najnowsze pierwsze
+    return {**tracing.stats(), "traces": tracing.recent(session_id, limit)}
+
+@router.post("/profile")
+def profile_start(mode: str = Query(default="cprofile", enum=list(PROFILE_MODES)),
+                  requests: int = Query(default=100, ge=1, le=10000),
+                  seconds: float = Query(default=30.0, gt=0, le=600),
+                  interval_ms: float = Query(default=5.0, ge=1, le=1000)):
+    # profiluje następne `requests` tur webhooka albo `seconds` sekund (co pierwsze); tura batcha = jedna tura
+    try:
+        return PROFILER.start(mode, requests, seconds, interval_ms)
+    except ValueError as e:
+        # enum= w Query to tylko opis w OpenAPI — FastAPI trybu nie sprawdza
+        raise HTTPException(status_code=422, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/profile")
+def profile_report(top: int = Query(default=30, ge=1, le=500)):
+    # raport bieżącej (częściowy) albo ostatniej sesji: etapy handle_message + gorące funkcje
+    report = PROFILER.report(top)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No profiling session yet (POST /debug/profile)")
+    return report
+
+@router.delete("/profile")
+def profile_stop(top: int = Query(default=30, ge=1, le=500)):
+    PROFILER.stop()
+    report = PROFILER.report(top)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No profiling session yet (POST /debug/profile)")
+    return report
@@ -0,0 +1,40 @@
+import time
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.api.webhook_tawk import _dedup
+from app.core.metrics import render
+from app.core.ratelimit import stats_all as ratelimit_stats
+from app.db.repo import stats_all as session_stats
+from app.services.inventory import current_snapshot
+
+router = APIRouter(tags=["metrics"])
+
+def _gauges():
+    # liczone przy scrape'ie z tego, co moduły i tak trzymają — nic nie dokłada kosztu do requestów
+    sessions = session_stats()
+    limiters = ratelimit_stats()
+    snap = current_snapshot()
+    dedup = _dedup.stats()
+    age = time.time() - snap.fetched_at if snap.fetched_at else float("nan")
+    return [
+        ("bot_sessions_live", "Live conversation sessions per repository.", "gauge",
+         [({"backend": st["backend"]}, st["live"]) for st in sessions]),
+        ("bot_rate_limit_rejected_total", "Requests rejected by the rate limiter.", "counter",
+         [({"limiter": st["name"]}, st["rejected"]) for st in limiters]),
+        ("bot_rate_limit_allowed_total", "Requests allowed by the rate limiter.", "counter",
+         [({"limiter": st["name"]}, st["allowed"]) for st in limiters]),
+        ("bot_inventory_snapshot_age_seconds", "Seconds since the inventory snapshot was fetched from SD.", "gauge",
+         [({}, age)]),
+        ("bot_inventory_snapshot_items", "Devices in the current inventory snapshot.", "gauge",
+         [({}, len(snap.items))]),
+        ("bot_inventory_snapshot_version", "Version of the current inventory snapshot.", "gauge",
+         [({}, snap.version)]),
+        ("bot_inventory_snapshot_ok", "1 if the last inventory refresh succeeded.", "gauge",
+         [({}, int(snap.ok))]),
+        ("bot_webhook_dedup_total", "Idempotency cache lookups by result.", "counter",
+         [({"result": "hit"}, dedup["hits"]), ({"result": "miss"}, dedup["misses"])]),
+    ]
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render(_gauges()), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,20 +1,178 @@
+import logging
 import os
-from fastapi import APIRouter
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TYPE_CHECKING
+from fastapi import APIRouter, Header, HTTPException, Request
+from pydantic import ValidationError
 from app.api.models import WebhookIn
-from app.core.fsm import BotEngine
+from app.core.dedup import DedupCache
+from app.core.profiling import PROFILER
+from app.core.ratelimit import make_limiter
+from app.core.tracing import span, trace
+
+if TYPE_CHECKING:
+    from app.core.fsm import BotEngine
+
+log = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/webhook", tags=["webhook"])
-_engine = BotEngine()
+_engine: Optional["BotEngine"] = None
+_engine_lock = threading.Lock()
 DEV_SOFT_ERRORS = os.getenv("APP_ENV","dev") == "dev"
 
+# limit per rozmowa (obok limitu per IP w main.py) — jeden czat nie zaleje bota, nawet zza wspólnego IP;
+# domyślnie wyłączony (0), np. RATE_LIMIT_SESSION_MAX_REQUESTS=30 + RATE_LIMIT_SESSION_BURST=10
+SESSION_RATE_MAX = int(os.getenv("RATE_LIMIT_SESSION_MAX_REQUESTS", "0"))
+_session_limiter = (make_limiter("session", SESSION_RATE_MAX, int(os.getenv("RATE_LIMIT_WINDOW_SEC", "60")),
+                                 int(os.getenv("RATE_LIMIT_SESSION_BURST", "10")))
+                    if SESSION_RATE_MAX > 0 else None)
+
+# ponowione requesty (message_id / Idempotency-Key) — patrz app/core/dedup.py
+_dedup = DedupCache()
+
+# batch: różne sesje równolegle na osobnej puli (nie zajmujemy threadpoola FastAPI)
+BATCH_MAX = int(os.getenv("WEBHOOK_BATCH_MAX", "100"))
+_batch_pool = ThreadPoolExecutor(max_workers=max(1, int(os.getenv("WEBHOOK_BATCH_WORKERS", "8"))),
+                                 thread_name_prefix="webhook-batch")
+
+def get_engine() -> "BotEngine":
+    """
+    Silnik budowany przy pierwszym użyciu, nie przy imporcie modułu (parser,
+    slots.yaml, walidatory, repo sesji) — worker szybciej odpowiada na /health;
+    lifespan w main.py rozgrzewa go w tle.
+    """
+    global _engine
+    engine = _engine
+    if engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from app.core.fsm import BotEngine
+                _engine = BotEngine()
+            engine = _engine
+    return engine
+
+def _session_allow(sid: str) -> bool:
+    return _session_limiter is None or _session_limiter.allow("sid:" + sid)
+
+class _Granted:
+    """
+    Limit sesji dla grupy z batcha: żetony pobrane z góry jednym take()
+    (po jednym na wiadomość, która nie jest powtórką z dedup), tury
+    zużywają je po kolei; po wyczerpaniu 429.
+    """
+    __slots__ = ("left",)
+
+    def __init__(self, left: int):
+        self.left = left
+
+    def __call__(self, sid: str) -> bool:
+        if self.left <= 0:
+            return False
+        self.left -= 1
+        return True
+
+def _reply(sid: str, msg: str, key: Optional[str] = None,
+           admit: Callable[[str], bool] = _session_allow) -> Dict[str, Any]:
+    # profilowanie na żądanie (/debug/profile); wyłączone kosztuje odczyt jednego atrybutu
+    if PROFILER.active:
+        return PROFILER.run(_turn, sid, msg, key, admit)
+    return _turn(sid, msg, key, admit)
+
+def _turn(sid: str, msg: str, key: Optional[str], admit: Callable[[str], bool]) -> Dict[str, Any]:
+    # ślad tury (próbkowany, /debug/traces); czas poza handle_message = lock, dedup, limit
+    engine = get_engine()
+    with trace("webhook.turn", session_id=sid) as tr, engine.lock_for(sid):
+        # pod lockiem sesji: retry, który przyszedł, gdy oryginał jeszcze się liczył, poczeka i trafi w cache
+        if key:
+            cached = _dedup.get(sid, key)
+            if cached is not None:
+                tr.set(dedup="hit")
+                return cached
+        if not admit(sid):
+            tr.set(rate_limited=True)
+            raise HTTPException(status_code=429, detail="Too many requests")
+        try:
+            with span("handle_message"):
+                reply = engine.handle_message(sid, msg)
+        except Exception as e:
+            # błędów nie zapamiętujemy — ponowienie może się udać
+            if DEV_SOFT_ERRORS:
+                tr.set(error=type(e).__name__)
+                return {"reply": f"(dev) Error: {str(e)}"}
+            raise
+        result = {"reply": reply}
+        if key:
+            _dedup.put(sid, key, result)
+        return result
+
 @router.post("/tawk")
-def webhook_tawk(payload: WebhookIn):
+def webhook_tawk(payload: WebhookIn, idempotency_key: Optional[str] = Header(default=None, max_length=128)):
     msg = payload.message.strip()
     sid = payload.session_id.strip()
-    try:
-        reply = _engine.handle_message(sid, msg)
-        return {"reply": reply}
-    except Exception as e:
-        if DEV_SOFT_ERRORS:
-            return {"reply": f"(dev) Error: {str(e)}"}
-        raise
+    key = (payload.message_id or idempotency_key or "").strip()
+    return _reply(sid, msg, key or None)
+
+def _new_turns(sid: str, items: List[tuple]) -> int:
+    """Ile wiadomości grupy naprawdę trafi do FSM (bez powtórek z dedup i w obrębie batcha)."""
+    keys = {key for _, _, key in items if key}
+    return (sum(1 for _, _, key in items if not key)
+            + sum(1 for key in keys if _dedup.get(sid, key) is None))
+
+def _run_session(sid: str, items: List[tuple], results: List[Any]):
+    # cała grupa pod lockiem sesji — pojedynczy webhook tej sesji nie wejdzie w środek
+    with get_engine().lock_for(sid):
+        if _session_limiter is None:
+            admit = _Granted(len(items))
+        else:
+            admit = _Granted(_session_limiter.take("sid:" + sid, _new_turns(sid, items)))
+        for i, msg, key in items:
+            try:
+                results[i] = _reply(sid, msg, key, admit)
+            except HTTPException as e:
+                results[i] = {"error": e.detail, "status": e.status_code}
+            except Exception:
+                # to, co pojedynczy webhook oddałby jako 500 — tylko ten element
+                log.exception("webhook batch: item %d (session %s) failed", i, sid)
+                results[i] = {"error": "Internal Server Error", "status": 500}
+
+@router.post("/tawk/batch")
+def webhook_tawk_batch(payload: List[Any], request: Request):
+    """
+    Wiele wiadomości w jednym requeście (replay po awarii, import
+    transkryptów). W obrębie sesji kolejność z wejścia, różne sesje
+    równolegle; wyniki w kolejności wejścia, każdy jak z /tawk, a błąd
+    elementu (też walidacji — 422 w jego wyniku) nie psuje reszty.
+    Limity jak dla osobnych requestów: żeton IP i żeton sesji za każdy
+    element (powtórki z dedup nie płacą limitu sesji); elementy ponad
+    limit dostają 429. Idempotencja tylko po message_id elementów (jeden
+    nagłówek nie pasuje do wielu).
+    """
+    if len(payload) > BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Too many items (max {BATCH_MAX})")
+    results: List[Any] = [None] * len(payload)
+    # jeden żeton IP pobrał middleware za request, reszta za kolejne elementy — od końca odpadają nadmiarowe
+    ip_limit = getattr(request.state, "ip_limit", None)
+    admitted = len(payload)
+    if ip_limit is not None and len(payload) > 1:
+        limiter, ip_key = ip_limit
+        admitted = 1 + limiter.take(ip_key, len(payload) - 1)
+    groups: Dict[str, List[tuple]] = {}
+    for i, raw in enumerate(payload):
+        if i >= admitted:
+            results[i] = {"error": "Too many requests", "status": 429}
+            continue
+        try:
+            item = WebhookIn.model_validate(raw)
+        except ValidationError as e:
+            results[i] = {"error": e.errors(include_url=False, include_context=False), "status": 422}
+            continue
+        key = (item.message_id or "").strip() or None
+        groups.setdefault(item.session_id.strip(), []).append((i, item.message.strip(), key))
+    if len(groups) <= 1:
+        for sid, items in groups.items():
+            _run_session(sid, items, results)
+    else:
+        for f in [_batch_pool.submit(_run_session, sid, items, results) for sid, items in groups.items()]:
+            f.result()
+    return {"results": results}
@@ -0,0 +1,80 @@
+"""
+Idempotencja webhooka: Tawk ponawia request po timeoucie, a
+handle_message nie jest idempotentne (powtórzone "yes" przesuwa FSM
+i nabija turns). Klient podaje message_id w body albo nagłówek
+Idempotency-Key; ostatnie odpowiedzi trzymamy per (session_id, klucz)
+i duplikat dostaje tę samą odpowiedź w O(1), bez dotykania silnika.
+
+Cache ograniczony: wpis żyje WEBHOOK_DEDUP_TTL_SEC (retry przychodzą
+w sekundach, nie godzinach), a powyżej WEBHOOK_DEDUP_MAX wypadają
+najstarsze. TTL jest stały, więc kolejność wstawiania = kolejność
+wygasania i sprzątanie to zdejmowanie z początku OrderedDict.
+Cache jest per proces — jak LRU sesji, zakłada sticky routing po
+session_id przy kilku workerach.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    DEDUP_TTL_SEC = float(os.getenv("WEBHOOK_DEDUP_TTL_SEC", "600"))
+except Exception:
+    DEDUP_TTL_SEC = 600.0
+try:
+    DEDUP_MAX = int(os.getenv("WEBHOOK_DEDUP_MAX", "100000"))
+except Exception:
+    DEDUP_MAX = 100000
+
+
+class DedupCache:
+    def __init__(self, ttl_sec: float = DEDUP_TTL_SEC, max_entries: int = DEDUP_MAX):
+        self.ttl_sec = max(0.0, ttl_sec)
+        self.max_entries = max(1, max_entries)
+        # (session_id, klucz) -> (kiedy wygasa, odpowiedź)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted_ttl = 0
+        self.evicted_cap = 0
+
+    def get(self, session_id: str, key: str, now: Optional[float] = None) -> Optional[Any]:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get((session_id, key))
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, session_id: str, key: str, value: Any, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        entries = self._entries
+        with self._lock:
+            self._expire(now)
+            k = (session_id, key)
+            entries.pop(k, None)
+            entries[k] = (now + self.ttl_sec, value)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evicted_cap += 1
+
+    def _expire(self, now: float):
+        entries = self._entries
+        while entries:
+            k, (expires, _) = next(iter(entries.items()))
+            if expires > now:
+                return
+            del entries[k]
+            self.evicted_ttl += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl_sec": self.ttl_sec,
+                "hits": self.hits, "misses": self.misses,
+                "evicted_ttl": self.evicted_ttl, "evicted_cap": self.evicted_cap}
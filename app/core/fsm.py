@@ -1,13 +1,17 @@
-import os, time
-from dataclasses import dataclass, field
-from typing import Dict, Any
+import os, sys, time, logging
+from time import perf_counter
+from dataclasses import dataclass, field, fields
+from typing import Dict, Any, Optional
 import regex as re
 
-from .slots import Slots
+from .locks import StripedLocks
+from .metrics import STAGE_SECONDS
+from .tracing import span
+from .slots import MISSING, SlotData, SlotLayout, Slots, default_layout
 from .parsers import parse_message, try_coerce_quantity_loose
-from .validators import validate_slot
 from app.services.recommender import suggest_devices
 from app.services.summarizer import render_summary
+from app.db.repo import SessionRepo, make_repo
 
 # Konfiguracje
 try:
@@ -27,10 +31,23 @@ RESET_RE = re.compile(r"^\s*(reset|restart|new|start over)\s*$", re.I)
 
 NOW_EPOCH = lambda: int(time.time())
 
-@dataclass
+log = logging.getLogger(__name__)
+
+_PARSE_SECONDS = STAGE_SECONDS.labels("parse_message")
+_SLOT_LOOP_SECONDS = STAGE_SECONDS.labels("slot_loop")
+_SUGGEST_SECONDS = STAGE_SECONDS.labels("suggest_devices")
+_SUMMARY_SECONDS = STAGE_SECONDS.labels("render_summary")
+
+# slots=True wymaga Pythona 3.10+ (sprawdzane w app/__init__.py)
+@dataclass(slots=True)
 class SessionState:
+    """
+    Stan rozmowy. Zwarty, bo żywych sesji bywa dużo: __slots__ zamiast
+    __dict__, wartości slotów w SlotData (lista w układzie Slots.order,
+    widok dict-like), `validated` jako maska bitowa w tym samym układzie.
+    """
     intent: str = "device_rental"
-    data: Dict[str, Any] = field(default_factory=dict)
+    data: SlotData = field(default_factory=SlotData)
     current_slot: str = "platform"
     last_prompted: str = "platform"
     errors_in_row: int = 0
@@ -38,38 +55,95 @@ class SessionState:
     confirmed: bool = False
     turns: int = 0
     updated_at: int = field(default_factory=NOW_EPOCH)
+    # bity slotów sprawdzonych w poprzednich turach, których wartości (ani zależności) od tamtej pory nie ruszano
+    validated: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Kopia do zapisu (JSON) — bez referencji do mutowanego stanu."""
+        d = {name: getattr(self, name) for name in _STATE_FIELDS}
+        # wartości slotów to str/int albo listy (accessories); asdict() z deepcopy jest ~5x wolniejsze
+        d["data"] = {k: list(v) if isinstance(v, list) else v for k, v in self.data.items()}
+        # po nazwach, nie bitach — układ może się zmienić między wersjami slots.yaml
+        d["validated"] = self.data.layout.names_of(self.validated)
+        return d
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], layout: Optional[SlotLayout] = None) -> "SessionState":
+        # nieznane klucze (np. ze starszej/nowszej wersji) pomijamy, brakujące biorą domyślne
+        kw = {k: v for k, v in d.items() if k in _STATE_FIELDS}
+        layout = layout if layout is not None else default_layout()
+        kw["data"] = SlotData(layout, kw.get("data") or {})
+        kw["validated"] = layout.mask(kw.get("validated") or ())
+        for k in ("intent", "current_slot", "last_prompted"):
+            if isinstance(kw.get(k), str):
+                kw[k] = sys.intern(kw[k])
+        return cls(**kw)
+
+    def relayout(self, layout: SlotLayout):
+        """Przepina stan na inny układ slotów (np. po przeładowaniu slots.yaml)."""
+        old = self.data.layout
+        self.data = SlotData(layout, dict(self.data))
+        self.validated = layout.mask(old.names_of(self.validated))
+
+_STATE_FIELDS = frozenset(f.name for f in fields(SessionState))
 
 class BotEngine:
-    def __init__(self):
-        self.sessions: Dict[str, SessionState] = {}
+    def __init__(self, sessions: Optional[SessionRepo] = None):
+        # SESSION_STORE=memory|sqlite — patrz app/db/repo.py
+        self.sessions: SessionRepo = (sessions if sessions is not None
+                                      else make_repo(SessionState.from_dict, ttl_sec=SESSION_TTL_MIN * 60))
+        # wiadomości jednej sesji po kolei, różnych sesji równolegle — patrz app/core/locks.py
+        self.locks = StripedLocks()
         self.slots = Slots.load()
         self.supported_locations = [v for v in self.slots.defs["location"]["values"] if v != "Other"]
 
     def _expired(self, s: SessionState) -> bool:
         return (NOW_EPOCH() - s.updated_at) > (SESSION_TTL_MIN * 60)
 
+    def _new_state(self) -> SessionState:
+        order = self.slots.order
+        return SessionState(data=SlotData(self.slots.layout), current_slot=order[0], last_prompted=order[0])
+
     def _get(self, session_id: str) -> SessionState:
         s = self.sessions.get(session_id)
         if s is None or self._expired(s) or s.turns > MAX_TURNS:
-            order = self.slots.order
-            s = SessionState(current_slot=order[0], last_prompted=order[0])
-            self.sessions[session_id] = s
+            s = self._new_state()
+        elif s.data.layout is not self.slots.layout:
+            # stan z repozytorium zbudowany na innym układzie — bity validated muszą pasować do naszego
+            s.relayout(self.slots.layout)
         return s
 
     def _bump(self, s: SessionState):
         s.turns += 1
         s.updated_at = NOW_EPOCH()
 
+    def lock_for(self, session_id: str):
+        """Lock sesji (RLock z paska) — do objęcia kilku wywołań handle_message jedną sekcją."""
+        return self.locks.lock_for(session_id)
+
     def handle_message(self, session_id: str, text: str) -> str:
-        s = self._get(session_id)
+        lock = self.locks.acquire(session_id)
+        try:
+            return self._handle(session_id, text)
+        finally:
+            lock.release()
+
+    def _handle(self, session_id: str, text: str) -> str:
         raw = (text or "").strip()
 
         # reset
         if RESET_RE.match(raw):
-            order = self.slots.order
-            self.sessions[session_id] = SessionState(current_slot=order[0], last_prompted=order[0])
+            self.sessions.put(session_id, self._new_state())
             return "Session reset. Which platform do you need: Android or iOS? (type 'reset' anytime)"
 
+        s = self._get(session_id)
+        try:
+            return self._advance(session_id, s, raw)
+        finally:
+            # stan jest mutowany w miejscu, także gdy po drodze poleci wyjątek
+            self.sessions.put(session_id, s)
+
+    def _advance(self, session_id: str, s: SessionState, raw: str) -> str:
         # confirm
         if s.current_slot == "confirm":
             self._bump(s)
@@ -82,36 +156,86 @@ class BotEngine:
                 return "No problem. You can restart anytime."
             return "Please answer Yes/No to confirm."
 
+        # skompilowane walidatory (Slots.load) — slot -> callable(value)
+        valid_for = self.slots.validators
+
         # pasywna ekstrakcja
-        extracted = parse_message(raw, self.slots)
+        with span("parse_message", expecting=s.current_slot):
+            t0 = perf_counter()
+            extracted = parse_message(raw, self.slots, expecting=s.current_slot)
+            _PARSE_SECONDS.observe(perf_counter() - t0)
+        changed = set()
         for k, v in extracted.items():
             if v is None: continue
-            if k in s.data and validate_slot(k, s.data[k], self.slots):
+            if k in s.data and valid_for[k](s.data[k]):
                 if k == "accessories" and isinstance(v, list):
                     prev = s.data.get(k) or []
                     s.data[k] = sorted(list(set(prev + v)))
+                    changed.add(k)
                 continue
             s.data[k] = v
+            changed.add(k)
 
         # ilość – tryb luźny
         if s.current_slot == "quantity":
-            if ("quantity" not in s.data) or (not validate_slot("quantity", s.data.get("quantity"), self.slots)):
+            if ("quantity" not in s.data) or (not valid_for["quantity"](s.data.get("quantity"))):
                 q = try_coerce_quantity_loose(raw)
                 if q is not None:
                     s.data["quantity"] = q
+                    changed.add("quantity")
+
+        # zmienione sloty + zależne od nich (depends_on) trzeba sprawdzić od nowa
+        if changed:
+            s.validated &= ~self.slots.invalidated_by(changed)
+
+        with span("slot_loop") as sp:
+            t0 = perf_counter()
+            reply = self._walk_slots(s, raw, extracted, valid_for)
+            _SLOT_LOOP_SECONDS.observe(perf_counter() - t0)
+            sp.set(next_slot=s.current_slot)
+        if reply is not None:
+            return reply
+
+        # wszystkie sloty gotowe — summary + rekomendacje
+        s.current_slot = "confirm"
+        self._bump(s)
+        with span("suggest_devices") as sp:
+            t0 = perf_counter()
+            rec = suggest_devices(s.data)
+            _SUGGEST_SECONDS.observe(perf_counter() - t0)
+            sp.set(status=rec.get("status"))
+        with span("render_summary"):
+            t0 = perf_counter()
+            pretty = render_summary(s.data, rec)
+            _SUMMARY_SECONDS.observe(perf_counter() - t0)
+        inv = rec.get("inventory") or {}
+        log.info("summary session=%s status=%s inventory_version=%s inventory_age=%s",
+                 session_id, rec.get("status"), inv.get("version"), inv.get("age_sec"))
+        return pretty + "\nPlease confirm (Yes/No)."
 
-        # pętla slotów
-        for slot in self.slots.order:
+    def _walk_slots(self, s: SessionState, raw: str, extracted: Dict[str, Any], valid_for) -> Optional[str]:
+        """Prompt dla pierwszego slotu, o który trzeba zapytać; None, gdy wszystkie gotowe."""
+        # pętla slotów — tylko po bitach tego, co jeszcze nie przeszło albo się zmieniło
+        # indeks bitu = pozycja w order = indeks w s.data.by_index (wspólny SlotLayout)
+        order, values = self.slots.order, s.data.by_index
+        pending = self.slots.order_mask & ~s.validated
+        while pending:
+            bit = pending & -pending
+            pending ^= bit
+            i = bit.bit_length() - 1
+            slot = order[i]
             defs = self.slots.defs.get(slot, {})
             required = bool(defs.get("required", False))
-            present = slot in s.data
-            valid = validate_slot(slot, s.data.get(slot), self.slots) if present else False
+            value = values[i]
+            present = value is not MISSING
+            valid = valid_for[slot](value) if present else False
 
             # vpn_ok — tylko gdy location == Other
             if slot == "vpn_ok":
                 loc = str(s.data.get("location","")).strip()
                 if loc and loc != "Other":
                     s.data["vpn_ok"] = "N/A"
+                    s.validated |= bit
                     continue
                 required = True
                 if s.last_prompted == "vpn_ok" and not present:
@@ -141,6 +265,9 @@ class BotEngine:
                         if UNK_RE.search(raw) or NO_RE.match(raw):
                             s.data["need_os_version"] = "No"
                             s.data["os_version"] = ""
+                            # gate zmieniony wstecz — sprawdzimy go w następnej turze
+                            # (os_version liczony już tu z nowym gate)
+                            s.validated &= ~self.slots.bit("need_os_version")
                             present = True; valid = True; required = False
                         else:
                             m = BARE_INT_RE.match(raw)
@@ -149,9 +276,10 @@ class BotEngine:
                                 if plat:
                                     s.data["os_version"] = f"{plat} {m.group(1)}"
                                     present = True
-                                    valid = validate_slot("os_version", s.data["os_version"], self.slots)
+                                    valid = valid_for["os_version"](s.data["os_version"])
                 else:
                     s.data["os_version"] = ""
+                    s.validated |= bit
                     continue
 
             # czy pytać?
@@ -167,7 +295,7 @@ class BotEngine:
                 self._bump(s)
 
                 # dynamiczne prompty
-                if slot == "device_model" and "device_model" in extracted and not validate_slot("device_model", s.data.get("device_model"), self.slots):
+                if slot == "device_model" and "device_model" in extracted and not valid_for["device_model"](s.data.get("device_model")):
                     s.errors_in_row += 1
                     platform = (s.data.get("platform") or "").lower()
                     if s.errors_in_row == 1:
@@ -186,6 +314,7 @@ class BotEngine:
                     else:
                         s.data["device_model"] = "TBD"
                         s.errors_in_row = 0
+                        s.validated |= bit
                         continue
 
                 if slot == "vpn_ok":
@@ -199,9 +328,6 @@ class BotEngine:
                     return "Which OS version do you need? (e.g., iOS 17)" if plat=="ios" else "Which OS version do you need? (e.g., Android 14)"
                 return self.slots.prompt_for(slot)
 
-        # wszystkie sloty gotowe — summary + rekomendacje
-        s.current_slot = "confirm"
-        self._bump(s)
-        rec = suggest_devices(s.data)
-        pretty = render_summary(s.data, rec)
-        return pretty + "\nPlease confirm (Yes/No)."
+            # slot przeszedł — do czasu zmiany jego wartości (lub zależności) nie sprawdzamy go ponownie
+            s.validated |= bit
+        return None
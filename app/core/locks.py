@@ -0,0 +1,44 @@
+"""
+Blokady per sesja dla BotEngine.handle_message.
+
+webhook_tawk to handler sync, więc FastAPI puszcza go w threadpoolu: dwie
+wiadomości z tym samym session_id mogłyby mutować ten sam SessionState
+naraz (albo zgubić zapis — get/put w repozytorium to nie transakcja).
+Jeden globalny lock serializowałby za to wszystkie rozmowy.
+
+Stała tablica SESSION_LOCK_STRIPES locków, sesja -> hash(session_id) % N:
+wiadomości jednej sesji idą po kolei, różne sesje równolegle (poza
+rzadkimi kolizjami w tym samym pasku). Pamięć nie rośnie z liczbą sesji
+i nie ma czego sprzątać przy ich wygasaniu. RLock, żeby kod trzymający
+lock_for(sid) (np. kilka wiadomości sesji w jednej paczce) mógł wołać
+handle_message bez zakleszczenia.
+"""
+import os
+import threading
+from typing import Any, Dict
+
+try:
+    SESSION_LOCK_STRIPES = max(1, int(os.getenv("SESSION_LOCK_STRIPES", "256")))
+except Exception:
+    SESSION_LOCK_STRIPES = 256
+
+
+class StripedLocks:
+    def __init__(self, stripes: int = SESSION_LOCK_STRIPES):
+        self._locks = tuple(threading.RLock() for _ in range(max(1, stripes)))
+        # ile razy trzeba było czekać na cudzy lock — tylko do /debug, bez własnej synchronizacji
+        self.contended = 0
+
+    def lock_for(self, session_id: str) -> threading.RLock:
+        # hash() stringów jest losowany per proces, ale w obrębie procesu stały — tyle wystarczy
+        return self._locks[hash(session_id) % len(self._locks)]
+
+    def acquire(self, session_id: str) -> threading.RLock:
+        lock = self.lock_for(session_id)
+        if not lock.acquire(blocking=False):
+            self.contended += 1
+            lock.acquire()
+        return lock
+
+    def stats(self) -> Dict[str, Any]:
+        return {"stripes": len(self._locks), "contended": self.contended}
@@ -0,0 +1,176 @@
+"""
+Metryki w formacie tekstowym Prometheusa (bez prometheus_client).
+
+Obserwacje idą na gorącej ścieżce każdej tury, więc bez locków: każdy
+wątek ma własny shard (listę liczników), do którego pisze tylko on.
+Shard powstaje raz na wątek (wtedy krótki lock na rejestrację), potem
+observe() to bisect + dwie inkrementacje w istniejącej liście. Odczyt
+(/metrics) sumuje shardy bez zatrzymywania piszących — przy scrape'ie
+w trakcie obserwacji licznik i suma mogą się rozjechać o jedną próbkę.
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# sekundy: od pojedynczych mikrosekund (walidacja, parser) po timeouty SD
+DEFAULT_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (nazwa, help, typ, [(etykiety, wartość)]) — rodzina metryk gotowa do wypisania
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _num(v: float) -> str:
+    if isinstance(v, float):
+        if v != v:
+            return "NaN"
+        if v in (float("inf"), float("-inf")):
+            return "+Inf" if v > 0 else "-Inf"
+        return repr(v)
+    return str(v)
+
+
+class _Sharded:
+    """Per-wątkowe shardy tworzone przez _new_shard()."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = self._new_shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _new_shard(self):
+        raise NotImplementedError
+
+    def _all_shards(self) -> List:
+        with self._shards_lock:
+            return list(self._shards)
+
+
+class Histogram(_Sharded):
+    """Shard: [licznik kubełka 0..n-1, licznik +Inf, suma]."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__()
+        self.bounds = tuple(sorted(buckets))
+        self._n = len(self.bounds) + 1
+
+    def _new_shard(self) -> List[float]:
+        return [0] * self._n + [0.0]
+
+    def observe(self, seconds: float):
+        shard = self._shard()
+        # bisect_left: wartość równa granicy trafia do kubełka "le" tej granicy
+        shard[bisect_left(self.bounds, seconds)] += 1
+        shard[-1] += seconds
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        counts = [0] * self._n
+        total = 0.0
+        for shard in self._all_shards():
+            for i in range(self._n):
+                counts[i] += shard[i]
+            total += shard[-1]
+        return counts, total
+
+
+class HistogramFamily:
+    """Histogramy jednej metryki różniące się etykietą (np. stage)."""
+
+    def __init__(self, name: str, help: str, label: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.label = name, help, label
+        self.buckets = tuple(buckets)
+        self._children: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def labels(self, value: str) -> Histogram:
+        # dziecko bierzemy raz (przy imporcie modułu), nie przy każdej obserwacji
+        with self._lock:
+            h = self._children.get(value)
+            if h is None:
+                h = self._children[value] = Histogram(self.buckets)
+            return h
+
+    def collect(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for value, h in children:
+            counts, total = h.snapshot()
+            cum = 0
+            for bound, c in zip(h.bounds + (float("inf"),), counts):
+                cum += c
+                out.append(f"{self.name}_bucket{_labels({self.label: value, 'le': _num(bound)})} {cum}")
+            out.append(f"{self.name}_sum{_labels({self.label: value})} {_num(total)}")
+            out.append(f"{self.name}_count{_labels({self.label: value})} {cum}")
+        return out
+
+
+class LabeledCounter(_Sharded):
+    """Licznik z etykietami; shard to dict etykiety -> liczba (nowy klucz = jedyna alokacja)."""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...]):
+        super().__init__()
+        self.name, self.help, self.labelnames = name, help, labelnames
+        _REGISTRY.append(self)
+
+    def _new_shard(self) -> Dict[tuple, int]:
+        return {}
+
+    def inc(self, *labels, amount: int = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def totals(self) -> Dict[tuple, int]:
+        out: Dict[tuple, int] = {}
+        for shard in self._all_shards():
+            # kopia — wątek-właściciel może właśnie dokładać klucz
+            for k, v in list(shard.items()):
+                out[k] = out.get(k, 0) + v
+        return out
+
+    def collect(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, v in sorted(self.totals().items(), key=lambda kv: tuple(map(str, kv[0]))):
+            out.append(f"{self.name}{_labels(dict(zip(self.labelnames, map(str, labels))))} {v}")
+        return out
+
+
+_REGISTRY: List = []
+
+STAGE_SECONDS = HistogramFamily(
+    "bot_stage_seconds", "Time spent in message handling stages and SD inventory fetches.", "stage")
+SD_FETCH_ATTEMPTS = LabeledCounter(
+    "bot_sd_fetch_attempts_total", "SD inventory fetch attempts by URL and status.", ("url", "status"))
+
+
+def render(extra: Optional[Iterable[Family]] = None) -> str:
+    """Wszystkie zarejestrowane metryki + rodziny policzone przy scrape'ie (gauge'e, liczniki z innych modułów)."""
+    lines: List[str] = []
+    for metric in list(_REGISTRY):
+        lines.extend(metric.collect())
+    for name, help, typ, samples in extra or ():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {typ}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(labels)} {_num(value)}")
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,7 @@
 import regex as re
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
 from .slots import Slots
+from app.services.recommender import model_index
 
 EMAIL_RE = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.I)
 DATE_RANGE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})\s*(?:to|→|-|–|\s)\s*(\d{4}-\d{2}-\d{2})", re.I)
@@ -22,16 +23,91 @@ COUNTRY_MAP = {
 NUMBER_WORDS = { "one":1,"two":2,"three":3,"four":4,"five":5,"six":6,"seven":7,"eight":8,"nine":9,"ten":10 }
 NUMWORD_RE = re.compile(r"\b(" + "|".join(NUMBER_WORDS.keys()) + r")\b", re.I)
 
-def parse_message(text: str, slots: Slots) -> Dict[str, Any]:
+OS_VERSION_RE = re.compile(r"\b(android|ios)\s*([0-9]{1,2})\b", re.I)
+WS_RE = re.compile(r"\s+")
+DIGIT_RE = re.compile(r"\d")
+
+# słowa wskazujące iOS — łapane także w środku słowa (jak dawniej: "iphone15")
+IOS_INFIX = ("iphone", "ipad", "apple")
+_INFIX_RE = {w: re.compile(re.escape(w), re.I) for w in IOS_INFIX}
+
+# znaki spoza ASCII, które regex z re.I utożsamia z literą ASCII, a str.lower() nie
+# ("İ".lower() to dwa znaki) — wyliczone przeglądem całego Unicode dla modułu regex
+_FOLD_CHARS = (("\u0130", "i"), ("\u017f", "s"), ("\u212a", "k"))
+
+def _fold(t: str) -> str:
+    """
+    Tekst do tanich testów podciągów: jeśli r"kw" z re.I pasuje gdzieś w t
+    (kw w ASCII), to kw.lower() jest podciągiem _fold(t). Odwrotnie nie musi.
+    """
+    if not t.isascii():
+        # str.replace jest dużo tańsze niż str.translate na długim tekście
+        for c, a in _FOLD_CHARS:
+            if c in t:
+                t = t.replace(c, a)
+    return t.lower()
+
+class _Extractor:
+    """
+    Skompilowany raz (na instancję Slots) ekstraktor słów kluczowych:
+    platforma, akcesoria, lokalizacje i "other". Wzorce kompilujemy raz,
+    a regex odpalamy tylko dla słów, które w ogóle są podciągiem tekstu
+    (`in` na str jest o rząd szybsze niż przejście regexem).
+    """
+
+    def __init__(self, slots: Slots):
+        self.slots = slots
+        self.acc_vals: List[str] = list(slots.defs.get("accessories", {}).get("values", []))
+        self.country_order: List[Tuple[str, str]] = [(k.lower(), v) for k, v in COUNTRY_MAP.items()]
+
+        words = ["android", "ios", "other"] + self.acc_vals + list(COUNTRY_MAP.keys())
+        self.patterns: Dict[str, Any] = {}
+        for w in words:
+            self.patterns.setdefault(w.lower(), re.compile(rf"\b{re.escape(w)}\b", re.I))
+        # słowa spoza ASCII — tu _fold() nie daje gwarancji, zawsze regex
+        self.always = frozenset(w for w in self.patterns if not w.isascii())
+
+    def keywords(self, t: str, folded: str) -> set:
+        found = {w for w, pat in self.patterns.items()
+                 if (w in folded or w in self.always) and pat.search(t)}
+        # infiksy iOS: w tekście ASCII podciąg wystarczy, inaczej potwierdza regex
+        ascii_text = t.isascii()
+        found.update(w for w in IOS_INFIX
+                     if w in folded and (ascii_text or _INFIX_RE[w].search(t)))
+        return found
+
+_EXTRACTOR: Optional[_Extractor] = None
+
+def _extractor(slots: Slots) -> _Extractor:
+    # Slots.load() przy przeładowaniu zwraca nowy obiekt — wtedy kompilujemy od nowa
+    global _EXTRACTOR
+    ex = _EXTRACTOR
+    if ex is None or ex.slots is not slots:
+        ex = _EXTRACTOR = _Extractor(slots)
+    return ex
+
+def _maybe(folded: str, *needles: str) -> bool:
+    return any(n in folded for n in needles)
+
+def parse_message(text: str, slots: Slots, expecting: Optional[str] = None) -> Dict[str, Any]:
+    """
+    expecting — slot, o który bot właśnie pyta; przy "device_model"
+    szukamy modelu z inwentarza także z literówkami.
+    """
     t = (text or "").strip()
     out: Dict[str, Any] = {}
+    ex = _extractor(slots)
+    # tanie testy przed regexami: podciągi w _fold(t) i obecność cyfr
+    low = _fold(t)
+    found = ex.keywords(t, low)
+    has_digit = DIGIT_RE.search(t) is not None
 
     # platform
-    if re.search(r"\bandroid\b", t, re.I): out["platform"] = "Android"
-    if re.search(r"\bios\b|iphone|ipad|apple", t, re.I): out["platform"] = "iOS"
+    if "android" in found: out["platform"] = "Android"
+    if "ios" in found or any(w in found for w in IOS_INFIX): out["platform"] = "iOS"
 
     # ilość (z kontekstem)
-    m = QTY_RE_1.search(t) or QTY_RE_2.search(t)
+    m = (QTY_RE_1.search(t) or QTY_RE_2.search(t)) if has_digit else None
     if m:
         try:
             q = int(m.group(1))
@@ -39,37 +115,44 @@ def parse_message(text: str, slots: Slots) -> Dict[str, Any]:
         except: pass
 
     # e-mail
-    m = EMAIL_RE.search(t)
+    m = EMAIL_RE.search(t) if "@" in t else None
     if m: out["contact_email"] = m.group(0)
 
     # zakres dat
-    m = DATE_RANGE_RE.search(t)
+    m = DATE_RANGE_RE.search(t) if has_digit and "-" in t else None
     if m:
         out["rental_dates"] = f"{m.group(1)} \u2192 {m.group(2)}"
 
-    # accessories
-    acc_vals = slots.defs.get("accessories", {}).get("values", [])
-    sel = [v for v in acc_vals if re.search(rf"\b{re.escape(v)}\b", t, re.I)]
+    # accessories (kolejność jak w slots.yaml)
+    sel = [v for v in ex.acc_vals if v.lower() in found]
     if sel: out["accessories"] = sel
 
     # os_version (np. Android 14 / iOS 17)
-    m = re.search(r"\b(android|ios)\s*([0-9]{1,2})\b", t, re.I)
+    m = OS_VERSION_RE.search(t) if has_digit and _maybe(low, "android", "ios") else None
     if m:
         out["os_version"] = f"{m.group(1).capitalize()} {m.group(2)}"
 
     # model (konkret) / IDK
-    m = DEVICE_PAT.search(t)
+    m = DEVICE_PAT.search(t) if _maybe(low, "pixel", "iphone", "galaxy") else None
+    models = model_index()
     if m:
-        out["device_model"] = re.sub(r"\s+", " ", m.group(0).strip()).title()
-    elif UNK_RE.search(t):
+        out["device_model"] = WS_RE.sub(" ", m.group(0).strip()).title()
+        # kanoniczna pisownia z inwentarza ("iphone15" -> "iPhone 15")
+        if models:
+            out["device_model"] = models.canonical(m.group(0), min_score=0.9) or out["device_model"]
+    elif _maybe(low, "idk", "don", "not", "any", "whatever") and UNK_RE.search(t):
         out["device_model"] = "TBD"
-
-    # location
-    for key, canon in COUNTRY_MAP.items():
-        if re.search(rf"\b{re.escape(key)}\b", t, re.I):
+    elif models and (expecting == "device_model" or BRAND_RE.search(t)):
+        hit = models.canonical(t, min_score=0.7, containment=True)
+        if hit:
+            out["device_model"] = hit
+
+    # location — pierwszy klucz w kolejności COUNTRY_MAP, "other" wygrywa
+    for key, canon in ex.country_order:
+        if key in found:
             out["location"] = canon
             break
-    if re.search(r"\bother\b", t, re.I):
+    if "other" in found:
         out["location"] = "Other"
 
     return out
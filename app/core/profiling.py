@@ -0,0 +1,324 @@
+"""
+Profilowanie żywego ruchu webhooka na żądanie (/debug/profile).
+
+Wyłączone: _reply webhooka czyta jeden atrybut (PROFILER.active) i nic
+więcej. Włączone: profilowane jest następne N tur albo T sekund (co
+pierwsze), potem profiler sam się wyłącza i trzyma raport.
+
+Tryby:
+  cprofile — cProfile.Profile na turę (działa tylko w wątku tury),
+             wyniki łączone przez pstats. Dokładne liczby wywołań,
+             ale profilowana tura jest kilka razy wolniejsza.
+  sample   — wątek próbkujący co interval_ms sys._current_frames()
+             wątków, które akurat liczą profilowaną turę. Tura prawie
+             bez narzutu, wynik statystyczny (próbki * interwał).
+
+Gorące funkcje przypisujemy do etapów handle_message: etap to
+najbliższa na stosie funkcja etapu (parse_message, _walk_slots,
+suggest_devices, render_summary, fetch_devices_raw; reszta tury w
+BotEngine._handle to "handle_message", poza silnikiem "other"). W
+cprofile stosu nie ma — idziemy w górę po wywołującym z największym
+czasem skumulowanym.
+"""
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:  # cProfile/pstats dopiero przy pierwszej sesji — start workera ich nie potrzebuje
+    import pstats
+
+MODES = ("cprofile", "sample")
+
+# klucz funkcji jak w pstats: (plik, pierwsza linia, nazwa)
+FuncKey = Tuple[str, int, str]
+
+
+def _key(code) -> FuncKey:
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _label(key: FuncKey) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name  # wbudowane, np. <method 'get' of 'dict' objects>
+    try:
+        filename = os.path.relpath(filename)
+    except ValueError:
+        pass
+    return f"{filename}:{line}({name})"
+
+
+def _stage_codes() -> Dict[Any, str]:
+    # leniwie — profiler nie wymusza importu silnika i serwisów
+    from app.core import fsm, parsers
+    from app.services import recommender, sd_api, summarizer
+    funcs = {
+        parsers.parse_message: "parse_message",
+        fsm.BotEngine._walk_slots: "slot_loop",
+        recommender.suggest_devices: "suggest_devices",
+        summarizer.render_summary: "render_summary",
+        sd_api.fetch_devices_raw: "sd_fetch",
+        fsm.BotEngine._handle: "handle_message",
+    }
+    return {inspect.unwrap(f).__code__: stage for f, stage in funcs.items()}
+
+
+class _Session:
+    def __init__(self, mode: str, requests: int, seconds: float, interval_ms: float):
+        self.mode = mode
+        self.requests = requests
+        self.seconds = seconds
+        self.interval = interval_ms / 1000.0
+        self.started = time.time()
+        self.deadline = time.monotonic() + seconds
+        self.finished: Optional[float] = None
+        self.claimed = 0
+        self.completed = 0
+        self.skipped = 0  # cProfile zajęty w innym wątku (3.12+: jeden profiler na proces)
+        self.lock = threading.Lock()
+        self.stage_codes = _stage_codes()
+        self.stage_keys = {_key(c): s for c, s in self.stage_codes.items()}
+        # cprofile
+        self.stats: Optional["pstats.Stats"] = None
+        # sample
+        self.threads: Dict[int, int] = {}  # ident -> liczba trwających tur w wątku
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.cum_counts: Counter = Counter()
+        self.leaf_stages: Dict[FuncKey, Counter] = {}
+        self.stage_counts: Counter = Counter()
+
+    def claim(self) -> bool:
+        with self.lock:
+            if self.finished is not None or self.claimed >= self.requests or time.monotonic() > self.deadline:
+                return False
+            self.claimed += 1
+            return True
+
+    def exhausted(self) -> bool:
+        return self.completed >= self.requests or time.monotonic() > self.deadline
+
+    def run_cprofile(self, fn: Callable, args: tuple):
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            with self.lock:
+                self.skipped += 1
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            prof.disable()
+            st = pstats.Stats(prof)
+            with self.lock:
+                if self.stats is None:
+                    self.stats = st
+                else:
+                    self.stats.add(st)
+                self.completed += 1
+
+    def run_sampled(self, fn: Callable, args: tuple):
+        ident = threading.get_ident()
+        with self.lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+        try:
+            return fn(*args)
+        finally:
+            with self.lock:
+                n = self.threads.pop(ident) - 1
+                if n:
+                    self.threads[ident] = n
+                self.completed += 1
+
+    def sample_once(self):
+        with self.lock:
+            idents = list(self.threads)
+        if not idents:
+            return
+        frames = sys._current_frames()
+        stage_codes = self.stage_codes
+        stacks = []
+        for ident in idents:
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            leaf = _key(frame.f_code)
+            stage = None
+            codes = set()
+            while frame is not None:
+                code = frame.f_code
+                if stage is None:
+                    stage = stage_codes.get(code)
+                codes.add(code)
+                frame = frame.f_back
+            stacks.append((leaf, stage or "other", codes))
+        with self.lock:
+            for leaf, stage, codes in stacks:
+                self.samples += 1
+                self.self_counts[leaf] += 1
+                self.leaf_stages.setdefault(leaf, Counter())[stage] += 1
+                self.stage_counts[stage] += 1
+                for code in codes:
+                    self.cum_counts[_key(code)] += 1
+
+    def sampler_loop(self):
+        while self.finished is None and time.monotonic() <= self.deadline:
+            self.sample_once()
+            time.sleep(self.interval)
+
+    # ---------- raport ----------
+
+    def _stage_of(self, func: FuncKey, stats: Dict, memo: Dict[FuncKey, str]) -> str:
+        path: List[FuncKey] = []
+        f = func
+        while f not in memo:
+            if f in self.stage_keys:
+                memo[f] = self.stage_keys[f]
+                break
+            path.append(f)
+            # wywołujący, z którego przyszło najwięcej czasu skumulowanego (bez rekurencji i cykli)
+            callers = [kv for kv in (stats[f][4] if f in stats else {}).items() if kv[0] not in path]
+            if not callers:
+                memo[f] = "other"
+                break
+            f = max(callers, key=lambda kv: kv[1][3])[0]
+        stage = memo[f]
+        for p in path:
+            memo[p] = stage
+        return stage
+
+    def report(self, top: int) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"mode": self.mode, "turns_profiled": self.completed}
+        if self.mode == "cprofile":
+            with self.lock:
+                raw = dict(self.stats.stats) if self.stats is not None else {}
+            memo: Dict[FuncKey, str] = {}
+            total = sum(v[2] for v in raw.values()) or 1.0
+            stages: Dict[str, Dict[str, Any]] = {}
+            for func, (cc, nc, tt, ct, callers) in raw.items():
+                st = stages.setdefault(self._stage_of(func, raw, memo), {"self_ms": 0.0})
+                st["self_ms"] += tt * 1000
+                if func in self.stage_keys:
+                    st["calls"] = nc
+                    st["cum_ms"] = round(ct * 1000, 3)
+            for st in stages.values():
+                st["self_pct"] = round(st["self_ms"] / (total * 1000) * 100, 1)
+                st["self_ms"] = round(st["self_ms"], 3)
+            hot = sorted(raw.items(), key=lambda kv: kv[1][2], reverse=True)[:top]
+            out["total_ms"] = round(total * 1000, 3)
+            out["stages"] = dict(sorted(stages.items(), key=lambda kv: kv[1]["self_ms"], reverse=True))
+            out["hot"] = [{
+                "function": _label(func),
+                "stage": self._stage_of(func, raw, memo),
+                "calls": nc,
+                "self_ms": round(tt * 1000, 3),
+                "cum_ms": round(ct * 1000, 3),
+                "self_pct": round(tt / total * 100, 1),
+            } for func, (cc, nc, tt, ct, callers) in hot]
+            return out
+
+        with self.lock:
+            n = self.samples
+            self_counts, cum_counts = self.self_counts.copy(), self.cum_counts.copy()
+            leaf_stages = {k: v.copy() for k, v in self.leaf_stages.items()}
+            stage_counts = self.stage_counts.copy()
+        ms = self.interval * 1000
+        pct = lambda c: round(c / n * 100, 1) if n else 0.0
+        out["samples"] = n
+        out["interval_ms"] = ms
+        out["stages"] = {s: {"samples": c, "approx_ms": round(c * ms, 1), "self_pct": pct(c)}
+                         for s, c in stage_counts.most_common()}
+        out["hot"] = [{
+            "function": _label(func),
+            "stage": leaf_stages[func].most_common(1)[0][0],
+            "self_samples": c,
+            "cum_samples": cum_counts[func],
+            "self_pct": pct(c),
+            "cum_pct": pct(cum_counts[func]),
+        } for func, c in self_counts.most_common(top)]
+        return out
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "running": self.finished is None,
+            "started": round(self.started, 3),
+            "finished": None if self.finished is None else round(self.finished, 3),
+            "requests": self.requests,
+            "seconds": self.seconds,
+            "turns_profiled": self.completed,
+            "turns_skipped": self.skipped,
+        }
+
+
+class Profiler:
+    """Jedna sesja profilowania naraz; raport ostatniej zostaje do następnego start()."""
+
+    def __init__(self):
+        self.active = False  # jedyne, co czyta gorąca ścieżka
+        self._session: Optional[_Session] = None
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def start(self, mode: str = "cprofile", requests: int = 100, seconds: float = 30.0,
+              interval_ms: float = 5.0) -> Dict[str, Any]:
+        if mode not in MODES:
+            raise ValueError(f"unknown profiling mode: {mode!r} (expected one of {', '.join(MODES)})")
+        with self._lock:
+            if self.active:
+                raise RuntimeError("profiling already running")
+            sess = self._session = _Session(mode, max(1, requests), max(0.1, seconds), max(0.1, interval_ms))
+            if mode == "sample":
+                threading.Thread(target=sess.sampler_loop, name="profiler-sampler", daemon=True).start()
+            # wyłączenie po czasie także wtedy, gdy ruch nie przychodzi
+            self._timer = threading.Timer(sess.seconds, self._finish, args=(sess,))
+            self._timer.daemon = True
+            self._timer.start()
+            self.active = True
+            return sess.status()
+
+    def run(self, fn: Callable, *args):
+        """Wykonuje turę fn(*args); profiluje ją, jeśli sesja jeszcze przyjmuje tury."""
+        sess = self._session
+        if sess is None or not sess.claim():
+            return fn(*args)
+        try:
+            if sess.mode == "cprofile":
+                return sess.run_cprofile(fn, args)
+            return sess.run_sampled(fn, args)
+        finally:
+            if sess.exhausted():
+                self._finish(sess)
+
+    def _finish(self, sess: _Session):
+        with self._lock:
+            if sess.finished is not None:
+                return
+            sess.finished = time.time()
+            if self._session is sess:
+                self.active = False
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+    def stop(self):
+        sess = self._session
+        if sess is not None:
+            self._finish(sess)
+
+    def report(self, top: int = 30) -> Optional[Dict[str, Any]]:
+        """Status + raport bieżącej (częściowy) albo ostatniej sesji; None, gdy nie było żadnej."""
+        sess = self._session
+        if sess is None:
+            return None
+        return {**sess.status(), "report": sess.report(top)}
+
+
+PROFILER = Profiler()
@@ -0,0 +1,274 @@
+"""
+Rate limit: token bucket per klucz ("ip:..." w middleware, "sid:..." w webhooku).
+
+Kubełek ma `burst` żetonów i dolewa `rate` żetonów na sekundę; request
+zabiera jeden, batch — po jednym na element (take(key, n)). Długoterminowo przepuszcza max_requests na window_sec,
+w dowolnym oknie najwyżej burst + max_requests — bez podwójnego limitu
+na styku okien, jak przy licznikach w stałych oknach.
+
+Backendy (RATE_LIMIT_BACKEND):
+  memory — OrderedDict w procesie, O(1) na request. Kolejność = ostatnie
+           użycie, więc bezczynne klucze są na początku: kubełek, który
+           zdążył się w pełni napełnić, zdejmujemy (niczym się nie różni od
+           nowego), a powyżej RATE_LIMIT_MAX_KEYS wypada najdawniej używany.
+  sqlite — wspólny plik RATE_LIMIT_DB_PATH (WAL), żeby limit obowiązywał
+           wszystkie workery uvicorna naraz. Jeden UPSERT ... RETURNING na
+           request (atomowy, bez jawnej transakcji), stare wiersze
+           sprzątane co _SQLITE_SWEEP_EVERY wywołań. RETURNING jest od
+           SQLite 3.35 — na starszym (od 3.24, UPSERT) ten sam UPSERT
+           i SELECT w transakcji BEGIN IMMEDIATE.
+
+Z pętli zdarzeń (middleware) wołamy aallow(): memory liczy od razu,
+sqlite idzie do wątku puli — zapis do pliku (i czekanie na jego lock
+przy wielu workerach) nie może blokować pętli.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+class RateLimiter:
+    """
+    Interfejs: take(key, n) -> ile z n żetonów wydano (tyle, ile jest w
+    kubełku, najwyżej n); allow(key) -> czy przepuścić request (take 1).
+    """
+
+    def __init__(self, name: str, max_requests: int, window_sec: float, burst: int):
+        self.name = name
+        self.rate = max(1, max_requests) / max(1e-3, float(window_sec))  # żetony na sekundę
+        self.burst = float(max(1, burst))
+        # po tylu sekundach bez ruchu kubełek jest pełny — klucz można zapomnieć
+        self.idle_sec = self.burst / self.rate
+        self.allowed = 0
+        self.rejected = 0
+
+    def take(self, key: str, n: int, now: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        return self.take(key, 1, now) == 1
+
+    def _count(self, n: int, granted: int):
+        self.allowed += granted
+        self.rejected += n - granted
+
+    async def aallow(self, key: str) -> bool:
+        """allow() dla kodu async — tu bez I/O, więc wprost."""
+        return self.allow(key)
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "rate_per_sec": round(self.rate, 4), "burst": self.burst,
+                "allowed": self.allowed, "rejected": self.rejected}
+
+
+class MemoryRateLimiter(RateLimiter):
+    def __init__(self, name: str, max_requests: int, window_sec: float, burst: int, max_keys: int = 100000):
+        super().__init__(name, max_requests, window_sec, burst)
+        self.max_keys = max(1, max_keys)
+        self.evicted_idle = 0
+        self.evicted_cap = 0
+        # klucz -> [żetony, czas ostatniego użycia]; lista, żeby poprawiać w miejscu
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        # middleware woła z pętli zdarzeń, webhook z threadpoola
+        self._lock = threading.Lock()
+
+    def take(self, key: str, n: int, now: Optional[float] = None) -> int:
+        if n <= 0:
+            return 0
+        now = time.monotonic() if now is None else now
+        buckets = self._buckets
+        with self._lock:
+            # najpierw bezczynne — żeby nowy klucz nie wypychał limitem aktywnego
+            self._drop_idle(now)
+            b = buckets.get(key)
+            if b is None:
+                tokens = self.burst
+                b = buckets[key] = [tokens, now]
+                if len(buckets) > self.max_keys:
+                    buckets.popitem(last=False)
+                    self.evicted_cap += 1
+            else:
+                tokens = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+                buckets.move_to_end(key)
+            granted = min(n, int(tokens))
+            b[0] = tokens - granted
+            self._count(n, granted)
+        return granted
+
+    def _drop_idle(self, now: float):
+        # najwyżej dwa na wywołanie — koszt O(1), a i tak schodzą szybciej, niż przybywają
+        buckets, limit = self._buckets, now - self.idle_sec
+        for _ in range(2):
+            if not buckets:
+                return
+            key, b = next(iter(buckets.items()))
+            if b[1] > limit:
+                return
+            del buckets[key]
+            self.evicted_idle += 1
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def stats(self) -> Dict[str, Any]:
+        st = super().stats()
+        st.update(backend="memory", keys=len(self._buckets), max_keys=self.max_keys,
+                  evicted_idle=self.evicted_idle, evicted_cap=self.evicted_cap)
+        return st
+
+
+_SQLITE_SWEEP_EVERY = 1000
+_SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class SqliteRateLimiter(RateLimiter):
+    """
+    Kubełki w tabeli rl_<name> współdzielonej przez procesy. Czas ścienny
+    (time.time), bo monotonic nie jest porównywalny między procesami.
+    """
+
+    def __init__(self, name: str, max_requests: int, window_sec: float, burst: int, path: str):
+        super().__init__(name, max_requests, window_sec, burst)
+        if not name.isidentifier():
+            raise ValueError(f"rate limiter name must be an identifier: {name!r}")
+        if sqlite3.sqlite_version_info < (3, 24, 0):
+            raise RuntimeError(f"RATE_LIMIT_BACKEND=sqlite needs SQLite 3.24+ (UPSERT), found {sqlite3.sqlite_version}")
+        self.path = path
+        self.evicted_idle = 0
+        self._table = f"rl_{name}"
+        # stan sprzed UPDATE jest widoczny w całym SET — `ok` i `tokens` liczone z tych samych wartości;
+        # `ok` = ile żetonów wydało ostatnie take() (dla allow() 0/1)
+        refill = "min(:burst, tokens + (excluded.ts - ts) * :rate)"
+        granted = f"min(:n, CAST({refill} AS INTEGER))"
+        self._upsert = (
+            f"INSERT INTO {self._table}(key, tokens, ts, ok) "
+            f"VALUES (:key, :burst - min(:n, CAST(:burst AS INTEGER)), :now, min(:n, CAST(:burst AS INTEGER))) "
+            f"ON CONFLICT(key) DO UPDATE SET "
+            f"ok = {granted}, "
+            f"tokens = {refill} - {granted}, "
+            f"ts = excluded.ts"
+        )
+        self._returning = _SQLITE_RETURNING
+        self._calls = 0
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._conn().executescript(
+            f"CREATE TABLE IF NOT EXISTS {self._table} ("
+            f" key TEXT PRIMARY KEY, tokens REAL NOT NULL, ts REAL NOT NULL, ok INTEGER NOT NULL"
+            f") WITHOUT ROWID;"
+            f"CREATE INDEX IF NOT EXISTS {self._table}_ts ON {self._table}(ts);"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def take(self, key: str, n: int, now: Optional[float] = None) -> int:
+        if n <= 0:
+            return 0
+        now = time.time() if now is None else now
+        params = {"key": key, "n": n, "now": now, "burst": self.burst, "rate": self.rate}
+        try:
+            granted = self._take(self._conn(), params)
+        except sqlite3.Error:
+            # limiter nie może położyć webhooka — przy problemie z bazą przepuszczamy
+            log.exception("rate limiter %s: sqlite error", self.name)
+            return n
+        self._count(n, granted)
+        self._calls += 1
+        if self._calls % _SQLITE_SWEEP_EVERY == 0:
+            self.sweep(now)
+        return granted
+
+    def _take(self, conn: sqlite3.Connection, params: Dict[str, Any]) -> int:
+        if self._returning:
+            return int(conn.execute(self._upsert + " RETURNING ok", params).fetchone()[0])
+        # bez RETURNING: IMMEDIATE bierze lock zapisu od razu, więc nikt nie wejdzie między UPSERT a SELECT
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(self._upsert, params)
+            ok = conn.execute(f"SELECT ok FROM {self._table} WHERE key = :key", params).fetchone()[0]
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return int(ok)
+
+    async def aallow(self, key: str) -> bool:
+        return await asyncio.to_thread(self.allow, key)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        try:
+            n = self._conn().execute(f"DELETE FROM {self._table} WHERE ts < ?", (now - self.idle_sec,)).rowcount
+        except sqlite3.Error:
+            log.exception("rate limiter %s: sweep failed", self.name)
+            return 0
+        self.evicted_idle += n
+        return n
+
+    def close(self) -> None:
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+    def stats(self) -> Dict[str, Any]:
+        st = super().stats()
+        st.update(backend="sqlite", path=self.path, evicted_idle=self.evicted_idle)
+        return st
+
+
+_LIMITERS: Dict[str, RateLimiter] = {}
+
+def make_limiter(name: str, max_requests: int, window_sec: float, burst: int) -> RateLimiter:
+    """
+    RATE_LIMIT_BACKEND  — memory (domyślnie) | sqlite
+    RATE_LIMIT_DB_PATH  — plik bazy dla sqlite (domyślnie ratelimit.db)
+    RATE_LIMIT_MAX_KEYS — ile kluczy trzyma memory (domyślnie 100000)
+    """
+    kind = (os.getenv("RATE_LIMIT_BACKEND", "memory") or "memory").strip().lower()
+    if kind == "sqlite":
+        limiter: RateLimiter = SqliteRateLimiter(
+            name, max_requests, window_sec, burst,
+            path=os.getenv("RATE_LIMIT_DB_PATH", "ratelimit.db") or "ratelimit.db")
+    elif kind == "memory":
+        limiter = MemoryRateLimiter(name, max_requests, window_sec, burst,
+                                    max_keys=_int_env("RATE_LIMIT_MAX_KEYS", 100000))
+    else:
+        raise ValueError(f"unknown RATE_LIMIT_BACKEND: {kind!r} (expected 'memory' or 'sqlite')")
+    _LIMITERS[name] = limiter
+    return limiter
+
+def close_all():
+    for limiter in list(_LIMITERS.values()):
+        limiter.close()
+
+def stats_all() -> List[Dict[str, Any]]:
+    return [limiter.stats() for limiter in list(_LIMITERS.values())]
@@ -1,21 +1,228 @@
+import hashlib
+import marshal
 import os
-from dataclasses import dataclass
+import sys
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
 
-import yaml
+from .validators import Validator, compile_validators
 
 APP_ENV = os.getenv("APP_ENV", "dev")
 SLOTS_PATH = Path(__file__).parent.parent / "data" / "slots.yaml"
 
 _SLOTS_CACHE: Optional["Slots"] = None
 
+# sparsowany slots.yaml w __pycache__ (jak .pyc) — worker startuje bez PyYAML
+SCHEMA_CACHE = (os.getenv("SLOTS_SCHEMA_CACHE", "true") or "").lower() != "false"
+
+
+def _schema_cache_path(p: Path) -> Path:
+    return p.parent / "__pycache__" / f"{p.name}.{sys.implementation.cache_tag}.marshal"
+
+
+def _read_schema(p: Path) -> Dict[str, Any]:
+    """
+    slots.yaml -> dict. Wynik parsowania zapisujemy marshalem razem z
+    sha256 źródła; gdy hash się zgadza, YAML nie jest parsowany, a PyYAML
+    nawet importowany. Zmieniony plik = inny hash = parsowanie i nowy
+    artefakt. Nieudany zapis (np. read-only obraz) nie jest błędem.
+    """
+    raw = p.read_bytes()
+    digest = hashlib.sha256(raw).digest()
+    cache = _schema_cache_path(p)
+    if SCHEMA_CACHE:
+        try:
+            cached_digest, y = marshal.loads(cache.read_bytes())
+            if cached_digest == digest:
+                return y
+        except Exception:
+            pass  # brak, uszkodzony albo z innej wersji Pythona
+    import yaml
+    y = yaml.safe_load(raw) or {}
+    if SCHEMA_CACHE:
+        try:
+            data = marshal.dumps((digest, y))
+            cache.parent.mkdir(exist_ok=True)
+            tmp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, cache)
+        except (OSError, ValueError):
+            pass  # ValueError: typ, którego marshal nie zapisze (np. data z YAML)
+    return y
+
+
+def _dirty_closure(order: List[str], defs: Dict[str, Any]) -> Dict[str, FrozenSet[str]]:
+    """
+    Odwraca krawędzie depends_on ze slots.yaml (np. vpn_ok -> location)
+    i domyka je przechodnio: zmiana location unieważnia location i vpn_ok.
+    """
+    dependents: Dict[str, Set[str]] = {}
+    for slot in list(order) + [k for k in defs if k not in order]:
+        for dep in (defs.get(slot) or {}).get("depends_on") or ():
+            dependents.setdefault(dep, set()).add(slot)
+    out: Dict[str, FrozenSet[str]] = {}
+    for slot in set(order) | set(defs) | set(dependents):
+        seen, stack = {slot}, [slot]
+        while stack:
+            for nxt in dependents.get(stack.pop(), ()):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        out[slot] = frozenset(seen)
+    return out
+
+
+# typy, których wartości to kilka stałych stringów — te internujemy
+_INTERNED_TYPES = ("enum", "yesno")
+
+
+class SlotLayout:
+    """
+    Stały układ slotów: indeks = pozycja w Slots.order (potem sloty spoza
+    order). Współdzielony przez wszystkie sesje jednego Slots; ten sam
+    indeks to bit w SessionState.validated.
+    """
+
+    __slots__ = ("names", "index", "interned")
+
+    def __init__(self, order: List[str], defs: Dict[str, Any]):
+        self.names: Tuple[str, ...] = tuple(dict.fromkeys(list(order) + list(defs)))
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.interned: FrozenSet[int] = frozenset(
+            i for i, name in enumerate(self.names) if (defs.get(name) or {}).get("type") in _INTERNED_TYPES)
+
+    def mask(self, names: Iterable[str]) -> int:
+        index, m = self.index, 0
+        for name in names:
+            i = index.get(name)
+            if i is not None:
+                m |= 1 << i
+        return m
+
+    def names_of(self, mask: int) -> List[str]:
+        return [name for i, name in enumerate(self.names) if mask >> i & 1]
+
+
+MISSING = object()  # brak wartości slotu (None to poprawna wartość)
+
+
+class SlotData(MutableMapping):
+    """
+    Wartości slotów sesji jako lista w układzie SlotLayout zamiast dict
+    kluczowanego stringami — z widokiem dict-like dla render_summary,
+    suggest_devices i reszty. Klucze spoza układu lądują w zwykłym dict
+    (tworzonym dopiero, gdy się pojawią).
+    """
+
+    __slots__ = ("layout", "by_index", "_extra")
+
+    def __init__(self, layout: Optional[SlotLayout] = None, init: Optional[Dict[str, Any]] = None):
+        self.layout = layout if layout is not None else default_layout()
+        # wartości wg indeksu w layout (MISSING = brak) — FSM czyta je bezpośrednio w pętli slotów
+        self.by_index: List[Any] = [MISSING] * len(self.layout.names)
+        self._extra: Optional[Dict[str, Any]] = None
+        if init:
+            self.update(init)
+
+    def __getitem__(self, key: str) -> Any:
+        i = self.layout.index.get(key)
+        if i is None:
+            if self._extra is None:
+                raise KeyError(key)
+            return self._extra[key]
+        v = self.by_index[i]
+        if v is MISSING:
+            raise KeyError(key)
+        return v
+
+    def get(self, key: str, default: Any = None) -> Any:
+        i = self.layout.index.get(key)
+        if i is None:
+            return default if self._extra is None else self._extra.get(key, default)
+        v = self.by_index[i]
+        return default if v is MISSING else v
+
+    def __contains__(self, key: object) -> bool:
+        i = self.layout.index.get(key)
+        if i is None:
+            return self._extra is not None and key in self._extra
+        return self.by_index[i] is not MISSING
+
+    def __setitem__(self, key: str, value: Any):
+        i = self.layout.index.get(key)
+        if i is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        if i in self.layout.interned and type(value) is str:
+            value = sys.intern(value)
+        self.by_index[i] = value
+
+    def __delitem__(self, key: str):
+        i = self.layout.index.get(key)
+        if i is None:
+            if self._extra is None:
+                raise KeyError(key)
+            del self._extra[key]
+        elif self.by_index[i] is MISSING:
+            raise KeyError(key)
+        else:
+            self.by_index[i] = MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        names = self.layout.names
+        for i, v in enumerate(self.by_index):
+            if v is not MISSING:
+                yield names[i]
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        n = len(self.by_index) - self.by_index.count(MISSING)
+        return n + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self) -> str:
+        return f"SlotData({dict(self)!r})"
+
+
+def default_layout() -> SlotLayout:
+    """Układ bieżącego slots.yaml — dla stanów tworzonych poza BotEngine (np. z repozytorium)."""
+    return (_SLOTS_CACHE or Slots.load()).layout
+
 
 @dataclass
 class Slots:
     order: List[str]
     defs: Dict[str, Any]
     _mtime: float = 0.0  # do hot-reload w dev
+    # slot -> skompilowany walidator; budowane raz na załadowanie YAML
+    validators: Dict[str, Validator] = field(default_factory=dict, repr=False, compare=False)
+    # slot -> on sam + wszystko, co od niego zależy (depends_on, przechodnio)
+    dirties: Dict[str, FrozenSet[str]] = field(default_factory=dict, repr=False, compare=False)
+    layout: SlotLayout = field(default=None, repr=False, compare=False)
+    # to samo co dirties, jako maski bitowe w układzie `layout`
+    dirty_masks: Dict[str, int] = field(default_factory=dict, repr=False, compare=False)
+    order_mask: int = field(default=0, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.validators = compile_validators(self.defs)
+        self.dirties = _dirty_closure(self.order, self.defs)
+        self.layout = SlotLayout(self.order, self.defs)
+        self.dirty_masks = {slot: self.layout.mask(names) for slot, names in self.dirties.items()}
+        self.order_mask = (1 << len(self.order)) - 1
+
+    def bit(self, slot: str) -> int:
+        return 1 << self.layout.index[slot]
+
+    def invalidated_by(self, changed: Iterable[str]) -> int:
+        """Maska slotów do ponownego sprawdzenia, gdy zmieniły się wartości `changed`."""
+        out = 0
+        for slot in changed:
+            out |= self.dirty_masks.get(slot) or self.layout.mask((slot,))
+        return out
 
     @classmethod
     def load(cls, force_reload: bool = False) -> "Slots":
@@ -39,8 +246,7 @@ class Slots:
         )
 
         if need_reload:
-            with open(p, "r", encoding="utf-8") as f:
-                y = yaml.safe_load(f) or {}
+            y = _read_schema(p)
             order = y.get("order", [])
             defs = y.get("definitions", {})
             _SLOTS_CACHE = cls(order=order, defs=defs, _mtime=mtime)
@@ -0,0 +1,149 @@
+"""
+Śledzenie tur webhooka: span na turę (korzeń) + spany dzieci dla etapów
+(handle_message, parse_message, slot_loop, suggest_devices,
+render_summary, sd_fetch i każda próba HTTP do SD — sd_attempt).
+
+Próbkowanie na korzeniu (TRACE_SAMPLE_RATE, 0..1): decyzja zapada raz
+na turę. Niewylosowana tura nie tworzy żadnych obiektów — span() w
+środku to jeden ContextVar.get() i wspólny no-op. Bieżący span siedzi w
+contextvars, więc przechodzi przez await i taski asyncio; do wątków puli
+kontekst trzeba przenieść ręcznie (contextvars.copy_context().run).
+
+Zakończone ślady trafiają do pierścienia (deque z maxlen =
+TRACE_BUFFER_SIZE): append z wypchnięciem najstarszego jest atomowy pod
+GIL, więc zapis idzie bez locka. Odczyt (/debug/traces) kopiuje deque
+i dopiero wtedy zamienia spany na dict.
+"""
+import itertools
+import os
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+try:
+    SAMPLE_RATE = min(1.0, max(0.0, float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))))
+except Exception:
+    SAMPLE_RATE = 0.01
+try:
+    BUFFER_SIZE = max(1, int(os.getenv("TRACE_BUFFER_SIZE", "1000")))
+except Exception:
+    BUFFER_SIZE = 1000
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "duration", "children", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+        self.duration: Optional[float] = None  # None = jeszcze trwa (np. porzucona próba SD)
+        self.children: List["Span"] = []
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self._token = _CURRENT.set(self)
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration = perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs.setdefault("error", exc_type.__name__)
+        _CURRENT.reset(self._token)
+        self._token = None
+        return False
+
+    def to_dict(self, t0: float) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - t0) * 1000, 3),
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            out["attrs"] = dict(self.attrs)
+        if self.children:
+            # kopia — porzucona próba SD może jeszcze dopisywać się z wątku puli
+            out["children"] = [c.to_dict(t0) for c in list(self.children)]
+        return out
+
+
+class _Root(Span):
+    __slots__ = ("trace_id", "session_id", "ts")
+
+    def __init__(self, name: str, session_id: Optional[str], attrs: Dict[str, Any]):
+        super().__init__(name, attrs)
+        self.trace_id = next(_IDS)
+        self.session_id = session_id
+        self.ts = time.time()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        super().__exit__(exc_type, exc, tb)
+        _RING.append(self)
+        return False
+
+    def record(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, "session_id": self.session_id, "ts": round(self.ts, 3),
+                **self.to_dict(self.start)}
+
+
+class _Noop:
+    """Span niewylosowanej tury: nic nie mierzy i nic nie zapisuje."""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "_Noop":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP = _Noop()
+_CURRENT: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+_RING: deque = deque(maxlen=BUFFER_SIZE)
+_IDS = itertools.count(1)  # next() na itertools.count jest atomowe pod GIL
+
+
+def trace(name: str, session_id: Optional[str] = None, **attrs):
+    """Korzeń śladu (jedna tura). Wewnątrz innego śladu — zwykły span."""
+    parent = _CURRENT.get()
+    if parent is not None:
+        return span(name, **attrs)
+    if SAMPLE_RATE <= 0.0 or random.random() >= SAMPLE_RATE:
+        return _NOOP
+    return _Root(name, session_id, attrs)
+
+
+def span(name: str, **attrs):
+    """Span dziecko bieżącego; poza wylosowanym śladem no-op."""
+    parent = _CURRENT.get()
+    if parent is None:
+        return _NOOP
+    child = Span(name, attrs)
+    parent.children.append(child)
+    return child
+
+
+def recent(session_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Ostatnie ślady (najnowsze pierwsze), opcjonalnie tylko jednej sesji."""
+    out = []
+    for root in reversed(list(_RING)):
+        if session_id is not None and root.session_id != session_id:
+            continue
+        out.append(root.record())
+        if len(out) >= limit:
+            break
+    return out
+
+
+def stats() -> Dict[str, Any]:
+    return {"sample_rate": SAMPLE_RATE, "buffer_size": BUFFER_SIZE, "stored": len(_RING)}
@@ -1,8 +1,10 @@
 import os
 import regex as re
-from typing import Any
-from datetime import datetime, timedelta
-from .slots import Slots
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+from datetime import date
+
+if TYPE_CHECKING:  # slots.py importuje ten moduł
+    from .slots import Slots
 
 MAX_QTY = int(os.getenv("MAX_QUANTITY","200"))
 MAX_RENTAL_DAYS = int(os.getenv("MAX_RENTAL_DAYS","120"))
@@ -10,58 +12,101 @@ MIN_RENTAL_DAYS = int(os.getenv("MIN_RENTAL_DAYS","1"))
 
 EMAIL_RE = re.compile(r"^[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}$", re.I)
 
-def _valid_date(s: str) -> bool:
-    try:
-        datetime.strptime(s, "%Y-%m-%d")
-        return True
-    except:
-        return False
+DATE_RANGE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})\s*→\s*(\d{4})-(\d{2})-(\d{2})$")
+
+_EMPTY = (None, "", [])
+YESNO = frozenset(("yes", "no"))
 
-def validate_slot(slot: str, value: Any, slots: Slots) -> bool:
-    # brak wartości
-    if value in (None, "", []):
-        return False if slots.defs[slot].get("required", False) else True
+Validator = Callable[[Any], bool]
 
-    # specjalne przypadki
-    if slot == "device_model" and str(value).strip().upper() == "TBD":
-        return True
+def _date_range_days(value: Any) -> Optional[int]:
+    """
+    "2025-01-01 → 2025-01-03" -> 3 (dni włącznie), None gdy format/data zła
+    albo koniec przed początkiem. Każda data parsowana raz.
+    """
+    m = DATE_RANGE_RE.search(str(value))
+    if not m: return None
+    try:
+        y1, m1, d1, y2, m2, d2 = map(int, m.groups())
+        start, end = date(y1, m1, d1), date(y2, m2, d2)
+    except ValueError:
+        return None
+    if end < start: return None
+    return (end - start).days + 1
 
-    typ = slots.defs[slot]["type"]
+# ---------- walidatory per typ (budowane raz w Slots.load) ----------
 
-    if typ == "enum":
-        return str(value) in slots.defs[slot]["values"]
+def _enum(d: Dict[str, Any]) -> Validator:
+    vals = frozenset(d.get("values") or ())
+    return lambda value: str(value) in vals
 
-    if typ == "multienum":
-        vals = slots.defs[slot]["values"]
+def _multienum(d: Dict[str, Any]) -> Validator:
+    vals = frozenset(d.get("values") or ())
+    def check(value: Any) -> bool:
         if not isinstance(value, list):
             return False
-        # normalizacja i filtr tylko znanych
-        cleaned = [v for v in value if v in vals]
-        return len(cleaned) == len(value)
+        try:
+            return all(v in vals for v in value)
+        except TypeError:  # niehashowalny element — na pewno spoza listy
+            return False
+    return check
 
-    if typ == "int":
+def _int(d: Dict[str, Any]) -> Validator:
+    def check(value: Any) -> bool:
         try:
             q = int(value)
             return 1 <= q <= MAX_QTY
         except:
             return False
+    return check
 
-    if typ == "email":
-        return EMAIL_RE.search(str(value)) is not None
+def _email(d: Dict[str, Any]) -> Validator:
+    search = EMAIL_RE.search
+    return lambda value: search(str(value)) is not None
 
-    if typ == "daterange":
-        m = re.search(r"^(\d{4}-\d{2}-\d{2})\s*→\s*(\d{4}-\d{2}-\d{2})$", str(value))
-        if not m: return False
-        d1s, d2s = m.group(1), m.group(2)
-        if not (_valid_date(d1s) and _valid_date(d2s)): return False
-        d1, d2 = datetime.strptime(d1s,"%Y-%m-%d"), datetime.strptime(d2s,"%Y-%m-%d")
-        if d2 < d1: return False
-        days = (d2 - d1).days + 1
-        return MIN_RENTAL_DAYS <= days <= MAX_RENTAL_DAYS
+def _daterange(d: Dict[str, Any]) -> Validator:
+    def check(value: Any) -> bool:
+        days = _date_range_days(value)
+        return days is not None and MIN_RENTAL_DAYS <= days <= MAX_RENTAL_DAYS
+    return check
 
-    if typ == "yesno":
-        v = str(value).strip().lower()
-        return v in ("yes", "no")
+def _yesno(d: Dict[str, Any]) -> Validator:
+    return lambda value: str(value).strip().lower() in YESNO
 
+def _any(d: Dict[str, Any]) -> Validator:
     # string / inne
-    return True
+    return lambda value: True
+
+_BY_TYPE: Dict[str, Callable[[Dict[str, Any]], Validator]] = {
+    "enum": _enum,
+    "multienum": _multienum,
+    "int": _int,
+    "email": _email,
+    "daterange": _daterange,
+    "yesno": _yesno,
+}
+
+def compile_validator(slot: str, d: Dict[str, Any]) -> Validator:
+    """
+    Walidator jednego slota z jego definicji w slots.yaml: typ, wartości
+    i required rozstrzygnięte raz, przy ładowaniu — w turze już tylko wywołanie.
+    """
+    check = _BY_TYPE.get(d.get("type"), _any)(d)
+    required = bool(d.get("required", False))
+    tbd_ok = slot == "device_model"
+
+    def validate(value: Any) -> bool:
+        # brak wartości
+        if value in _EMPTY:
+            return not required
+        # specjalne przypadki
+        if tbd_ok and str(value).strip().upper() == "TBD":
+            return True
+        return check(value)
+    return validate
+
+def compile_validators(defs: Dict[str, Any]) -> Dict[str, Validator]:
+    return {slot: compile_validator(slot, d or {}) for slot, d in defs.items()}
+
+def validate_slot(slot: str, value: Any, slots: "Slots") -> bool:
+    return slots.validators[slot](value)
@@ -1,2 +1,490 @@
-# Na MVP trzymamy sesje w pamięci (w FSM). Ten plik zostaje jako miejsce na SQLite/Postgres.
-# API pozostaw pusty lub przygotuj interfejs później.
+"""
+Repozytorium sesji rozmowy (SessionState z app.core.fsm).
+
+Backendy (SESSION_STORE):
+  memory — słownik w procesie (domyślnie; jak dawniej BotEngine.sessions),
+  sqlite — plik SESSION_DB_PATH w trybie WAL; zapisy idą przez kolejkę
+           write-behind i są zrzucane paczkami w osobnym wątku, więc
+           odpowiedź na wiadomość nie czeka na fsync.
+
+Sesje są ograniczone: po SESSION_TTL_MIN bez zapisu wypadają (i tak FSM
+zacząłby je od nowa), a memory trzyma najwyżej SESSION_MAX_LIVE sesji —
+powyżej tego wyrzuca najdawniej używane. Wygasłe sprząta też run_sweeper()
+w tle (lifespan), żeby porzucone czaty nie wisiały, gdy nie ma ruchu.
+
+Gorące sesje sqlite trzyma w LRU w procesie (SESSION_CACHE_SIZE). LRU jest
+per proces: przy kilku workerach uvicorna sesja musi trafiać zawsze do tego
+samego workera (sticky routing po session_id), albo trzeba wyłączyć LRU
+(SESSION_CACHE_SIZE=0). Wtedy każdy odczyt idzie do bazy, a zapis innego
+workera widać najpóźniej po SESSION_FLUSH_MS.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# stan sesji: obiekt z to_dict(); z powrotem przez from_dict podany przy tworzeniu repo
+FromDict = Callable[[Dict[str, Any]], Any]
+_Row = Tuple[str, int]  # (JSON stanu, updated_at)
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+class SessionRepo:
+    """Interfejs: get/put/delete po session_id + flush/close dla backendów z buforem."""
+
+    def get(self, session_id: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def put(self, session_id: str, state: Any) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Czeka, aż wszystkie zapisy trafią do trwałego storage."""
+
+    def close(self) -> None:
+        self.flush()
+
+    def sweep(self) -> int:
+        """Usuwa wygasłe sesje; zwraca ile."""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "live": len(self)}
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemorySessionRepo(SessionRepo):
+    """
+    Sesje w OrderedDict w kolejności ostatniego zapisu: każdy put()
+    przesuwa sesję na koniec, więc na początku zawsze leży najdawniej
+    dotknięta — wygasłe i ofiary LRU zdejmujemy z przodu, O(1) na sztukę.
+
+    Zegar TTL to moment put(), a FSM liczy wygaśnięcie od updated_at,
+    które nigdy nie jest późniejsze — sesji żywej dla FSM nie wyrzucimy.
+    """
+
+    def __init__(self, ttl_sec: float = 0.0, max_live: int = 0):
+        self._ttl = max(0.0, ttl_sec)    # 0 = bez TTL
+        self._max_live = max(0, max_live)  # 0 = bez limitu
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # sid -> (dotknięta, stan)
+        self._lock = threading.Lock()
+        self.evicted_ttl = 0
+        self.evicted_cap = 0
+
+    def get(self, session_id: str) -> Optional[Any]:
+        entry = self._data.get(session_id)
+        return entry[1] if entry is not None else None
+
+    def put(self, session_id: str, state: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            data = self._data
+            data[session_id] = (now, state)
+            data.move_to_end(session_id)
+            # po drodze zdejmujemy z przodu to, co wygasło (zamortyzowane O(1))
+            self._expire(now)
+            if self._max_live:
+                while len(data) > self._max_live:
+                    data.popitem(last=False)
+                    self.evicted_cap += 1
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def _expire(self, now: float) -> int:
+        if not self._ttl:
+            return 0
+        data, deadline, n = self._data, now - self._ttl, 0
+        while data:
+            sid, (touched, _) = next(iter(data.items()))
+            if touched >= deadline:
+                break
+            del data[sid]
+            n += 1
+        self.evicted_ttl += n
+        return n
+
+    def sweep(self) -> int:
+        with self._lock:
+            return self._expire(time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "live": len(self._data), "max_live": self._max_live,
+                "ttl_sec": self._ttl, "evicted_ttl": self.evicted_ttl, "evicted_cap": self.evicted_cap}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    state      TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions(updated_at);
+"""
+
+_UPSERT = ("INSERT INTO sessions(session_id, state, updated_at) VALUES (?, ?, ?) "
+           "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at")
+
+
+class SqliteSessionRepo(SessionRepo):
+    """
+    SQLite (WAL) + write-behind + opcjonalny LRU.
+
+    LRU (cache_size > 0) nie jest unieważniany między procesami: inny
+    worker piszący do tego samego pliku nie usunie nam wpisu, więc bez
+    sticky routingu (ta sama sesja zawsze do tego samego workera) tura
+    poszłaby na starym stanie. Domyślnie wyłączony — włączamy tylko przy
+    jednym workerze albo sticky routingu.
+
+    put() serializuje stan od razu (snapshot — obiekt sesji jest dalej
+    mutowany przez FSM) i wrzuca go do słownika oczekujących zapisów.
+    Kolejne zapisy tej samej sesji przed zrzutem się nadpisują, więc do
+    bazy idzie tylko ostatni. Wątek zapisujący zrzuca całość w jednej
+    transakcji co flush_ms albo od razu po zebraniu `batch` sesji.
+    """
+
+    def __init__(self, path: str, from_dict: FromDict, cache_size: int = 0,
+                 flush_ms: int = 50, batch: int = 500, ttl_sec: float = 0.0):
+        self.path = path
+        self._from_dict = from_dict
+        self._cache_size = max(0, cache_size)
+        self._ttl = max(0.0, ttl_sec)
+        self.evicted_ttl = 0  # usunięte z bazy przez sweep()
+        self.evicted_cap = 0  # wypchnięte z LRU (w bazie zostają)
+        # liczba sesji w bazie dla stats()/metryk — liczona przy starcie i przez sweep(),
+        # żeby scrape nie wymuszał flush() + COUNT(*)
+        self._live = 0
+        self._live_at = 0.0
+        self._flush_sec = max(0, flush_ms) / 1000.0
+        self._batch = max(1, batch)
+
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # session_id -> (JSON stanu, updated_at) albo None (usunięcie)
+        self._pending: Dict[str, Optional[_Row]] = {}
+        self._writing: Dict[str, Optional[_Row]] = {}  # paczka właśnie zapisywana
+        self._cond = threading.Condition()
+        self._seq = 0       # numer ostatniego put/delete
+        self._flushed = 0   # numer ostatniego zapisanego do bazy
+        self._urgent = False  # flush() czeka — zrzucamy bez zbierania paczki
+        self._closed = False
+
+        self._local = threading.local()
+        # połączenia czytelników ze wszystkich wątków (request, sweeper) — zamyka je close()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+            self._count_live(conn)
+        finally:
+            conn.close()
+        self._writer = threading.Thread(target=self._run_writer, name="session-writer", daemon=True)
+        self._writer.start()
+
+    # ---------- połączenia ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # w WAL synchronous=NORMAL nie robi fsync przy każdym commicie (tylko przy checkpoincie)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        # połączenie per wątek; w WAL czytelnicy nie blokują się z zapisującym
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    # ---------- LRU ----------
+
+    def _cache_get(self, session_id: str) -> Optional[Any]:
+        with self._cache_lock:
+            state = self._cache.get(session_id)
+            if state is not None:
+                self._cache.move_to_end(session_id)
+            return state
+
+    def _cache_put(self, session_id: str, state: Any):
+        if not self._cache_size:
+            return
+        with self._cache_lock:
+            self._cache[session_id] = state
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+                self.evicted_cap += 1
+
+    # ---------- API ----------
+
+    def get(self, session_id: str) -> Optional[Any]:
+        state = self._cache_get(session_id)
+        if state is not None:
+            return state
+        # jeszcze nie zrzucone do bazy (np. wypadło z LRU przed flushem)
+        with self._cond:
+            queued = session_id in self._pending or session_id in self._writing
+            if queued:
+                row = self._pending[session_id] if session_id in self._pending else self._writing[session_id]
+        if not queued:
+            # _writing czyścimy dopiero po COMMIT, więc tu baza ma już najnowszy zapis
+            row = self._reader().execute(
+                "SELECT state, updated_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        state = self._from_dict(json.loads(row[0]))
+        self._cache_put(session_id, state)
+        return state
+
+    def put(self, session_id: str, state: Any) -> None:
+        d = state.to_dict()
+        row = (json.dumps(d, ensure_ascii=False, separators=(",", ":")), int(d.get("updated_at") or 0))
+        self._cache_put(session_id, state)
+        self._enqueue(session_id, row)
+
+    def delete(self, session_id: str) -> None:
+        with self._cache_lock:
+            self._cache.pop(session_id, None)
+        self._enqueue(session_id, None)
+
+    def _enqueue(self, session_id: str, row: Optional[_Row]):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("session repository is closed")
+            self._pending[session_id] = row
+            self._seq += 1
+            if len(self._pending) >= self._batch or not self._flush_sec:
+                self._cond.notify_all()
+
+    def flush(self) -> None:
+        with self._cond:
+            target = self._seq
+            while self._flushed < target and self._writer.is_alive():
+                self._urgent = True
+                self._cond.notify_all()
+                self._cond.wait(0.5)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._local = threading.local()
+
+    def sweep(self) -> int:
+        """
+        Kasuje z bazy sesje z updated_at starszym niż TTL (ten sam zegar co FSM)
+        i wyrzuca je z LRU — inaczej get() oddawałby wygasły stan z pamięci.
+        Nowszy stan czekający w kolejce i tak zostanie potem zapisany.
+        Przy okazji (także bez TTL) odświeża liczbę sesji dla stats().
+        """
+        conn = self._reader()
+        if not self._ttl:
+            self._count_live(conn)
+            return 0
+        deadline = int(time.time() - self._ttl)
+        # SELECT + DELETE w jednej transakcji (bez DELETE ... RETURNING — to dopiero SQLite 3.35)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            swept = [r[0] for r in conn.execute("SELECT session_id FROM sessions WHERE updated_at < ?", (deadline,))]
+            if swept:
+                conn.execute("DELETE FROM sessions WHERE updated_at < ?", (deadline,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if swept and self._cache_size:
+            with self._cache_lock:
+                for sid in swept:
+                    self._cache.pop(sid, None)
+        self.evicted_ttl += len(swept)
+        self._count_live(conn)
+        return len(swept)
+
+    def _count_live(self, conn: sqlite3.Connection) -> int:
+        # bez flush(): sesje z kolejki write-behind policzy następny sweep
+        self._live = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        self._live_at = time.monotonic()
+        return self._live
+
+    def stats(self) -> Dict[str, Any]:
+        # "live" z ostatniego sweep() (co SESSION_SWEEP_SEC) — scrape nie dotyka bazy
+        return {"backend": "sqlite", "live": self._live, "live_age_sec": round(time.monotonic() - self._live_at, 1),
+                "cached": len(self._cache), "cache_size": self._cache_size,
+                "ttl_sec": self._ttl, "evicted_ttl": self.evicted_ttl, "evicted_cap": self.evicted_cap}
+
+    def __len__(self) -> int:
+        """Dokładna liczba sesji: zrzuca kolejkę i liczy w bazie (testy, narzędzia — nie metryki)."""
+        self.flush()
+        return self._count_live(self._reader())
+
+    # ---------- wątek zapisujący ----------
+
+    def _take_batch(self) -> Tuple[Dict[str, Optional[_Row]], int, bool]:
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            # daj się uzbierać paczce (chyba że już pełna / flush / zamykanie)
+            if (self._pending and len(self._pending) < self._batch and self._flush_sec
+                    and not (self._closed or self._urgent)):
+                self._cond.wait(self._flush_sec)
+            self._urgent = False
+            batch, self._pending = self._pending, {}
+            self._writing = batch
+            return batch, self._seq, self._closed and not batch
+
+    def _write(self, conn: sqlite3.Connection, batch: Dict[str, Optional[_Row]]):
+        upserts: List[Tuple[str, str, int]] = []
+        deletes: List[Tuple[str]] = []
+        for sid, row in batch.items():
+            if row is None:
+                deletes.append((sid,))
+            else:
+                upserts.append((sid,) + row)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if upserts:
+                conn.executemany(_UPSERT, upserts)
+            if deletes:
+                conn.executemany("DELETE FROM sessions WHERE session_id = ?", deletes)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _run_writer(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch, seq, stop = self._take_batch()
+                if stop:
+                    break
+                try:
+                    self._write(conn, batch)
+                except Exception:
+                    if self._closed:
+                        log.exception("session write-behind failed at shutdown, dropping %d session(s)", len(batch))
+                        break
+                    log.exception("session write-behind failed for %d session(s); retrying", len(batch))
+                    with self._cond:
+                        # nowsze zapisy tych samych sesji mają pierwszeństwo
+                        for sid, row in batch.items():
+                            self._pending.setdefault(sid, row)
+                        self._writing = {}
+                        self._cond.wait(1.0)
+                    continue
+                with self._cond:
+                    # paczka zawierała wszystko do numeru `seq` włącznie
+                    self._writing = {}
+                    self._flushed = seq
+                    self._cond.notify_all()
+        finally:
+            conn.close()
+            with self._cond:
+                self._flushed = self._seq
+                self._cond.notify_all()
+
+
+# ---------- fabryka ----------
+
+_OPEN: "weakref.WeakSet[SessionRepo]" = weakref.WeakSet()
+
+def make_repo(from_dict: FromDict, ttl_sec: float = 0.0) -> SessionRepo:
+    """
+    SESSION_STORE      — memory (domyślnie) | sqlite
+    SESSION_DB_PATH    — plik bazy (domyślnie sessions.db)
+    SESSION_CACHE_SIZE — pojemność LRU gorących sesji dla sqlite (domyślnie 0 = bez LRU;
+                         tylko przy jednym workerze albo sticky routingu po session_id)
+    SESSION_FLUSH_MS   — co ile zrzucać kolejkę zapisów (domyślnie 50)
+    SESSION_FLUSH_BATCH — zrzut od razu po tylu sesjach (domyślnie 500)
+    SESSION_MAX_LIVE   — limit sesji w pamięci dla memory (domyślnie 100000, 0 = bez limitu)
+    ttl_sec            — po ilu sekundach bez zapisu sesja wygasa (0 = nigdy)
+    """
+    kind = (os.getenv("SESSION_STORE", "memory") or "memory").strip().lower()
+    if kind == "sqlite":
+        repo: SessionRepo = SqliteSessionRepo(
+            os.getenv("SESSION_DB_PATH", "sessions.db") or "sessions.db",
+            from_dict,
+            cache_size=_int_env("SESSION_CACHE_SIZE", 0),
+            flush_ms=_int_env("SESSION_FLUSH_MS", 50),
+            batch=_int_env("SESSION_FLUSH_BATCH", 500),
+            ttl_sec=ttl_sec,
+        )
+    elif kind == "memory":
+        repo = MemorySessionRepo(ttl_sec=ttl_sec, max_live=_int_env("SESSION_MAX_LIVE", 100000))
+    else:
+        raise ValueError(f"unknown SESSION_STORE: {kind!r} (expected 'memory' or 'sqlite')")
+    _OPEN.add(repo)
+    return repo
+
+def close_all():
+    """Zrzuca i zamyka wszystkie repozytoria — przy shutdown aplikacji."""
+    for repo in list(_OPEN):
+        try:
+            repo.close()
+        except Exception:
+            log.exception("closing session repository failed")
+
+def stats_all() -> List[Dict[str, Any]]:
+    return [repo.stats() for repo in list(_OPEN)]
+
+def _sweep_interval() -> float:
+    try:
+        return max(1.0, float(os.getenv("SESSION_SWEEP_SEC", "60")))
+    except Exception:
+        return 60.0
+
+async def run_sweeper():
+    """
+    Co SESSION_SWEEP_SEC usuwa wygasłe sesje ze wszystkich repozytoriów
+    (lifespan aplikacji). Bez tego porzucony czat znika dopiero, gdy ktoś
+    inny zapisze sesję (memory) — albo nigdy (sqlite). Przy okazji odświeża
+    liczbę sesji sqlite, którą pokazują /metrics i /debug/sessions.
+    """
+    while True:
+        await asyncio.sleep(_sweep_interval())
+        for repo in list(_OPEN):
+            try:
+                n = await asyncio.to_thread(repo.sweep)
+                if n:
+                    log.info("session sweeper: %d expired session(s) removed from %s", n, type(repo).__name__)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("session sweep failed")
+
+atexit.register(close_all)
@@ -1,6 +1,7 @@
+import asyncio
 import os
 import time
-from typing import Dict
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
 from dotenv import load_dotenv, find_dotenv
@@ -35,49 +36,139 @@ def _load_env():
 
 _ENV_SOURCE = _load_env()
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from app.api.routes import router as api_router
+from app.api.webhook_tawk import get_engine
+from app.services.inventory import refresher_enabled, run_refresher
+from app.services.sd_api import aclose_clients
+from app.core.ratelimit import close_all as close_limiters, make_limiter
+from app.db.repo import close_all as close_session_repos, run_sweeper
 
 APP_ENV = os.getenv("APP_ENV", "dev")
 RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW_SEC", "60"))
 RATE_LIMIT_MAX = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "120"))
-
-_rl_bucket: Dict[str, Dict[str, float]] = {}
-
-class SizeLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        cl = request.headers.get("content-length")
-        if cl and int(cl) > 256 * 1024:
-            return JSONResponse({"detail":"Payload too large"}, status_code=413)
-        return await call_next(request)
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        ip = request.client.host if request.client else "0.0.0.0"
-        now = time.time()
-        bucket = _rl_bucket.get(ip, {"cnt": 0, "ts": now})
-        if now - bucket["ts"] > RATE_LIMIT_WINDOW:
-            bucket = {"cnt": 0, "ts": now}
-        bucket["cnt"] += 1
-        _rl_bucket[ip] = bucket
-        if bucket["cnt"] > RATE_LIMIT_MAX:
-            return JSONResponse({"detail": "Too many requests"}, status_code=429)
-        return await call_next(request)
-
-class NoCacheDevMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        resp = await call_next(request)
-        if APP_ENV == "dev":
-            resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-            resp.headers["Pragma"] = "no-cache"
-            resp.headers["Expires"] = "0"
-        return resp
-
-app = FastAPI(title=os.getenv("APP_NAME", "Support Intake Bot"), version="1.3.0")
+# domyślnie burst = max: jak dawne okno stałe, do RATE_LIMIT_MAX requestów naraz
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "") or RATE_LIMIT_MAX)
+ENGINE_WARMUP = (os.getenv("ENGINE_WARMUP", "true") or "").lower() != "false"
+
+# token bucket per IP; RATE_LIMIT_BACKEND=sqlite — wspólny dla wszystkich workerów (app/core/ratelimit.py)
+_ip_limiter = make_limiter("ip", RATE_LIMIT_MAX, RATE_LIMIT_WINDOW, RATE_LIMIT_BURST)
+
+MAX_BODY_BYTES = 256 * 1024
+
+# Middleware jako czyste ASGI (bez BaseHTTPMiddleware): bez dodatkowego
+# taska i opakowywania strumienia odpowiedzi w każdej warstwie.
+
+class _PayloadTooLarge(HTTPException):
+    # HTTPException, bo FastAPI zamienia inne wyjątki z czytania body na 400
+    def __init__(self):
+        super().__init__(status_code=413, detail="Payload too large")
+
+def _too_large() -> JSONResponse:
+    return JSONResponse({"detail":"Payload too large"}, status_code=413)
+
+class SizeLimitMiddleware:
+    """
+    Limit MAX_BODY_BYTES na faktycznie odebrane bajty, nie tylko na
+    content-length — body chunked też liczymy w trakcie czytania.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        for k, v in scope["headers"]:
+            if k == b"content-length":
+                if v.isdigit() and int(v) > MAX_BODY_BYTES:
+                    return await _too_large()(scope, receive, send)
+                break
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > MAX_BODY_BYTES:
+                    raise _PayloadTooLarge()
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except _PayloadTooLarge:
+            # route FastAPI odda 413 sama (HTTPException); tu trafia surowe ASGI czytające body
+            if started:
+                raise
+            await _too_large()(scope, receive, send)
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        client = scope.get("client")
+        ip = client[0] if client else "0.0.0.0"
+        if not await _ip_limiter.aallow("ip:" + ip):
+            return await JSONResponse({"detail": "Too many requests"}, status_code=429)(scope, receive, send)
+        # request.state.ip_limit — batch dobiera stąd żetony za kolejne elementy
+        scope.setdefault("state", {})["ip_limit"] = (_ip_limiter, "ip:" + ip)
+        await self.app(scope, receive, send)
+
+class NoCacheDevMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or APP_ENV != "dev":
+            return await self.app(scope, receive, send)
+
+        async def no_cache_send(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+                headers["Pragma"] = "no-cache"
+                headers["Expires"] = "0"
+            await send(message)
+
+        await self.app(scope, receive, no_cache_send)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # I/O do SD tylko w tle — webhook czyta gotowy snapshot
+    task = asyncio.create_task(run_refresher(), name="inventory-refresher") if refresher_enabled() else None
+    # wygasłe sesje sprzątamy w tle, nie przy okazji requestów
+    sweeper = asyncio.create_task(run_sweeper(), name="session-sweeper")
+    # silnik rozmów budujemy w tle: worker przyjmuje ruch od razu, a pierwsza tura zwykle zastaje go gotowego
+    warmup = asyncio.create_task(asyncio.to_thread(get_engine), name="engine-warmup") if ENGINE_WARMUP else None
+    try:
+        yield
+    finally:
+        for t in (task, sweeper, warmup):
+            if t is not None:
+                t.cancel()
+                with suppress(asyncio.CancelledError):
+                    await t
+        await aclose_clients()
+        # dopisuje kolejkę write-behind sesji przed wyjściem procesu
+        await asyncio.to_thread(close_session_repos)
+        close_limiters()
+
+app = FastAPI(title=os.getenv("APP_NAME", "Support Intake Bot"), version="1.3.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
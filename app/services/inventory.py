@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from .sd_api import fetch_devices_raw, afetch_devices_raw
+from .inventory_index import InventoryIndex, EMPTY_INDEX
+from .model_search import ModelSearchIndex, EMPTY_MODELS
+
+log = logging.getLogger(__name__)
+
+# ---------- Konfiguracja cache ----------
+
+def _ttl() -> float:
+    try:
+        return float(os.getenv("INVENTORY_TTL_SEC", "60"))
+    except Exception:
+        return 60.0
+
+def _stale_window() -> float:
+    """
+    Jak długo po TTL wolno jeszcze oddawać stary snapshot
+    (odświeżając go w tle). Po tym czasie odświeżamy synchronicznie.
+    """
+    try:
+        return float(os.getenv("INVENTORY_STALE_SEC", "300"))
+    except Exception:
+        return 300.0
+
+def _refresh_interval() -> float:
+    try:
+        return max(1.0, float(os.getenv("INVENTORY_REFRESH_SEC", "30")))
+    except Exception:
+        return 30.0
+
+def _backoff_max() -> float:
+    try:
+        return float(os.getenv("INVENTORY_BACKOFF_MAX_SEC", "300"))
+    except Exception:
+        return 300.0
+
+def refresher_enabled() -> bool:
+    """Refresher w tle ma sens tylko, gdy rekomendacje są włączone."""
+    if (os.getenv("RECOMMENDER_ENABLED", "false") or "").lower() != "true":
+        return False
+    return (os.getenv("INVENTORY_REFRESHER", "true") or "").lower() == "true"
+
+# ---------- Normalizacja pól z Twojego API ----------
+
+def _norm_platform(v: str) -> str:
+    v = (v or "").strip().lower()
+    if v.startswith("ios") or v == "apple":
+        return "iOS"
+    if v.startswith("android"):
+        return "Android"
+    return ""
+
+def _clean_version(ver_raw: Any, platform: str) -> str:
+    """
+    "18.6.1\nProductVersion" -> "iOS 18.6.1" (gdy platform='iOS')
+    "7.0" + Android -> "Android 7.0"
+    """
+    s = str(ver_raw or "").strip()
+    if not s:
+        return ""
+    # utnij wszystko po pierwszej linii (często "\nProductVersion")
+    s = s.splitlines()[0].strip()
+    if platform:
+        return f"{platform} {s}"
+    return s
+
+def _group_name(g: Any) -> str:
+    """
+    group może być stringiem ("CLEAN") albo obiektem {"name": "..."}.
+    """
+    if isinstance(g, dict):
+        return str(g.get("name") or "").strip()
+    return str(g or "").strip()
+
+def _is_clean_group(name: str) -> bool:
+    """
+    Tylko DOKŁADNIE 'CLEAN' (case-insensitive).
+    Nie łapiemy 'TOCLEAN', 'CLEANING', itp.
+    """
+    return name.upper() == "CLEAN"
+
+def _status_int(v: Any) -> int:
+    try:
+        return int(v)
+    except Exception:
+        return 0
+
+def _normalize_from_sd(d: Dict[str, Any]) -> Dict[str, Any]:
+    name = d.get("model") or d.get("marketName") or d.get("name") or "Device"
+    platform = _norm_platform(d.get("platform") or "")
+    ver = _clean_version(d.get("version"), platform)
+    versions = [ver] if ver else []
+
+    status = _status_int(d.get("status"))
+    group = _group_name(d.get("group"))
+    ready = bool(d.get("ready"))
+    present = bool(d.get("present"))
+
+    available = _is_clean_group(group) and status == 3 and ready and present
+
+    return {
+        "name": name,
+        "platform": platform,
+        "versions": versions,
+        "available": available,
+        # pomocniczo w debugach
+        "_raw": {"group": group, "status": status, "ready": ready, "present": present},
+    }
+
+# ---------- Snapshot ----------
+
+@dataclass(frozen=True)
+class InventorySnapshot:
+    """
+    Niezmienny obraz inwentarza. Elementy traktujemy jako read-only —
+    ten sam snapshot czytają równolegle wszystkie sesje.
+    """
+    items: Tuple[Dict[str, Any], ...]
+    version: int
+    fetched_at: float  # epoch, kiedy dane faktycznie przyszły z SD
+    ok: bool = True    # False gdy ostatnie odświeżenie się nie udało
+    index: InventoryIndex = field(default=EMPTY_INDEX, compare=False, repr=False)
+    models: ModelSearchIndex = field(default=EMPTY_MODELS, compare=False, repr=False)
+
+    def age(self) -> float:
+        if not self.fetched_at:
+            return float("inf")
+        return max(0.0, time.time() - self.fetched_at)
+
+    def meta(self) -> Dict[str, Any]:
+        age = self.age()
+        return {
+            "version": self.version,
+            "age_sec": round(age, 1) if age != float("inf") else None,
+            "size": len(self.items),
+            "ok": self.ok,
+            "stale": self.stale,
+        }
+
+    @property
+    def stale(self) -> bool:
+        """Ostatnie odświeżenie nie wyszło albo dane są starsze niż TTL."""
+        return (not self.ok) or self.age() > _ttl()
+
+EMPTY_SNAPSHOT = InventorySnapshot(items=(), version=0, fetched_at=0.0, ok=False)
+
+_SNAPSHOT: InventorySnapshot = EMPTY_SNAPSHOT
+_CHECKED_AT: float = 0.0  # monotonic, ostatnia próba odświeżenia (udana lub nie)
+_REFRESH_LOCK = threading.Lock()  # single-flight
+_BG_LOCK = threading.Lock()
+_BG_REFRESHING = False
+_REFRESHER_ACTIVE = False  # gdy działa task w tle, ścieżka requestu nie robi I/O
+
+def _load() -> Optional[List[Dict[str, Any]]]:
+    return _normalize_all(fetch_devices_raw())
+
+def _normalize_all(raw: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    # pusta lista = żaden kandydat nie oddał danych; nie nadpisujemy dobrego snapshotu
+    if not raw:
+        return None
+    return [_normalize_from_sd(x) for x in raw]
+
+def _install(items: Optional[List[Dict[str, Any]]]) -> InventorySnapshot:
+    global _SNAPSHOT, _CHECKED_AT
+    cur = _SNAPSHOT
+    if items is None:
+        snap = replace(cur, ok=False) if cur.ok else cur
+    else:
+        items = tuple(items)
+        snap = InventorySnapshot(items=items, version=cur.version + 1, fetched_at=time.time(),
+                                 index=InventoryIndex(items),
+                                 models=ModelSearchIndex(d["name"] for d in items))
+    _SNAPSHOT = snap
+    _CHECKED_AT = time.monotonic()
+    return snap
+
+def _refresh_sync(checked_before: float) -> InventorySnapshot:
+    with _REFRESH_LOCK:
+        # ktoś inny odświeżył, gdy czekaliśmy na lock
+        if _CHECKED_AT != checked_before:
+            return _SNAPSHOT
+        return _install(_load())
+
+def refresh_now() -> InventorySnapshot:
+    """Bezwarunkowe odświeżenie (blokujące) — dla refreshera i debugów."""
+    with _REFRESH_LOCK:
+        return _install(_load())
+
+async def arefresh_now() -> InventorySnapshot:
+    """Jak refresh_now(), ale I/O idzie przez async klienta SD."""
+    version = _SNAPSHOT.version
+    raw = await afetch_devices_raw()
+    # normalizacja + budowa indeksu poza pętlą zdarzeń
+    return await asyncio.to_thread(_install_raw, raw, version)
+
+def _install_raw(raw: List[Dict[str, Any]], version: int) -> InventorySnapshot:
+    with _REFRESH_LOCK:
+        # w trakcie naszego fetcha refresh_now() zainstalował nowsze dane — nie nadpisujemy ich starszymi
+        if _SNAPSHOT.version != version:
+            return _SNAPSHOT
+        return _install(_normalize_all(raw))
+
+def _refresh_bg():
+    global _BG_REFRESHING
+    try:
+        _refresh_sync(_CHECKED_AT)
+    finally:
+        _BG_REFRESHING = False
+
+def _spawn_bg_refresh():
+    global _BG_REFRESHING
+    with _BG_LOCK:
+        if _BG_REFRESHING:
+            return
+        _BG_REFRESHING = True
+    threading.Thread(target=_refresh_bg, name="inventory-refresh", daemon=True).start()
+
+def get_snapshot() -> InventorySnapshot:
+    """
+    Zwraca snapshot inwentarza:
+      - świeży (< TTL) — bez I/O,
+      - przeterminowany, ale w oknie stale — od razu, a odświeżenie leci w tle,
+      - brak / za stary — odświeżenie synchroniczne, jedno na cały proces.
+    Gdy działa run_refresher(), oddaje bieżący snapshot bez I/O
+    (ewentualnie z flagą stale) — chyba że żadne dane jeszcze nie przyszły:
+    wtedy jak bez refreshera, żeby pierwsze tury po starcie nie dostały
+    "brak urządzeń" z pustego snapshotu.
+    """
+    if _REFRESHER_ACTIVE and _SNAPSHOT.fetched_at:
+        return _SNAPSHOT
+
+    checked = _CHECKED_AT
+    snap = _SNAPSHOT
+    since = time.monotonic() - checked
+    ttl = _ttl()
+
+    if checked and since <= ttl:
+        return snap
+    if checked and snap.items and since <= ttl + _stale_window():
+        _spawn_bg_refresh()
+        return snap
+    return _refresh_sync(checked)
+
+def current_snapshot() -> InventorySnapshot:
+    """Bieżący snapshot bez żadnego I/O (może być pusty albo stary)."""
+    return _SNAPSHOT
+
+# ---------- Refresher w tle (lifespan aplikacji) ----------
+
+async def run_refresher():
+    """
+    Okresowo pobiera inwentarz z SD i podmienia snapshot.
+    Interwał z jitterem (±20%), przy błędach wykładniczy backoff
+    do INVENTORY_BACKOFF_MAX_SEC. W razie awarii SD zostaje ostatni
+    dobry snapshot (ok=False -> stale).
+    """
+    global _REFRESHER_ACTIVE
+    _REFRESHER_ACTIVE = True
+    failures = 0
+    try:
+        while True:
+            try:
+                snap = await arefresh_now()
+                ok = snap.ok
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("inventory refresh failed")
+                ok = False
+
+            interval = _refresh_interval()
+            if ok:
+                failures = 0
+                delay = interval
+            else:
+                failures += 1
+                delay = min(_backoff_max(), interval * (2 ** min(failures, 10)))
+                log.warning("inventory refresh failed %d time(s) in a row, next try in %.0fs", failures, delay)
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+    finally:
+        _REFRESHER_ACTIVE = False
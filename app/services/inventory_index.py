@@ -0,0 +1,191 @@
+import re
+from bisect import bisect_left
+from heapq import merge
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Positions = Tuple[int, ...]
+VersionKey = Tuple[int, ...]
+
+_VERSION_RE = re.compile(r"\d+(?:\.\d+)*")
+
+
+def parse_version(s: str) -> Optional[VersionKey]:
+    """
+    "iOS 17.4.1" -> (17, 4, 1), "Android 14" -> (14,), "Android Q" -> None
+    """
+    m = _VERSION_RE.search(s or "")
+    if not m:
+        return None
+    return tuple(int(x) for x in m.group(0).split("."))
+
+
+def _prefix_end(key: VersionKey) -> VersionKey:
+    # pierwszy klucz za wszystkimi z prefiksem `key`: (17,) -> (18,), (17, 4) -> (17, 5)
+    return key[:-1] + (key[-1] + 1,)
+
+
+def _distance(a: VersionKey, b: VersionKey) -> float:
+    # major waży najwięcej, potem minor, patch
+    def num(k: VersionKey) -> float:
+        return sum(x / (1000.0 ** i) for i, x in enumerate(k[:4]))
+    return abs(num(a) - num(b))
+
+
+class InventoryIndex:
+    """
+    Indeks budowany raz na snapshot. Trzyma pozycje (indeksy w items)
+    tylko dostępnych urządzeń, w kolejności z SD, więc filtry zwracają
+    to samo co liniowe przejścia po liście — tylko bez pełnego skanu.
+    """
+
+    __slots__ = ("items", "available", "by_platform", "by_version", "by_platform_version",
+                 "names_lower", "by_name", "version_keys", "os_keys", "os_versions")
+
+    def __init__(self, items: Sequence[Dict[str, Any]]):
+        self.items = items
+        available: List[int] = []
+        by_platform: Dict[str, List[int]] = {}
+        by_version: Dict[str, List[int]] = {}
+        by_pv: Dict[Tuple[str, str], List[int]] = {}
+
+        for i, d in enumerate(items):
+            if not d.get("available"):
+                continue
+            available.append(i)
+            plat = d.get("platform") or ""
+            by_platform.setdefault(plat, []).append(i)
+            for v in dict.fromkeys(d.get("versions") or []):
+                by_version.setdefault(v, []).append(i)
+                by_pv.setdefault((plat, v), []).append(i)
+
+        self.available: Positions = tuple(available)
+        self.by_platform: Dict[str, Positions] = {k: tuple(v) for k, v in by_platform.items()}
+        self.by_version: Dict[str, Positions] = {k: tuple(v) for k, v in by_version.items()}
+        self.by_platform_version: Dict[Tuple[str, str], Positions] = {k: tuple(v) for k, v in by_pv.items()}
+        self.names_lower: Tuple[str, ...] = tuple(str(d.get("name") or "").lower() for d in items)
+        by_name: Dict[str, List[int]] = {}
+        for i in available:
+            by_name.setdefault(self.names_lower[i], []).append(i)
+        self.by_name: Dict[str, Positions] = {k: tuple(v) for k, v in by_name.items()}
+        # sparsowane wersje per urządzenie (tylko dostępne) — do filtra po modelu
+        self.version_keys: Dict[int, Tuple[VersionKey, ...]] = {
+            i: tuple(k for k in map(parse_version, items[i].get("versions") or []) if k is not None)
+            for i in available
+        }
+
+        # per platforma: posortowane (klucz numeryczny, string wersji) — pod bisect
+        self.os_keys: Dict[str, List[VersionKey]] = {}
+        self.os_versions: Dict[str, List[str]] = {}
+        per_plat: Dict[str, List[Tuple[VersionKey, str]]] = {}
+        for (plat, v) in self.by_platform_version:
+            key = parse_version(v)
+            if key is not None:
+                per_plat.setdefault(plat, []).append((key, v))
+        for plat, pairs in per_plat.items():
+            pairs.sort()
+            self.os_keys[plat] = [k for k, _ in pairs]
+            self.os_versions[plat] = [v for _, v in pairs]
+
+    def candidates(self, platform: str = "", version: str = "") -> Positions:
+        """Dostępne urządzenia po platformie i/lub dokładnej wersji OS."""
+        if platform and version:
+            return self.by_platform_version.get((platform, version), ())
+        if version:
+            return self.by_version.get(version, ())
+        if platform:
+            return self.by_platform.get(platform, ())
+        return self.available
+
+    def _platforms(self, platform: str) -> Iterable[str]:
+        return (platform,) if platform else self.os_keys.keys()
+
+    def os_match(self, platform: str, desired: str) -> Optional[Iterable[int]]:
+        """
+        Dopasowanie po prefiksie wersji: "iOS 17" łapie 17, 17.4, 17.4.1;
+        "iOS 17.4" łapie 17.4 i 17.4.x. Pozycje w kolejności z SD (merge
+        posortowanych list). None, gdy `desired` nie ma numeru wersji.
+        """
+        key = parse_version(desired)
+        if key is None:
+            return None
+        end = _prefix_end(key)
+        runs = []
+        for plat in self._platforms(platform):
+            keys = self.os_keys.get(plat)
+            if not keys:
+                continue
+            versions = self.os_versions[plat]
+            lo, hi = bisect_left(keys, key), bisect_left(keys, end)
+            runs.extend(self.by_platform_version[(plat, versions[j])] for j in range(lo, hi))
+        if not runs:
+            return ()
+        if len(runs) == 1:
+            return runs[0]
+        return merge(*runs)
+
+    def nearest_versions(self, platform: str, desired: str, k: int) -> List[Tuple[str, str]]:
+        """
+        k najbliższych dostępnych wersji (platforma, wersja) wokół `desired`
+        — rozchodzimy się w obie strony od przedziału z prefiksem `desired`.
+        Wersje z tym prefiksem (te, które łapie os_match) pomijamy: to nie
+        są alternatywy, tylko żądany OS.
+        """
+        key = parse_version(desired)
+        if key is None or k <= 0:
+            return []
+        end = _prefix_end(key)
+        found: List[Tuple[float, str, str]] = []
+        for plat in self._platforms(platform):
+            keys = self.os_keys.get(plat)
+            if not keys:
+                continue
+            versions = self.os_versions[plat]
+            lo, hi = bisect_left(keys, key) - 1, bisect_left(keys, end)
+            for _ in range(k):
+                if lo >= 0 and (hi >= len(keys) or _distance(keys[lo], key) <= _distance(keys[hi], key)):
+                    found.append((_distance(keys[lo], key), plat, versions[lo]))
+                    lo -= 1
+                elif hi < len(keys):
+                    found.append((_distance(keys[hi], key), plat, versions[hi]))
+                    hi += 1
+                else:
+                    break
+        found.sort(key=lambda t: t[0])
+        return [(plat, v) for _, plat, v in found[:k]]
+
+    def with_names(self, positions: Iterable[int], names: Iterable[str]) -> Iterable[int]:
+        names = frozenset(names)
+        if not names:
+            return ()
+        low = self.names_lower
+        return (i for i in positions if low[i] in names)
+
+    def by_names(self, ranked: Sequence[str]) -> Iterable[int]:
+        """Dostępne urządzenia wg rankingu nazw (w obrębie nazwy — kolejność z SD)."""
+        by_name = self.by_name
+        return (i for name in ranked for i in by_name.get(name, ()))
+
+    def on_platform(self, positions: Iterable[int], platform: str) -> Iterable[int]:
+        items = self.items
+        return (i for i in positions if items[i].get("platform") == platform)
+
+    def with_os(self, positions: Iterable[int], platform: str, desired: str) -> Iterable[int]:
+        """Ten sam warunek co os_match(), ale sprawdzany per urządzenie."""
+        items = self.items
+        if platform:
+            positions = self.on_platform(positions, platform)
+        key = parse_version(desired)
+        if key is None:
+            return (i for i in positions if desired in (items[i].get("versions") or ()))
+        n = len(key)
+        vk = self.version_keys
+        return (i for i in positions if any(k[:n] == key for k in vk.get(i, ())))
+
+    def take(self, positions: Iterable[int], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        items = self.items
+        it = positions if limit is None else islice(positions, max(0, limit))
+        return [items[i] for i in it]
+
+
+EMPTY_INDEX = InventoryIndex(())
@@ -0,0 +1,178 @@
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+_SPLIT_RE = re.compile(r"(?<=[a-z])(?=\d)|(?<=\d)(?=[a-z])")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_model(s: str) -> str:
+    """
+    "iphone15pro" -> "iphone 15 pro", "Galaxy-S23 Ultra" -> "galaxy s 23 ultra"
+    Litery i cyfry rozdzielamy, żeby literówki w sklejonych nazwach
+    nie psuły wszystkich trigramów naraz.
+    """
+    s = _NON_ALNUM_RE.sub(" ", (s or "").lower())
+    s = _SPLIT_RE.sub(" ", s)
+    return " ".join(s.split())
+
+
+def trigrams(norm: str) -> FrozenSet[str]:
+    # jak pg_trgm: każde słowo dopełnione "  " z przodu i " " z tyłu
+    out = set()
+    for w in norm.split():
+        w = f"  {w} "
+        for i in range(len(w) - 2):
+            out.add(w[i:i + 3])
+    return frozenset(out)
+
+
+def key_tokens(norm: str) -> FrozenSet[str]:
+    """
+    Tokeny, które muszą się zgadzać dokładnie: liczby i krótkie oznaczenia
+    serii ("s", "a", "15"). Bez tego "Pixel 9" ~ "Pixel 7" albo
+    "Galaxy A23" ~ "Galaxy S23" miałyby wysokie podobieństwo trigramów.
+    """
+    return frozenset(w for w in norm.split() if _is_key(w))
+
+
+def _is_key(w: str) -> bool:
+    return len(w) <= 2 or w[0].isdigit()
+
+
+def _word_dice(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    ga, gb = trigrams(a), trigrams(b)
+    return 2.0 * len(ga & gb) / (len(ga) + len(gb))
+
+
+class ModelSearchIndex:
+    """
+    Indeks trigramowy nazw modeli z inwentarza (budowany z każdym snapshotem).
+    Nazwy deduplikujemy po lowercase; pierwsza napotkana pisownia jest kanoniczna.
+
+    Kandydatów bierzemy z list postingowych po key_tokens (liczby, oznaczenia
+    serii) — te i tak muszą się zgadzać dokładnie — i dopiero dla nich liczymy
+    wspólne trigramy. Koszt zależy od zapytania, nie od liczby modeli.
+    """
+
+    __slots__ = ("names", "lower", "grams", "keys", "key_postings", "no_keys", "by_lower", "vocab")
+
+    def __init__(self, names: Iterable[str]):
+        self.names: List[str] = []
+        self.lower: List[str] = []
+        self.grams: List[FrozenSet[str]] = []
+        self.keys: List[FrozenSet[str]] = []
+        self.by_lower: Dict[str, int] = {}
+        postings: Dict[str, List[int]] = {}
+        no_keys: List[int] = []
+        vocab = set()
+        for name in names:
+            name = str(name or "").strip()
+            low = name.lower()
+            if not name or low in self.by_lower:
+                continue
+            i = len(self.names)
+            norm = normalize_model(name)
+            g = trigrams(norm)
+            self.by_lower[low] = i
+            self.names.append(name)
+            self.lower.append(low)
+            self.grams.append(g)
+            keys = key_tokens(norm)
+            self.keys.append(keys)
+            vocab.update(w for w in norm.split() if not _is_key(w))
+            for k in keys:
+                postings.setdefault(k, []).append(i)
+            if not keys:
+                no_keys.append(i)
+        self.key_postings: Dict[str, Tuple[int, ...]] = {k: tuple(v) for k, v in postings.items()}
+        self.no_keys: Tuple[int, ...] = tuple(no_keys)
+        # słowa (poza key_tokens) ze wszystkich nazw: "galaxy", "pro", "flip", ...
+        self.vocab: FrozenSet[str] = frozenset(vocab)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.5,
+               containment: bool = False) -> List[Tuple[str, float]]:
+        """
+        Ranking nazw po podobieństwie trigramów.
+          containment=False — współczynnik Dice'a (zapytanie = nazwa modelu),
+          containment=True  — jaka część trigramów nazwy występuje w zapytaniu
+                              (zapytanie = dowolna wiadomość z modelem w środku).
+        Liczby/oznaczenia serii z nazwy muszą wystąpić w zapytaniu (key_tokens).
+        """
+        qnorm = normalize_model(query)
+        q = trigrams(qnorm)
+        qkeys = key_tokens(qnorm)
+        if not q or not self.names:
+            return []
+        cand = set(self.no_keys)
+        postings = self.key_postings
+        for k in qkeys:
+            p = postings.get(k)
+            if p:
+                cand.update(p)
+
+        qn = len(q)
+        grams, keys = self.grams, self.keys
+        scored = []
+        for i in cand:
+            if not keys[i] <= qkeys:
+                continue
+            g = grams[i]
+            shared = len(q & g)
+            if shared < 3 and shared < len(g):
+                continue  # za mało wspólnego, żeby to był ten model
+            n = len(g)
+            dice = 2.0 * shared / (qn + n)
+            score = shared / n if containment else dice
+            if score >= min_score:
+                scored.append((score, dice, i))
+        scored.sort(key=lambda t: (-t[0], -t[1], self.lower[t[2]]))
+        return [(self.names[i], round(score, 3)) for score, _, i in scored[:limit]]
+
+    def canonical(self, query: str, min_score: float = 0.6, containment: bool = False) -> Optional[str]:
+        hit = self.search(query, limit=1, min_score=min_score, containment=containment)
+        return hit[0][0] if hit else None
+
+    def same_variant(self, query: str, name: str) -> bool:
+        """
+        Literówka tak, inny wariant nie. Każde słowo nazwy (liczby i oznaczenia
+        serii sprawdza już search) musi mieć w zapytaniu bliski odpowiednik,
+        a słowo zapytania znane (także z literówką) z innych nazw ("pro",
+        "max", "flip") musi mieć odpowiednik w tej nazwie. Słowa spoza
+        indeksu ("samsung") pomijamy.
+        """
+        qwords = [w for w in normalize_model(query).split() if not _is_key(w)]
+        nwords = [w for w in normalize_model(name).split() if not _is_key(w)]
+        close = lambda a, words: any(_word_dice(a, b) >= 0.5 for b in words)
+        if not all(close(w, qwords) for w in nwords):
+            return False
+        vocab = self.vocab
+        return all(close(q, nwords) or not (q in vocab or close(q, vocab)) for q in qwords)
+
+    def rank(self, needle: str, min_score: float = 0.6) -> List[str]:
+        """
+        Nazwy (lowercase) pasujące do `needle`, od najlepszej: najpierw
+        zawierające needle jako substring, a gdy takich brak — z literówką,
+        ale tylko ten sam wariant (same_variant): "galaxy z flip 5" nie
+        trafia w "Galaxy Z Fold5", "pixle 7" nie w "Pixel 7 Pro".
+        """
+        needle = (needle or "").lower()
+        hits = [low for low in self.lower if needle in low]
+        if hits:
+            q = trigrams(normalize_model(needle))
+
+            def dice(low: str) -> float:
+                g = self.grams[self.by_lower[low]]
+                return 2.0 * len(q & g) / (len(q) + len(g)) if (q or g) else 0.0
+
+            hits.sort(key=lambda low: (-dice(low), low))
+            return hits
+        return [name.lower() for name, _ in self.search(needle, limit=10, min_score=min_score)
+                if self.same_variant(needle, name)]
+
+
+EMPTY_MODELS = ModelSearchIndex(())
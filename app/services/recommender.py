@@ -1,7 +1,9 @@
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
-from .sd_api import fetch_devices_raw
+from .inventory import get_snapshot, current_snapshot, InventorySnapshot, EMPTY_SNAPSHOT, _norm_platform
+from .inventory_index import InventoryIndex
+from .model_search import ModelSearchIndex
 
 def _enabled() -> bool:
     return (os.getenv("RECOMMENDER_ENABLED", "false") or "").lower() == "true"
@@ -12,79 +14,51 @@ def _limit() -> int:
     except Exception:
         return 3
 
-# ---------- Normalizacja pól z Twojego API ----------
+def _snapshot() -> InventorySnapshot:
+    if not _enabled():
+        # bez ENV nic nie rób — pusty snapshot
+        return EMPTY_SNAPSHOT
+    return get_snapshot()
 
-def _norm_platform(v: str) -> str:
-    v = (v or "").strip().lower()
-    if v.startswith("ios") or v == "apple":
-        return "iOS"
-    if v.startswith("android"):
-        return "Android"
-    return ""
+def _inventory() -> List[Dict[str, Any]]:
+    return list(_snapshot().items)
 
-def _clean_version(ver_raw: Any, platform: str) -> str:
-    """
-    "18.6.1\nProductVersion" -> "iOS 18.6.1" (gdy platform='iOS')
-    "7.0" + Android -> "Android 7.0"
-    """
-    s = str(ver_raw or "").strip()
-    if not s:
-        return ""
-    # utnij wszystko po pierwszej linii (często "\nProductVersion")
-    s = s.splitlines()[0].strip()
-    if platform:
-        return f"{platform} {s}"
-    return s
-
-def _group_name(g: Any) -> str:
-    """
-    group może być stringiem ("CLEAN") albo obiektem {"name": "..."}.
-    """
-    if isinstance(g, dict):
-        return str(g.get("name") or "").strip()
-    return str(g or "").strip()
+def model_index() -> Optional[ModelSearchIndex]:
+    """Indeks nazw modeli z bieżącego snapshotu (bez I/O) — dla parsera."""
+    if not _enabled():
+        return None
+    models = current_snapshot().models
+    return models if len(models) else None
 
-def _is_clean_group(name: str) -> bool:
+def _os_alternatives(idx: InventoryIndex, platform: str, desired_os: str, ranked: List[str]) -> List[Dict[str, Any]]:
     """
-    Tylko DOKŁADNIE 'CLEAN' (case-insensitive).
-    Nie łapiemy 'TOCLEAN', 'CLEANING', itp.
+    Po jednym urządzeniu z każdej z k najbliższych wersji OS.
+    Najpierw próbujemy zachować model, potem dowolny.
     """
-    return name.upper() == "CLEAN"
-
-def _status_int(v: Any) -> int:
-    try:
-        return int(v)
-    except Exception:
-        return 0
-
-def _normalize_from_sd(d: Dict[str, Any]) -> Dict[str, Any]:
-    name = d.get("model") or d.get("marketName") or d.get("name") or "Device"
-    platform = _norm_platform(d.get("platform") or "")
-    ver = _clean_version(d.get("version"), platform)
-    versions = [ver] if ver else []
-
-    status = _status_int(d.get("status"))
-    group = _group_name(d.get("group"))
-    ready = bool(d.get("ready"))
-    present = bool(d.get("present"))
-
-    available = _is_clean_group(group) and status == 3 and ready and present
-
-    return {
-        "name": name,
-        "platform": platform,
-        "versions": versions,
-        "available": available,
-        # pomocniczo w debugach
-        "_raw": {"group": group, "status": status, "ready": ready, "present": present},
-    }
-
-def _inventory() -> List[Dict[str, Any]]:
-    if not _enabled():
-        # bez ENV nic nie rób — pusta lista
-        return []
-    raw = fetch_devices_raw()
-    return [_normalize_from_sd(x) for x in raw]
+    nearest = idx.nearest_versions(platform, desired_os, _limit())
+    for names in ((ranked, None) if ranked else (None,)):
+        out = []
+        for key in nearest:
+            positions = idx.by_platform_version[key]
+            if names:
+                positions = idx.with_names(positions, names)
+            out.extend(idx.take(positions, 1))
+        if out:
+            return out
+    return []
+
+def _other_models(idx: InventoryIndex, positions, limit: int) -> List[Dict[str, Any]]:
+    """Po jednym urządzeniu z każdego modelu (kolejność z SD), do limitu."""
+    names = idx.names_lower
+    seen = set()
+    out = []
+    for i in positions:
+        if len(out) >= limit:
+            break
+        if names[i] not in seen:
+            seen.add(names[i])
+            out.extend(idx.take((i,)))
+    return out
 
 # ---------- Główna funkcja dla FSM ----------
 
@@ -94,8 +68,10 @@ def suggest_devices(payload: Dict[str, Any]) -> Dict[str, Any]:
       - status: "match" | "no_match"
       - matches: urządzenia dostępne (CLEAN + Online + ready + present)
                  po filtrze platformy/OS/model
-      - alternatives: (tu nie pokazujemy nic spoza CLEAN)
+      - alternatives: przy braku dopasowania OS — dostępne urządzenia
+                      z najbliższymi wersjami (też tylko CLEAN)
       - reason: powód braku dopasowań
+      - inventory: wersja/wiek snapshotu, na którym oparto wynik
     """
     platform = (payload.get("platform") or "").strip()
     desired_os = (payload.get("os_version") or "").strip()
@@ -103,31 +79,53 @@ def suggest_devices(payload: Dict[str, Any]) -> Dict[str, Any]:
     need_os = (payload.get("need_os_version") or "").lower() == "yes"
     model_specified = device_model and device_model.upper() != "TBD"
 
-    inv = _inventory()
-
-    # 1) tylko dostępne w CLEAN
-    inv_clean_av = [d for d in inv if d.get("available")]
+    snap = _snapshot()
+    idx = snap.index
 
-    # 2) platforma
-    if platform:
-        inv_clean_av = [d for d in inv_clean_av if d["platform"] == platform]
-
-    # 3) OS (jeśli wymagany)
-    if need_os and desired_os:
-        inv_clean_av = [d for d in inv_clean_av if desired_os in (d.get("versions") or [])]
-
-    # 4) model (substring, jeśli podany)
-    if model_specified:
-        needle = device_model.lower()
-        inv_clean_av = [d for d in inv_clean_av if needle in d["name"].lower()]
-
-    if inv_clean_av:
-        return {"status": "match", "matches": inv_clean_av[:_limit()], "alternatives": []}
+    os_filter = need_os and desired_os
+    # "iOS 17" bez wybranej platformy — platformę bierzemy z wersji
+    os_hint = _norm_platform(desired_os) if os_filter else ""
+    os_platform = platform or os_hint
+    ranked = snap.models.rank(device_model) if model_specified else []
 
+    if os_hint and platform and os_hint != platform:
+        # np. platform=iOS, a OS "Android 14" — nic nie pasuje
+        positions = ()
+    elif model_specified:
+        # 4) model: najpierw ranking nazw (substring, potem literówki), potem filtry
+        positions = idx.by_names(ranked)
+        if os_filter:
+            positions = idx.with_os(positions, os_platform, desired_os)
+        elif platform:
+            positions = idx.on_platform(positions, platform)
+    else:
+        # 1) tylko dostępne w CLEAN, 2) platforma, 3) OS (jeśli wymagany) — z indeksu
+        positions = idx.os_match(os_platform, desired_os) if os_filter else None
+        if positions is None:
+            # bez numeru wersji (albo bez filtra OS) — dokładne dopasowanie jak dawniej
+            positions = idx.candidates(os_platform, desired_os if os_filter else "")
+
+    matches = idx.take(positions, _limit())
+    if matches:
+        return {"status": "match", "matches": matches, "alternatives": [], "inventory": snap.meta()}
+
+    alternatives = []
     reason = "No CLEAN devices matching your constraints are available right now."
-    if need_os and desired_os:
+    if os_filter and not (os_hint and platform and os_hint != platform):
+        on_os = idx.os_match(os_platform, desired_os)
+        if on_os is None:
+            on_os = idx.candidates(os_platform, desired_os)
+        on_os = tuple(on_os)
+        if model_specified and on_os:
+            # żądany OS jest dostępny — pusty wynik zrobił filtr modelu
+            reason = f"No available CLEAN units of '{device_model}' with {desired_os} right now."
+            alternatives = _other_models(idx, on_os, _limit())
+        else:
+            reason = f"No CLEAN device with {desired_os} is available right now."
+            alternatives = _os_alternatives(idx, os_platform, desired_os, ranked)
+    elif os_filter:
         reason = f"No CLEAN device with {desired_os} is available right now."
     elif model_specified:
         reason = f"No available CLEAN units of '{device_model}'."
 
-    return {"status": "no_match", "matches": [], "alternatives": [], "reason": reason}
+    return {"status": "no_match", "matches": [], "alternatives": alternatives, "reason": reason, "inventory": snap.meta()}
@@ -1,8 +1,35 @@
+import asyncio
+import itertools
 import os
-from typing import List, Dict, Any, Tuple, Union
-import requests
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import ContextVar, copy_context
+from typing import List, Dict, Any, Tuple, Union, Optional, TYPE_CHECKING
 
-_LAST_FETCH_LOG: List[Dict[str, Any]] = []
+if TYPE_CHECKING:  # httpx (~100 ms importu) ładujemy przy pierwszym fetchu, nie przy starcie workera
+    import httpx
+
+from app.core.metrics import SD_FETCH_ATTEMPTS, STAGE_SECONDS
+from app.core.tracing import span
+
+# próby z ostatnich fetchy (kilka może lecieć naraz: refresher, request, /debug/raw),
+# każda oznaczona numerem swojego fetcha; deque — append z obcięciem atomowy pod GIL
+_FETCH_LOG: deque = deque(maxlen=64)
+_FETCH_SEQ = itertools.count(1)
+_FETCH_ID: ContextVar[int] = ContextVar("sd_fetch_id", default=0)
+
+_FETCH_SECONDS = STAGE_SECONDS.labels("sd_fetch")
+
+# zapamiętany działający endpoint: (base, url) — do pierwszej porażki
+_WINNER: Optional[Tuple[str, str]] = None
+_DISCOVERY_LOCK = threading.Lock()
+
+# współdzielone klienty HTTP (pula + keep-alive): sync dla starych wywołań, async dla refreshera
+_CLIENT: Optional["httpx.Client"] = None
+_ACLIENT: Optional["httpx.AsyncClient"] = None
+_CLIENT_LOCK = threading.Lock()
 
 def _cfg() -> Tuple[str, str, float]:
     base = (os.getenv("SD_API_BASE", "") or "").strip().strip('"').rstrip("/")
@@ -10,6 +37,65 @@ def _cfg() -> Tuple[str, str, float]:
     tout = float(os.getenv("SD_API_TIMEOUT", "6"))
     return base, key, tout
 
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+def _pool_cfg() -> Tuple["httpx.Limits", "httpx.Timeout"]:
+    """
+    SD_API_POOL_SIZE        — max połączeń w puli (domyślnie 10)
+    SD_API_CONNECT_TIMEOUT  — timeout nawiązania połączenia (domyślnie SD_API_TIMEOUT)
+    SD_API_READ_TIMEOUT     — timeout odczytu (domyślnie SD_API_TIMEOUT)
+    """
+    import httpx
+    _, _, tout = _cfg()
+    try:
+        size = max(1, int(os.getenv("SD_API_POOL_SIZE", "10")))
+    except Exception:
+        size = 10
+    limits = httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=60.0)
+    timeout = httpx.Timeout(
+        tout,
+        connect=_float_env("SD_API_CONNECT_TIMEOUT", tout),
+        read=_float_env("SD_API_READ_TIMEOUT", tout),
+    )
+    return limits, timeout
+
+def _client() -> "httpx.Client":
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                import httpx
+                limits, timeout = _pool_cfg()
+                _CLIENT = httpx.Client(limits=limits, timeout=timeout)
+    return _CLIENT
+
+def _aclient() -> "httpx.AsyncClient":
+    # tworzony leniwie w pętli, która go używa (refresher w lifespan)
+    global _ACLIENT
+    if _ACLIENT is None:
+        import httpx
+        limits, timeout = _pool_cfg()
+        _ACLIENT = httpx.AsyncClient(limits=limits, timeout=timeout)
+    return _ACLIENT
+
+def close_clients():
+    global _CLIENT
+    client, _CLIENT = _CLIENT, None
+    if client is not None:
+        client.close()
+
+async def aclose_clients():
+    """Zamyka obie pule — wołane przy shutdown aplikacji."""
+    global _ACLIENT
+    aclient, _ACLIENT = _ACLIENT, None
+    if aclient is not None:
+        await aclient.aclose()
+    close_clients()
+
 def _headers(api_key: str) -> Dict[str, str]:
     h = {"Accept": "application/json"}
     if api_key:
@@ -17,13 +103,22 @@ def _headers(api_key: str) -> Dict[str, str]:
     return h
 
 def _log_attempt(url: str, status: Union[int, str], count: int, note: str = ""):
-    global _LAST_FETCH_LOG
-    _LAST_FETCH_LOG.append({"url": url, "status": status, "count": count, "note": note})
-    if len(_LAST_FETCH_LOG) > 12:
-        _LAST_FETCH_LOG = _LAST_FETCH_LOG[-12:]
+    # log trzyma ostatnie próby; metryka liczy wszystkie (/metrics)
+    SD_FETCH_ATTEMPTS.inc(url, status)
+    _FETCH_LOG.append({"fetch": _FETCH_ID.get(), "ts": round(time.time(), 3),
+                       "url": url, "status": status, "count": count, "note": note})
+
+def get_fetch_log() -> List[Dict[str, Any]]:
+    """Wszystkie zapamiętane próby, od najstarszej."""
+    return list(_FETCH_LOG)
 
 def get_last_fetch_log() -> List[Dict[str, Any]]:
-    return _LAST_FETCH_LOG or []
+    """Próby najnowszego fetcha (bez przeplotu z równoległymi)."""
+    entries = list(_FETCH_LOG)
+    if not entries:
+        return []
+    last = max(e["fetch"] for e in entries)
+    return [e for e in entries if e["fetch"] == last]
 
 def _extract_list(data: Any) -> List[Dict[str, Any]]:
     if isinstance(data, list):
@@ -49,55 +144,318 @@ def _extract_list(data: Any) -> List[Dict[str, Any]]:
                     return out
     return []
 
-def _try_get(url: str, headers: Dict[str, str], timeout: float) -> Tuple[int, List[Dict[str, Any]], str]:
-    try:
-        r = requests.get(url, headers=headers, timeout=timeout)
-        status = r.status_code
-        if status != 200:
-            text = ""
-            try:
-                text = r.text
-                if len(text) > 200:
-                    text = text[:200] + "..."
-            except Exception:
-                pass
-            return status, [], text
+def _read_response(r: "httpx.Response") -> Tuple[int, List[Dict[str, Any]], str]:
+    status = r.status_code
+    if status != 200:
+        text = ""
         try:
-            data = r.json()
+            text = r.text
+            if len(text) > 200:
+                text = text[:200] + "..."
         except Exception:
-            return status, [], "non-JSON response"
-        arr = _extract_list(data)
-        return status, arr if isinstance(arr, list) else [], ""
-    except requests.RequestException as e:
-        return -1, [], f"request error: {e!r}"
-    except Exception as e:
-        return -2, [], f"unexpected error: {e!r}"
+            pass
+        return status, [], text
+    try:
+        data = r.json()
+    except Exception:
+        return status, [], "non-JSON response"
+    arr = _extract_list(data)
+    return status, arr if isinstance(arr, list) else [], ""
 
-def fetch_devices_raw() -> List[Dict[str, Any]]:
+def _try_get(url: str, headers: Dict[str, str]) -> Tuple[int, List[Dict[str, Any]], str]:
+    import httpx
+    with span("sd_attempt", url=url) as sp:
+        try:
+            res = _read_response(_client().get(url, headers=headers))
+        except httpx.HTTPError as e:
+            res = -1, [], f"request error: {e!r}"
+        except Exception as e:
+            res = -2, [], f"unexpected error: {e!r}"
+        sp.set(status=res[0], count=len(res[1]))
+        return res
+
+async def _atry_get(url: str, headers: Dict[str, str]) -> Tuple[int, List[Dict[str, Any]], str]:
+    import httpx
+    with span("sd_attempt", url=url) as sp:
+        try:
+            res = _read_response(await _aclient().get(url, headers=headers))
+        except httpx.HTTPError as e:
+            res = -1, [], f"request error: {e!r}"
+        except Exception as e:
+            res = -2, [], f"unexpected error: {e!r}"
+        sp.set(status=res[0], count=len(res[1]))
+        return res
+
+# ---------- Circuit breaker ----------
+
+class CircuitBreaker:
     """
-    Preferowane: /api/v1/devices (wg Twojego kodu), ale próbujemy też:
-    /api/devices, /devices, /api/public/devices?group=clean
+    closed    — normalnie, liczymy kolejne nieudane fetch'e,
+    open      — po SD_CB_FAILURES porażkach z rzędu; przez SD_CB_COOLDOWN_SEC
+                od razu odmawiamy (negative cache),
+    half_open — po cooldownie przepuszczamy jedną próbę; sukces zamyka,
+                porażka otwiera ponownie.
     """
-    global _LAST_FETCH_LOG
-    _LAST_FETCH_LOG = []
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
 
-    base, key, tout = _cfg()
-    if not base:
-        _log_attempt("<no-base>", "N/A", 0, "SD_API_BASE missing")
-        return []
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.transitions: deque = deque(maxlen=20)
+
+    @staticmethod
+    def _threshold() -> int:
+        try:
+            return max(1, int(os.getenv("SD_CB_FAILURES", "3")))
+        except Exception:
+            return 3
+
+    @staticmethod
+    def _cooldown() -> float:
+        return _float_env("SD_CB_COOLDOWN_SEC", 30.0)
+
+    def _move(self, state: str, reason: str):
+        if state != self.state:
+            self.transitions.append({"ts": time.time(), "from": self.state, "to": state, "reason": reason})
+            self.state = state
+
+    def retry_in(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self._cooldown() - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self._cooldown():
+                    return False
+                self._move(self.HALF_OPEN, "cooldown elapsed")
+            # half-open: tylko jedna próba naraz
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._trial_in_flight = False
+            if ok:
+                self.failures = 0
+                self._move(self.CLOSED, "fetch succeeded")
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self._threshold():
+                self.opened_at = time.monotonic()
+                self._move(self.OPEN, f"{self.failures} consecutive failure(s)")
 
-    headers = _headers(key)
-    candidates = [
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "threshold": self._threshold(),
+                "cooldown_sec": self._cooldown(),
+                "retry_in_sec": round(self.retry_in(), 1),
+                "transitions": list(self.transitions),
+            }
+
+_BREAKER = CircuitBreaker()
+
+def get_breaker_state() -> Dict[str, Any]:
+    return _BREAKER.snapshot()
+
+def _candidates(base: str) -> List[str]:
+    return [
         f"{base}/api/v1/devices",
         f"{base}/api/devices",
         f"{base}/devices",
         f"{base}/api/public/devices?group=clean",
     ]
 
-    for url in candidates:
-        status, arr, note = _try_get(url, headers=headers, timeout=tout)
-        _log_attempt(url, status, len(arr), note)
-        if status == 200 and arr:
-            return arr
+_Result = Tuple[int, List[Dict[str, Any]], str]
 
-    return []
+def _answered(res: Optional[_Result]) -> bool:
+    """SD odpowiedział poprawnie (200 ze sparsowanym JSON-em) — także pustą listą."""
+    return res is not None and res[0] == 200 and not res[2]
+
+def _first_good(results: List[Optional[_Result]]) -> Tuple[bool, Optional[int]]:
+    """
+    Zwycięzca wg kolejności kandydatów: pierwszy z 200 i niepustą listą,
+    ale dopiero gdy wszyscy wcześniejsi już odpowiedzieli (porażką) —
+    filtrowany ?group=clean nie wygra z pełnym /api/v1/devices tylko
+    dlatego, że odpowiedział szybciej.
+      (True, i)     — rozstrzygnięte, wygrywa i,
+      (True, None)  — wszyscy zawiedli,
+      (False, None) — czekamy na wcześniejszych kandydatów.
+    """
+    for i, res in enumerate(results):
+        if res is None:
+            return False, None
+        if res[0] == 200 and res[1]:
+            return True, i
+    return True, None
+
+def _discover(base: str, headers: Dict[str, str]) -> Tuple[Optional[str], List[Dict[str, Any]], bool]:
+    """
+    Odpytuje wszystkich kandydatów równolegle; wygrywa najwcześniejszy na
+    liście, który odda 200 z niepustą listą (_first_good). Na późniejszych
+    nie czekamy. Trzeci element: czy którykolwiek kandydat odpowiedział
+    poprawnie (dla circuit breakera).
+    """
+    candidates = _candidates(base)
+    results: List[Optional[_Result]] = [None] * len(candidates)
+    pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="sd-discovery")
+    # kopia kontekstu na każdą próbę — spany sd_attempt trafią pod bieżący sd_fetch
+    futures = {pool.submit(copy_context().run, _try_get, url, headers): i for i, url in enumerate(candidates)}
+    try:
+        for fut in as_completed(futures):
+            i = futures[fut]
+            status, arr, note = results[i] = fut.result()
+            _log_attempt(candidates[i], status, len(arr), note)
+            decided, win = _first_good(results)
+            if decided:
+                if win is None:
+                    return None, [], any(map(_answered, results))
+                for j, res in enumerate(results):
+                    if res is None:
+                        _log_attempt(candidates[j], "N/A", 0, "abandoned (winner found)")
+                return candidates[win], results[win][1], True
+        return None, [], any(map(_answered, results))
+    finally:
+        # nie czekamy na maruderów — ich wynik i tak nie jest potrzebny
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _memoized_result(url: str, res: Tuple[int, List[Dict[str, Any]], str]) -> Optional[List[Dict[str, Any]]]:
+    status, arr, note = res
+    _log_attempt(url, status, len(arr), note or "memoized")
+    return arr if status == 200 and arr else None
+
+def _begin_fetch() -> Optional[Tuple[str, Dict[str, str]]]:
+    """Wspólny początek fetchy: numer fetcha dla logu, konfiguracja, circuit breaker."""
+    _FETCH_ID.set(next(_FETCH_SEQ))
+
+    base, key, _ = _cfg()
+    if not base:
+        _log_attempt("<no-base>", "N/A", 0, "SD_API_BASE missing")
+        return None
+    if not _BREAKER.allow():
+        _log_attempt("<circuit-open>", "N/A", 0, f"circuit open, retry in {_BREAKER.retry_in():.0f}s")
+        return None
+    return base, _headers(key)
+
+def fetch_devices_raw() -> List[Dict[str, Any]]:
+    """
+    Preferowane: /api/v1/devices (wg Twojego kodu), ale próbujemy też:
+    /api/devices, /devices, /api/public/devices?group=clean
+
+    Discovery (równoległe) robimy raz; zwycięski URL pamiętamy,
+    dopóki nie zawiedzie — wtedy discovery od nowa.
+    Gdy SD leży, circuit breaker od razu zwraca [] (bez czekania na timeouty).
+    Dla breakera sukcesem jest każda poprawna odpowiedź 200, także pusta
+    lista — czy pusty inwentarz coś znaczy, ocenia warstwa snapshotu.
+    """
+    begun = _begin_fetch()
+    if begun is None:
+        return []
+    t0 = time.perf_counter()
+    try:
+        with span("sd_fetch") as sp:
+            arr, answered = _fetch(*begun)
+            sp.set(count=len(arr))
+    except BaseException:
+        _BREAKER.record(False)  # np. anulowanie — nie zostawiamy próby half-open "w locie"
+        raise
+    finally:
+        _FETCH_SECONDS.observe(time.perf_counter() - t0)
+    _BREAKER.record(answered)
+    return arr
+
+def _fetch(base: str, headers: Dict[str, str]) -> Tuple[List[Dict[str, Any]], bool]:
+    global _WINNER
+    winner = _WINNER
+    if winner and winner[0] == base:
+        arr = _memoized_result(winner[1], _try_get(winner[1], headers))
+        if arr is not None:
+            return arr, True
+        _WINNER = None
+
+    with _DISCOVERY_LOCK:
+        # ktoś mógł już odkryć nowy endpoint, gdy czekaliśmy na lock
+        if _WINNER and _WINNER[0] == base and _WINNER != winner:
+            arr = _memoized_result(_WINNER[1], _try_get(_WINNER[1], headers))
+            if arr is not None:
+                return arr, True
+        url, arr, answered = _discover(base, headers)
+        _WINNER = (base, url) if url else None
+        return arr, answered
+
+# ---------- Wersja async (refresher w tle) ----------
+
+async def _adiscover(base: str, headers: Dict[str, str]) -> Tuple[Optional[str], List[Dict[str, Any]], bool]:
+    async def probe(url: str):
+        return url, await _atry_get(url, headers)
+
+    urls = _candidates(base)
+    index = {url: i for i, url in enumerate(urls)}
+    results: List[Optional[_Result]] = [None] * len(urls)
+    tasks = [asyncio.ensure_future(probe(url)) for url in urls]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            url, res = await fut
+            i = index[url]
+            status, arr, note = results[i] = res
+            _log_attempt(url, status, len(arr), note)
+            decided, win = _first_good(results)
+            if decided:
+                if win is None:
+                    return None, [], any(map(_answered, results))
+                for j, r in enumerate(results):
+                    if r is None:
+                        _log_attempt(urls[j], "N/A", 0, "abandoned (winner found)")
+                return urls[win], results[win][1], True
+        return None, [], any(map(_answered, results))
+    finally:
+        pending = [t for t in tasks if not t.done()]
+        for t in pending:
+            t.cancel()
+        # anulowane próby muszą się domknąć (połączenie wraca do puli) zanim wyjdziemy
+        await asyncio.gather(*pending, return_exceptions=True)
+
+async def afetch_devices_raw() -> List[Dict[str, Any]]:
+    """
+    Asynchroniczny odpowiednik fetch_devices_raw() na współdzielonej
+    puli AsyncClient — nie blokuje wątku podczas czekania na SD.
+    """
+    begun = _begin_fetch()
+    if begun is None:
+        return []
+    t0 = time.perf_counter()
+    try:
+        with span("sd_fetch") as sp:
+            arr, answered = await _afetch(*begun)
+            sp.set(count=len(arr))
+    except BaseException:
+        _BREAKER.record(False)  # np. anulowanie — nie zostawiamy próby half-open "w locie"
+        raise
+    finally:
+        _FETCH_SECONDS.observe(time.perf_counter() - t0)
+    _BREAKER.record(answered)
+    return arr
+
+async def _afetch(base: str, headers: Dict[str, str]) -> Tuple[List[Dict[str, Any]], bool]:
+    global _WINNER
+    winner = _WINNER
+    if winner and winner[0] == base:
+        arr = _memoized_result(winner[1], await _atry_get(winner[1], headers))
+        if arr is not None:
+            return arr, True
+        _WINNER = None
+
+    url, arr, answered = await _adiscover(base, headers)
+    _WINNER = (base, url) if url else None
+    return arr, answered
@@ -0,0 +1,95 @@
+"""
+POST /webhook/tawk/batch vs osobny POST /webhook/tawk na każdą wiadomość.
+
+Backlog jak po awarii: N rozmów po 12 wiadomości, przeplecionych
+(tura 1 wszystkich sesji, potem tura 2...). Odpowiedzi z batcha muszą
+być identyczne z pojedynczymi requestami (kolejność w sesji zachowana),
+a wyniki wracają w kolejności wejścia. Na koniec izolacja błędów:
+w trybie prod (DEV_SOFT_ERRORS=False) wyjątek jednej wiadomości to 500
+tylko w jej elemencie.
+
+    python -m bench.bench_batch --sessions 200 --batch 500
+"""
+import os
+
+os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", "100000000")
+os.environ.setdefault("RATE_LIMIT_BURST", "100000000")
+os.environ.setdefault("RATE_LIMIT_SESSION_MAX_REQUESTS", "0")
+os.environ.setdefault("WEBHOOK_BATCH_MAX", "1000")
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import app.api.webhook_tawk as webhook
+from app.main import app
+from bench.bench_validators import CONVERSATION
+
+
+def backlog(prefix: str, sessions: int):
+    return [{"session_id": f"{prefix}{i}", "message": msg} for msg in CONVERSATION for i in range(sessions)]
+
+
+async def amain(sessions: int, batch: int):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as c:
+        items = backlog("single", sessions)
+        t0 = time.perf_counter()
+        single = []
+        for it in items:
+            single.append((await c.post("/webhook/tawk", json=it)).json())
+        t_single = time.perf_counter() - t0
+
+        items = backlog("batch", sessions)
+        t0 = time.perf_counter()
+        batched = []
+        for k in range(0, len(items), batch):
+            r = await c.post("/webhook/tawk/batch", json=items[k:k + batch])
+            batched.extend(r.json()["results"])
+        t_batch = time.perf_counter() - t0
+
+        assert batched == single, "batch replies differ from single requests"
+        n = len(items)
+        print(f"{n} messages, {sessions} sessions: identical replies")
+        print(f"single  {t_single / n * 1e6:7.1f} us/message  {n / t_single:8,.0f} msg/s")
+        print(f"batch   {t_batch / n * 1e6:7.1f} us/message  {n / t_batch:8,.0f} msg/s  "
+              f"(batch of {batch}, {webhook._batch_pool._max_workers} workers)")
+
+        # izolacja błędów w trybie prod
+        engine = webhook.get_engine()
+        original = engine.handle_message
+
+        def flaky(sid, msg):
+            if msg == "boom":
+                raise RuntimeError("boom")
+            return original(sid, msg)
+
+        engine.handle_message, soft = flaky, webhook.DEV_SOFT_ERRORS
+        webhook.DEV_SOFT_ERRORS = False
+        webhook.log.disabled = True  # traceback oczekiwanego błędu tylko zaśmieca wynik
+        try:
+            r = await c.post("/webhook/tawk/batch", json=[
+                {"session_id": "iso", "message": "android"},
+                {"session_id": "iso", "message": "boom"},
+                {"session_id": "iso2", "message": "ios"},
+            ])
+        finally:
+            engine.handle_message, webhook.DEV_SOFT_ERRORS = original, soft
+            webhook.log.disabled = False
+        res = r.json()["results"]
+        assert r.status_code == 200 and res[1] == {"error": "Internal Server Error", "status": 500}
+        assert "reply" in res[0] and "reply" in res[2], res
+        print("error isolation: failing item -> 500 in its slot, others answered")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--batch", type=int, default=500)
+    a = ap.parse_args()
+    asyncio.run(amain(a.sessions, a.batch))
+
+
+if __name__ == "__main__":
+    main()
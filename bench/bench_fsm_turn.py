@@ -0,0 +1,62 @@
+"""
+Koszt tury BotEngine w funkcji rozmiaru schematu: do 12 slotów ze
+slots.yaml dokładamy N opcjonalnych slotów tekstowych i liczymy, ile
+walidacji robi jedna tura oraz ile trwa. Przy przyrostowej ocenie
+(SessionState.validated) liczba walidacji nie rośnie z N.
+
+    python -m bench.bench_fsm_turn --extra 0 100 1000
+"""
+import argparse
+import time
+
+from app.core.fsm import BotEngine
+from app.core.slots import Slots
+from bench.bench_validators import CONVERSATION
+
+
+def engine_with_extra(n: int) -> BotEngine:
+    base = Slots.load()
+    order = list(base.order)
+    defs = dict(base.defs)
+    for i in range(n):
+        name = f"extra_{i}"
+        # przed contact_email, żeby pętla musiała je minąć w każdej turze
+        order.insert(len(order) - 1, name)
+        defs[name] = {"type": "string", "required": False}
+    e = BotEngine()
+    e.slots = Slots(order=order, defs=defs)
+    return e
+
+
+def run(n: int, conversations: int):
+    e = engine_with_extra(n)
+    calls = [0]
+    for slot, fn in list(e.slots.validators.items()):
+        def counted(value, fn=fn):
+            calls[0] += 1
+            return fn(value)
+        e.slots.validators[slot] = counted
+
+    turns = 0
+    t0 = time.perf_counter()
+    for i in range(conversations):
+        for msg in CONVERSATION:
+            e.handle_message(f"s{i}", msg)
+            turns += 1
+    dt = time.perf_counter() - t0
+    assert e.sessions.get("s0").current_slot == "confirm"
+    return calls[0] / turns, dt / turns
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--extra", type=int, nargs="+", default=[0, 100, 1000])
+    ap.add_argument("--conversations", type=int, default=200)
+    a = ap.parse_args()
+    for n in a.extra:
+        per_turn, t = run(n, a.conversations)
+        print(f"{12 + n:>5} slots: {per_turn:5.1f} validations/turn  {t * 1e6:8.1f} us/turn")
+
+
+if __name__ == "__main__":
+    main()
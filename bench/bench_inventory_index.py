@@ -0,0 +1,79 @@
+"""
+suggest_devices: liniowe filtry (stara ścieżka) vs InventoryIndex.
+
+    python -m bench.bench_inventory_index
+    python -m bench.bench_inventory_index --sizes 100 10000 100000
+"""
+import argparse
+import time
+from typing import Any, Dict, List, Sequence
+
+from app.services.inventory import _normalize_from_sd
+from app.services.inventory_index import InventoryIndex
+from bench.sd_stub import make_devices
+
+QUERIES = [
+    {"platform": "Android"},
+    {"platform": "iOS", "need_os_version": "Yes", "os_version": "iOS 17.5"},
+    {"platform": "Android", "device_model": "Pixel 7"},
+    {"platform": "iOS", "device_model": "iPhone 15 Pro Max", "need_os_version": "Yes", "os_version": "iOS 17.0"},
+    {"platform": "iOS", "device_model": "Nokia 3310"},  # brak dopasowań — najgorszy przypadek
+]
+LIMIT = 3
+
+
+def legacy(inv: Sequence[Dict[str, Any]], p: Dict[str, Any]) -> List[Dict[str, Any]]:
+    platform = p.get("platform", "")
+    desired_os = p.get("os_version", "")
+    model = p.get("device_model", "")
+    need_os = p.get("need_os_version", "").lower() == "yes"
+    out = [d for d in inv if d.get("available")]
+    if platform:
+        out = [d for d in out if d["platform"] == platform]
+    if need_os and desired_os:
+        out = [d for d in out if desired_os in (d.get("versions") or [])]
+    if model:
+        needle = model.lower()
+        out = [d for d in out if needle in d["name"].lower()]
+    return out[:LIMIT]
+
+
+def indexed(idx: InventoryIndex, p: Dict[str, Any]) -> List[Dict[str, Any]]:
+    need_os = p.get("need_os_version", "").lower() == "yes"
+    pos = idx.candidates(p.get("platform", ""), p.get("os_version", "") if need_os else "")
+    if p.get("device_model"):
+        needle = p["device_model"].lower()
+        # nazw modeli jest dużo mniej niż urządzeń — substring szukamy po kluczach by_name
+        pos = idx.with_names(pos, [n for n in idx.by_name if needle in n])
+    return idx.take(pos, LIMIT)
+
+
+def timeit(fn, reps: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        for q in QUERIES:
+            fn(q)
+    return (time.perf_counter() - t0) / (reps * len(QUERIES))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    a = ap.parse_args()
+
+    print(f"{'devices':>8} {'build ms':>9} {'legacy us':>10} {'index us':>9} {'speedup':>8}")
+    for n in a.sizes:
+        inv = tuple(_normalize_from_sd(d) for d in make_devices(n))
+        t0 = time.perf_counter()
+        idx = InventoryIndex(inv)
+        build = time.perf_counter() - t0
+        for q in QUERIES:
+            assert legacy(inv, q) == indexed(idx, q), q
+        reps = max(3, 200_000 // n)
+        t_old = timeit(lambda q: legacy(inv, q), reps)
+        t_new = timeit(lambda q: indexed(idx, q), reps)
+        print(f"{n:>8} {build * 1000:>9.1f} {t_old * 1e6:>10.1f} {t_new * 1e6:>9.1f} {t_old / t_new:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
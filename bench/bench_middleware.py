@@ -0,0 +1,165 @@
+"""
+Stos middleware: dawne klasy BaseHTTPMiddleware vs czyste ASGI z app.main.
+Te same route'y (app.main.app), te same CORS; różni się tylko
+SizeLimit/RateLimit/NoCacheDev. Requesty idą przez httpx.ASGITransport
+w procesie — bez sieci, więc widać sam narzut warstw.
+
+Najpierw zgodność zachowania (413 po content-length, 429 po limicie IP,
+nagłówki no-cache w dev), potem body chunked ponad limit: dawny stos go
+przepuszczał, nowy liczy odebrane bajty.
+
+    python -m bench.bench_middleware --requests 3000
+"""
+import os
+
+# bench nie może wpaść w limity (per IP i per sesja); ustawiamy przed importem app.main
+os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", "100000000")
+os.environ.setdefault("RATE_LIMIT_BURST", "100000000")
+os.environ.setdefault("RATE_LIMIT_SESSION_MAX_REQUESTS", "0")
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import app.main as main
+from app.core.ratelimit import MemoryRateLimiter
+from bench.bench_validators import CONVERSATION
+
+
+class LegacySizeLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        cl = request.headers.get("content-length")
+        if cl and int(cl) > 256 * 1024:
+            return JSONResponse({"detail":"Payload too large"}, status_code=413)
+        return await call_next(request)
+
+
+_rl_bucket = {}
+_RL_MAX = [main.RATE_LIMIT_MAX]
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        ip = request.client.host if request.client else "0.0.0.0"
+        now = time.time()
+        bucket = _rl_bucket.get(ip, {"cnt": 0, "ts": now})
+        if now - bucket["ts"] > main.RATE_LIMIT_WINDOW:
+            bucket = {"cnt": 0, "ts": now}
+        bucket["cnt"] += 1
+        _rl_bucket[ip] = bucket
+        if bucket["cnt"] > _RL_MAX[0]:
+            return JSONResponse({"detail": "Too many requests"}, status_code=429)
+        return await call_next(request)
+
+
+class LegacyNoCacheDevMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        resp = await call_next(request)
+        if main.APP_ENV == "dev":
+            resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+            resp.headers["Pragma"] = "no-cache"
+            resp.headers["Expires"] = "0"
+        return resp
+
+
+def build(size, rate, nocache) -> FastAPI:
+    a = FastAPI()
+    a.router.routes.extend(main.app.router.routes)
+    a.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
+                     allow_methods=["*"], allow_headers=["*"])
+    a.add_middleware(size)
+    a.add_middleware(rate)
+    a.add_middleware(nocache)
+    return a
+
+
+STACKS = {
+    "BaseHTTPMiddleware": build(LegacySizeLimitMiddleware, LegacyRateLimitMiddleware, LegacyNoCacheDevMiddleware),
+    "pure ASGI": build(main.SizeLimitMiddleware, main.RateLimitMiddleware, main.NoCacheDevMiddleware),
+}
+
+
+def client(a: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=a), base_url="http://bench")
+
+
+async def chunked(n: int):
+    for _ in range(n // 65536 + 1):
+        yield b" " * 65536
+
+
+async def behavior(a: FastAPI):
+    out = []
+    async with client(a) as c:
+        r = await c.get("/health")
+        out.append((r.status_code, r.json(), r.headers.get("cache-control"), r.headers.get("pragma"), r.headers.get("expires")))
+        r = await c.post("/webhook/tawk", content=b"x" * (300 * 1024), headers={"content-type": "application/json"})
+        out.append((r.status_code, r.json()))
+        r = await c.post("/webhook/tawk", json={"session_id": "b1", "message": "android"})
+        out.append((r.status_code, r.json()))
+        # limit 3: dawny licznik w oknie i kubełek z burst=3 odrzucają tak samo 4. i 5. request
+        _rl_bucket.clear()
+        limiter, main._ip_limiter = main._ip_limiter, MemoryRateLimiter("bench", 3, 60, 3)
+        _RL_MAX[0], limit = 3, _RL_MAX[0]
+        try:
+            for _ in range(5):
+                r = await c.get("/health")
+                out.append((r.status_code, r.json()))
+        finally:
+            main._ip_limiter, _RL_MAX[0] = limiter, limit
+            _rl_bucket.clear()
+        r = await c.post("/webhook/tawk", content=chunked(400 * 1024), headers={"content-type": "application/json"})
+        chunk = (r.status_code, r.json().get("detail"))
+    return out, chunk
+
+
+async def load(a: FastAPI, n: int):
+    res = {}
+    async with client(a) as c:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            await c.get("/health")
+        res["/health"] = (time.perf_counter() - t0) / n
+        t0 = time.perf_counter()
+        for i in range(n):
+            msg = CONVERSATION[i % len(CONVERSATION)]
+            await c.post("/webhook/tawk", json={"session_id": f"load{i // len(CONVERSATION)}", "message": msg})
+        res["/webhook/tawk"] = (time.perf_counter() - t0) / n
+    return res
+
+
+async def amain(n: int):
+    legacy, pure = STACKS["BaseHTTPMiddleware"], STACKS["pure ASGI"]
+    (old, old_chunk), (new, new_chunk) = await behavior(legacy), await behavior(pure)
+    assert old == new, (old, new)
+    print(f"behavior identical ({len(new)} checks)")
+    print(f"chunked 400 KiB body: BaseHTTPMiddleware -> {old_chunk}, pure ASGI -> {new_chunk}")
+    assert new_chunk == (413, "Payload too large")
+
+    # rozgrzewka, potem na zmianę, żeby oba stosy miały te same warunki
+    results = {name: [] for name in STACKS}
+    for _ in range(3):
+        for name, a in STACKS.items():
+            results[name].append(await load(a, n))
+    for path in ("/health", "/webhook/tawk"):
+        best = {name: min(r[path] for r in rs[1:]) for name, rs in results.items()}
+        line = "  ".join(f"{name} {t * 1e6:7.1f} us" for name, t in best.items())
+        saved = best["BaseHTTPMiddleware"] - best["pure ASGI"]
+        print(f"{path:14s} {line}   saved {saved * 1e6:6.1f} us/request")
+
+
+def main_():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=3000)
+    a = ap.parse_args()
+    asyncio.run(amain(a.requests))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,54 @@
+"""
+Wyszukiwanie modeli z literówkami (ModelSearchIndex) — budżet < 1 ms
+na zapytanie przy 10k modeli.
+
+    python -m bench.bench_model_search --models 10000
+"""
+import argparse
+import random
+import time
+
+from app.services.model_search import ModelSearchIndex
+
+BRANDS = ["Galaxy", "Pixel", "iPhone", "OnePlus", "Xiaomi", "Redmi", "Moto", "Nokia", "Xperia", "Huawei P"]
+SERIES = ["", "S", "A", "Note ", "Z Fold", "Z Flip", "M", "X", "G", "Edge "]
+SUFFIX = ["", " Pro", " Pro Max", " Ultra", " Plus", " Lite", " FE", " 5G", " Mini", " Neo"]
+
+QUERIES = ["galxy s23", "iphone15pro", "pixle 7 pro", "oneplus 11", "xiaomi 13 lite", "motto g 54",
+           "samsung galaxy z flip 5", "i need 4 iphone 14 pro max in berlin", "nokia 3310", "redmi note 12"]
+
+
+def make_names(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    names = set()
+    while len(names) < n:
+        names.add(f"{rnd.choice(BRANDS)} {rnd.choice(SERIES)}{rnd.randint(1, 60)}{rnd.choice(SUFFIX)}".replace("  ", " "))
+    return sorted(names)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--models", type=int, default=10_000)
+    ap.add_argument("--reps", type=int, default=200)
+    a = ap.parse_args()
+
+    names = make_names(a.models)
+    t0 = time.perf_counter()
+    idx = ModelSearchIndex(names)
+    print(f"{len(idx)} models, build {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    lat = []
+    for _ in range(a.reps):
+        for q in QUERIES:
+            t = time.perf_counter()
+            idx.search(q, containment=len(q) > 24)
+            lat.append(time.perf_counter() - t)
+    lat.sort()
+    pct = lambda p: lat[min(len(lat) - 1, int(p / 100 * len(lat)))] * 1e6
+    print(f"search: p50 {pct(50):.0f} us, p95 {pct(95):.0f} us, p99 {pct(99):.0f} us, max {lat[-1] * 1e6:.0f} us")
+    for q in QUERIES:
+        print(f"  {q!r:40} -> {idx.search(q, limit=2, containment=len(q) > 24)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+parse_message: skompilowany ekstraktor vs dawna implementacja
+(osobny re.search na każde słowo kluczowe).
+
+Mierzy koszt na wiadomość na korpusie realistycznych wiadomości do
+2000 znaków (limit WebhookIn). Identyczność wyników (golden) sprawdza
+tests/test_parser.py — na tej samej implementacji referencyjnej i korpusie.
+
+    python -m bench.bench_parser --messages 2000
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, Optional
+
+import regex as re
+
+from app.core.parsers import (BRAND_RE, COUNTRY_MAP, DATE_RANGE_RE, DEVICE_PAT, EMAIL_RE, QTY_RE_1, QTY_RE_2,
+                              UNK_RE, model_index, parse_message)
+from app.core.slots import Slots
+
+
+def legacy_parse_message(text: str, slots: Slots, expecting: Optional[str] = None) -> Dict[str, Any]:
+    t = (text or "").strip()
+    out: Dict[str, Any] = {}
+    if re.search(r"\bandroid\b", t, re.I): out["platform"] = "Android"
+    if re.search(r"\bios\b|iphone|ipad|apple", t, re.I): out["platform"] = "iOS"
+    m = QTY_RE_1.search(t) or QTY_RE_2.search(t)
+    if m:
+        q = int(m.group(1))
+        if q > 0: out["quantity"] = q
+    m = EMAIL_RE.search(t)
+    if m: out["contact_email"] = m.group(0)
+    m = DATE_RANGE_RE.search(t)
+    if m:
+        out["rental_dates"] = f"{m.group(1)} → {m.group(2)}"
+    acc_vals = slots.defs.get("accessories", {}).get("values", [])
+    sel = [v for v in acc_vals if re.search(rf"\b{re.escape(v)}\b", t, re.I)]
+    if sel: out["accessories"] = sel
+    m = re.search(r"\b(android|ios)\s*([0-9]{1,2})\b", t, re.I)
+    if m:
+        out["os_version"] = f"{m.group(1).capitalize()} {m.group(2)}"
+    m = DEVICE_PAT.search(t)
+    models = model_index()
+    if m:
+        out["device_model"] = re.sub(r"\s+", " ", m.group(0).strip()).title()
+        if models:
+            out["device_model"] = models.canonical(m.group(0), min_score=0.9) or out["device_model"]
+    elif UNK_RE.search(t):
+        out["device_model"] = "TBD"
+    elif models and (expecting == "device_model" or BRAND_RE.search(t)):
+        hit = models.canonical(t, min_score=0.7, containment=True)
+        if hit:
+            out["device_model"] = hit
+    for key, canon in COUNTRY_MAP.items():
+        if re.search(rf"\b{re.escape(key)}\b", t, re.I):
+            out["location"] = canon
+            break
+    if re.search(r"\bother\b", t, re.I):
+        out["location"] = "Other"
+    return out
+
+
+FRAGMENTS = [
+    "Hi", "hello there", "I need", "we want to rent", "3 devices", "10 phones", "need 25", "order 4", "units",
+    "android", "ANDROID", "Android14", "android 13", "iOS 17", "ios", "iphone 15 pro", "iPhone14", "ipad", "Apple",
+    "pineapple", "galaxy s23", "Pixel 7 Pro", "pixel8", "i don't know", "idk", "not sure", "whatever",
+    "poland", "Polska", "pl", "Warsaw", "de", "Deutschland", "berlin", "ghana", "Accra", "GH", "other", "others",
+    "SIM", "sim cards", "tripod", "Charger", "cases", "case", "simple", "2025-01-01 to 2025-01-10",
+    "2025-03-01 → 2025-03-05", "2024-12-24 - 2025-01-02", "qa@corp.io", "john.doe+test@example.co.uk",
+    "thanks!", "ASAP please", "for a test campaign", "deadline is tight", "ok", "yes", "no", "n", "5", "five",
+    "ąęśćżź zażółć gęślą jaźń", "日本語テキスト", "déjà vu", "ſim", "İPHONE 15", "\u212aABEL", "Andro\u0130d", "—", ",", ".", "!!!", "\n",
+]
+
+
+def make_corpus(n: int, seed: int = 3):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        # większość krótka (odpowiedzi na pytania), część długa — do 2000 znaków
+        target = rnd.choice((8, 20, 40, 80, 200, 600, 2000)) if i % 5 == 0 else rnd.choice((4, 10, 30, 60))
+        parts, size = [], 0
+        while size < target:
+            f = rnd.choice(FRAGMENTS)
+            parts.append(f)
+            size += len(f) + 1
+        out.append(" ".join(parts)[:2000])
+    return out
+
+
+def bench(fn, corpus, slots, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        for msg in corpus:
+            fn(msg, slots)
+    return (time.perf_counter() - t0) / (reps * len(corpus))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--reps", type=int, default=3)
+    a = ap.parse_args()
+
+    slots = Slots.load()
+    corpus = make_corpus(a.messages)
+
+    t_old = bench(legacy_parse_message, corpus, slots, a.reps)
+    t_new = bench(parse_message, corpus, slots, a.reps)
+    avg = sum(map(len, corpus)) / len(corpus)
+    print(f"avg message {avg:.0f} chars")
+    print(f"legacy   : {t_old * 1e6:8.1f} us/message")
+    print(f"compiled : {t_new * 1e6:8.1f} us/message  ({t_old / t_new:.1f}x)")
+
+    # długie wiadomości nie mogą być wolniejsze niż dawniej
+    for lo, hi in ((0, 40), (40, 200), (200, 800), (800, 2001)):
+        part = [m for m in corpus if lo <= len(m) < hi]
+        if not part:
+            continue
+        o = bench(legacy_parse_message, part, slots, a.reps)
+        n = bench(parse_message, part, slots, a.reps)
+        print(f"  {lo:>4}-{hi - 1:<4} chars ({len(part):>4} msgs): {o * 1e6:7.1f} -> {n * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
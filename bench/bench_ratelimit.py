@@ -0,0 +1,126 @@
+"""
+Rate limiter: dawny licznik w stałym oknie (dict per IP, bez eviction)
+vs token bucket w pamięci (OrderedDict + LRU) i w SQLite (wspólny dla
+procesów). Koszt allow() przy 100k różnych klientów, pamięć na klucz,
+a do tego:
+  - styk okien: dawny licznik przepuszcza 2x limit w ciągu sekundy,
+    kubełek najwyżej burst + to, co zdążyło dolać,
+  - bezczynne klucze schodzą same (memory) / przez sweep (sqlite),
+  - dwa procesy na jednym pliku SQLite dzielą jeden limit.
+
+    python -m bench.bench_ratelimit --clients 100000 --requests 300000
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app.core.ratelimit import MemoryRateLimiter, SqliteRateLimiter
+
+MAX, WINDOW, BURST = 120, 60, 20
+
+
+class LegacyFixedWindow:
+    def __init__(self):
+        self.bucket = {}
+
+    def allow(self, ip: str, now: float) -> bool:
+        bucket = self.bucket.get(ip, {"cnt": 0, "ts": now})
+        if now - bucket["ts"] > WINDOW:
+            bucket = {"cnt": 0, "ts": now}
+        bucket["cnt"] += 1
+        self.bucket[ip] = bucket
+        return bucket["cnt"] <= MAX
+
+
+def cost(limiter, keys, t0: float) -> float:
+    # zegar symulowany: ruch rozłożony na jedno okno
+    step = WINDOW / len(keys)
+    start = time.perf_counter()
+    for i, k in enumerate(keys):
+        limiter.allow(k, t0 + i * step)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def memory_per_key(make, clients: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    limiter = make()
+    for i in range(clients):
+        limiter.allow(f"ip:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 1000.0)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / clients
+
+
+def edge_burst(limiter) -> int:
+    # MAX requestów tuż przed końcem okna i MAX tuż po — ile przeszło w ciągu ~1 s
+    t = 1000.0
+    limiter.allow("edge", t)
+    passed = 0
+    for i in range(MAX):
+        passed += limiter.allow("edge", t + WINDOW - 0.5 + i * 1e-4)
+    for i in range(MAX):
+        passed += limiter.allow("edge", t + WINDOW + 0.5 + i * 1e-4)
+    return passed
+
+
+def _hammer(path: str, n: int, q):
+    lim = SqliteRateLimiter("shared", MAX, WINDOW, BURST, path)
+    q.put(sum(lim.allow("ip:1.2.3.4") for _ in range(n)))
+    lim.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=100000)
+    ap.add_argument("--requests", type=int, default=300000)
+    a = ap.parse_args()
+
+    rnd = random.Random(7)
+    ips = [f"ip:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(a.clients)]
+    keys = [rnd.choice(ips) for _ in range(a.requests)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        makers = {
+            "legacy fixed window": LegacyFixedWindow,
+            "token bucket memory": lambda: MemoryRateLimiter("bench", MAX, WINDOW, BURST, max_keys=a.clients),
+            "token bucket sqlite": lambda: SqliteRateLimiter("bench", MAX, WINDOW, BURST,
+                                                             os.path.join(tmp, f"rl{time.monotonic_ns()}.db")),
+        }
+        for name, make in makers.items():
+            limiter = make()
+            cost(limiter, ips, 0.0)  # każdy klient już ma kubełek
+            per = cost(limiter, keys, 0.0)
+            per_key = f"{memory_per_key(make, a.clients):6.0f} B/key" if "sqlite" not in name else "   (file)   "
+            print(f"{name:20s} {per * 1e6:6.2f} us/request  {per_key}   "
+                  f"window edge: {edge_burst(make())} of {2 * MAX} passed")
+
+        mem = MemoryRateLimiter("idle", MAX, WINDOW, BURST, max_keys=a.clients)
+        for ip in ips:
+            mem.allow(ip, 0.0)
+        for i in range(a.clients):
+            mem.allow(f"ip:new{i}", mem.idle_sec + 1.0)
+        assert mem.evicted_cap == 0
+        print(f"idle keys: {a.clients} old clients, after refill time {len(mem)} keys left "
+              f"(evicted_idle {mem.evicted_idle}, evicted_cap {mem.evicted_cap})")
+
+        path = os.path.join(tmp, "shared.db")
+        SqliteRateLimiter("shared", MAX, WINDOW, BURST, path).close()
+        q = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_hammer, args=(path, 200, q)) for _ in range(2)]
+        for p in procs:
+            p.start()
+        passed = [q.get() for _ in procs]
+        for p in procs:
+            p.join()
+        print(f"2 processes x 200 requests, one key on shared SQLite: {sum(passed)} passed {passed} (burst {BURST})")
+        assert sum(passed) <= BURST + 2, passed
+
+
+if __name__ == "__main__":
+    main()
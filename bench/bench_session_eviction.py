@@ -0,0 +1,66 @@
+"""
+Ograniczona pamięć sesji (MemorySessionRepo): symulacja długo żyjącego
+poda, do którego ciągle przychodzą nowe czaty, a stare są porzucane.
+
+  1. limit (max_live): ile sesji zostaje żywych, koszt put() z eviction vs bez,
+  2. TTL: po upływie TTL sweep() zdejmuje wszystko, co porzucone
+     (koszt na wyrzuconą sesję), a nowe sesje zostają.
+
+    python -m bench.bench_session_eviction --sessions 200000 --cap 50000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from app.core.fsm import SessionState
+from app.db.repo import MemorySessionRepo
+
+
+def fill(repo: MemorySessionRepo, n: int, prefix: str = "s") -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        repo.put(f"{prefix}{i}", SessionState())
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=200000)
+    ap.add_argument("--cap", type=int, default=50000)
+    a = ap.parse_args()
+
+    for name, cap in (("unbounded", 0), (f"cap={a.cap}", a.cap)):
+        gc.collect()
+        tracemalloc.start()
+        repo = MemorySessionRepo(max_live=cap)
+        per_put = fill(repo, a.sessions)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        st = repo.stats()
+        print(f"{name:12s} live {st['live']:>7}  evicted_cap {st['evicted_cap']:>7}  "
+              f"{per_put * 1e6:5.2f} us/put  ~{size / 2**20:6.1f} MiB")
+        if cap:
+            assert st["live"] == cap and st["evicted_cap"] == a.sessions - cap
+            # LRU: zostały najświeższe
+            assert repo.get(f"s{a.sessions - 1}") is not None and repo.get("s0") is None
+        del repo
+
+    ttl = 0.2
+    repo = MemorySessionRepo(ttl_sec=ttl)
+    fill(repo, a.sessions // 2, "abandoned")
+    time.sleep(ttl * 1.5)
+    # bez ruchu nic nie woła put() — porzucone zdejmuje dopiero sweeper
+    t0 = time.perf_counter()
+    removed = repo.sweep()
+    dt = time.perf_counter() - t0
+    fill(repo, 1000, "active")
+    st = repo.stats()
+    print(f"ttl={ttl}s      live {st['live']:>7}  evicted_ttl {st['evicted_ttl']:>7}  "
+          f"sweep {dt * 1e3:.1f} ms ({dt / max(1, removed) * 1e9:.0f} ns/eviction)")
+    # część porzuconych zdjął już put() w trakcie wypełniania, resztę sweep()
+    assert st["evicted_ttl"] == a.sessions // 2 and st["live"] == 1000 and repo.sweep() == 0, st
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Pamięć żywych sesji: dawny SessionState (dataclass z __dict__, data jako
+dict, validated jako set nazw) vs zwarty (__slots__, SlotData w układzie
+Slots.order, validated jako maska bitowa, internowane wartości enum).
+
+Obie wersje budowane z tych samych rekordów JSON (tak jak po odczycie
+z repozytorium) — stringi z json.loads są świeże, więc internowanie
+ma znaczenie. Mierzone tracemalloc; rozmowy zatrzymane na różnych
+etapach, żeby sesje miały 1..12 wypełnionych slotów.
+
+    python -m bench.bench_session_memory --sessions 100000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Set
+
+from app.core.fsm import BotEngine, NOW_EPOCH, SessionState
+from bench.bench_validators import CONVERSATION
+
+
+@dataclass
+class LegacySessionState:
+    intent: str = "device_rental"
+    data: Dict[str, Any] = field(default_factory=dict)
+    current_slot: str = "platform"
+    last_prompted: str = "platform"
+    errors_in_row: int = 0
+    last_suggestions: list = field(default_factory=list)
+    confirmed: bool = False
+    turns: int = 0
+    updated_at: int = field(default_factory=NOW_EPOCH)
+    validated: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "LegacySessionState":
+        kw = {k: v for k, v in d.items() if k in _LEGACY_FIELDS}
+        kw["validated"] = set(kw.get("validated") or ())
+        return cls(**kw)
+
+
+_LEGACY_FIELDS = frozenset(f.name for f in fields(LegacySessionState))
+
+
+def records(n: int):
+    """Po jednym rekordzie JSON na każdy etap rozmowy; sesje rozkładają się po nich równo."""
+    e = BotEngine()
+    out = []
+    for stage in range(1, len(CONVERSATION) + 1):
+        for msg in CONVERSATION[:stage]:
+            e.handle_message(f"stage{stage}", msg)
+        out.append(json.dumps(e.sessions.get(f"stage{stage}").to_dict()))
+    return [out[i % len(out)] for i in range(n)]
+
+
+def measure(build, blobs):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    live = [build(json.loads(b)) for b in blobs]
+    dt = time.perf_counter() - t0
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return live, size, dt
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=100000)
+    a = ap.parse_args()
+    blobs = records(a.sessions)
+
+    legacy, legacy_size, legacy_dt = measure(LegacySessionState.from_dict, blobs)
+    compact, compact_size, compact_dt = measure(SessionState.from_dict, blobs)
+
+    # ta sama treść: widok dict-like daje to samo co dawny dict
+    for old, new in zip(legacy[:len(CONVERSATION)], compact):
+        assert dict(new.data) == old.data and set(new.to_dict()["validated"]) == old.validated
+    del legacy, compact
+
+    n = a.sessions
+    for name, size, dt in (("legacy", legacy_size, legacy_dt), ("compact", compact_size, compact_dt)):
+        print(f"{name:8s} {size / 2**20:7.1f} MiB  {size / n:6.0f} B/session  "
+              f"from_dict {dt / n * 1e6:5.2f} us")
+    print(f"saved    {(1 - compact_size / legacy_size) * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Repozytorium sesji: koszt handle_message z zapisem stanu dla
+  memory                 — słownik w procesie,
+  sqlite write-behind    — zapis w kolejce, zrzut paczkami w tle,
+  sqlite + LRU           — to samo z LRU gorących sesji (tylko jeden
+                           worker albo sticky routing),
+  sqlite sync            — to samo, ale flush() po każdej wiadomości
+                           (tak wyglądałby zapis bez write-behind).
+Na końcu "restart": nowe repo na tym samym pliku musi odtworzyć
+wszystkie sesje 1:1.
+
+    python -m bench.bench_session_store --conversations 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.core.fsm import BotEngine, SessionState
+from app.db.repo import MemorySessionRepo, SqliteSessionRepo
+from bench.bench_validators import CONVERSATION
+
+
+def run(engine: BotEngine, conversations: int, sync: bool = False):
+    lat = []
+    for i in range(conversations):
+        for msg in CONVERSATION:
+            t0 = time.perf_counter()
+            engine.handle_message(f"s{i}", msg)
+            if sync:
+                engine.sessions.flush()
+            lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return lat[len(lat) // 2], lat[int(len(lat) * 0.99)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=500)
+    a = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("memory", lambda: MemorySessionRepo(), False),
+            ("sqlite write-behind", lambda: SqliteSessionRepo(os.path.join(tmp, "wb.db"), SessionState.from_dict), False),
+            ("sqlite + LRU", lambda: SqliteSessionRepo(os.path.join(tmp, "lru.db"), SessionState.from_dict,
+                                                       cache_size=10000), False),
+            ("sqlite sync", lambda: SqliteSessionRepo(os.path.join(tmp, "sync.db"), SessionState.from_dict), True),
+        ]
+        for name, make, sync in cases:
+            engine = BotEngine(sessions=make())
+            p50, p99 = run(engine, a.conversations, sync)
+            print(f"{name:20s} p50 {p50 * 1e6:8.1f} us   p99 {p99 * 1e6:8.1f} us  per message")
+            engine.sessions.close()
+
+        # restart: wszystko, co było w LRU/kolejce, musi być w pliku
+        path = os.path.join(tmp, "wb.db")
+        engine = BotEngine(sessions=SqliteSessionRepo(path, SessionState.from_dict, cache_size=10000))
+        run(engine, a.conversations)
+        before = {f"s{i}": engine.sessions.get(f"s{i}").to_dict() for i in range(a.conversations)}
+        engine.sessions.close()
+
+        fresh = SqliteSessionRepo(path, SessionState.from_dict, cache_size=0)
+        after = {sid: fresh.get(sid).to_dict() for sid in before}
+        fresh.close()
+        assert before == after, "sessions differ after restart"
+        print(f"restart: {len(after)} sessions restored identically")
+
+
+if __name__ == "__main__":
+    main()
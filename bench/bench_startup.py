@@ -0,0 +1,135 @@
+"""
+Zimny start workera: każda próba to świeży proces Pythona, który robi
+`import app.main` i pierwszą turę silnika. Mierzy:
+  process — cały proces (z uruchomieniem interpretera),
+  import  — samo `import app.main` (to, na co czeka readiness probe),
+  first   — import + pierwsza tura (silnik, slots.yaml, parser),
+oraz — z jednego przebiegu pod -X importtime — najdroższe moduły.
+
+Warianty: artefakt slots.yaml w __pycache__ zimny (usuwany przed każdą
+próbą) albo ciepły. --ref REV mierzy dla porównania drzewo z innego
+commitu (git archive do katalogu tymczasowego), np. sprzed leniwych
+importów.
+
+    python -m bench.bench_startup --trials 10
+    python -m bench.bench_startup --trials 10 --ref HEAD~1
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+from app.api import webhook_tawk as w
+engine = w.get_engine() if hasattr(w, "get_engine") else w._engine
+engine.handle_message("startup-probe", "android")
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_ms": (t2 - t0) * 1000,
+                  "yaml": "yaml" in sys.modules, "httpx": "httpx" in sys.modules}))
+"""
+
+
+def _env(app_env: str, recommender: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(APP_ENV=app_env, RECOMMENDER_ENABLED="true" if recommender else "false", SESSION_STORE="memory")
+    for name in ("PYTHONPATH", "PYTHONDONTWRITEBYTECODE"):
+        env.pop(name, None)
+    return env
+
+
+def _clear_schema_cache(tree: str):
+    for p in glob.glob(os.path.join(tree, "app", "data", "__pycache__", "slots.yaml.*")):
+        os.remove(p)
+
+
+def probe(tree: str, env: Dict[str, str], importtime: bool = False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    t0 = time.perf_counter()
+    r = subprocess.run(cmd, cwd=tree, env=env, capture_output=True, text=True, timeout=120)
+    wall = (time.perf_counter() - t0) * 1000
+    if r.returncode != 0:
+        raise RuntimeError(f"probe failed in {tree}:\n{r.stderr[-2000:]}")
+    out = json.loads(r.stdout.strip().splitlines()[-1])
+    out["process_ms"] = wall
+    return out, r.stderr
+
+
+def top_modules(stderr: str, n: int) -> List[tuple]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:n]
+
+
+def run_tree(label: str, tree: str, trials: int, env: Dict[str, str], cold: bool) -> Dict[str, Any]:
+    probe(tree, env)  # .pyc i (ciepły wariant) artefakt slots.yaml
+    samples: Dict[str, List[float]] = {"process_ms": [], "import_ms": [], "first_ms": []}
+    flags = {}
+    for _ in range(trials):
+        if cold:
+            _clear_schema_cache(tree)
+        out, _ = probe(tree, env)
+        for k in samples:
+            samples[k].append(out[k])
+        flags = {"yaml_loaded": out["yaml"], "httpx_loaded": out["httpx"]}
+    return {"label": label, **{k: round(statistics.median(v), 1) for k, v in samples.items()}, **flags}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--trials", type=int, default=10)
+    ap.add_argument("--ref", help="porównaj z drzewem z tego commitu (git archive)")
+    ap.add_argument("--app-env", default="prod", help="APP_ENV procesów (dev dokłada router /debug)")
+    ap.add_argument("--recommender", action="store_true", help="RECOMMENDER_ENABLED=true")
+    ap.add_argument("--top", type=int, default=12, help="ile najdroższych modułów z -X importtime")
+    ap.add_argument("--out", help="zapisz wynik jako JSON")
+    a = ap.parse_args()
+    env = _env(a.app_env, a.recommender)
+
+    results = []
+    tmp = None
+    if a.ref:
+        tmp = tempfile.TemporaryDirectory(prefix="startup-ref-")
+        archive = subprocess.run(["git", "archive", a.ref], cwd=ROOT, capture_output=True, check=True).stdout
+        subprocess.run(["tar", "-x", "-C", tmp.name], input=archive, check=True)
+        results.append(run_tree(a.ref, tmp.name, a.trials, env, cold=False))
+    results.append(run_tree("schema cache cold", ROOT, a.trials, env, cold=True))
+    results.append(run_tree("schema cache warm", ROOT, a.trials, env, cold=False))
+
+    print(f"median of {a.trials} fresh processes (APP_ENV={a.app_env}, "
+          f"RECOMMENDER_ENABLED={'true' if a.recommender else 'false'})")
+    print(f"{'':20s} {'process':>9s} {'import':>9s} {'1st turn':>9s}   yaml  httpx")
+    for r in results:
+        print(f"{r['label']:20s} {r['process_ms']:7.1f}ms {r['import_ms']:7.1f}ms {r['first_ms']:7.1f}ms"
+              f"   {'yes' if r['yaml_loaded'] else 'no':5s} {'yes' if r['httpx_loaded'] else 'no'}")
+
+    _, stderr = probe(ROOT, env, importtime=True)
+    top = top_modules(stderr, a.top)
+    print("\nslowest modules by self time (-X importtime, import + first turn):")
+    for name, self_us, cum_us in top:
+        print(f"  {self_us / 1000:7.1f}ms self {cum_us / 1000:8.1f}ms cumulative  {name}")
+    if tmp is not None:
+        tmp.cleanup()
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "top_modules": top}, f, indent=2)
+        print(f"written {a.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Koszt śledzenia tur (app/core/tracing.py): tura przez _reply webhooka
+przy różnych TRACE_SAMPLE_RATE — 0 to koszt samego "czy próbkować" i
+no-opów w etapach — oraz zapis do pierścienia z wielu wątków naraz
+(liczba śladów, spójność drzew, filtr po session_id).
+
+    python -m bench.bench_tracing --turns 20000 --threads 8
+"""
+import os
+
+os.environ.setdefault("RATE_LIMIT_SESSION_MAX_REQUESTS", "0")
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.api import webhook_tawk
+from app.core import tracing
+
+MSGS = ["android", "Pixel 7", "3", "yes", "2025-03-01 to 2025-03-10", "Poland", "no", "none", "no", "reset"]
+
+
+def turns(n: int, prefix: str = "t") -> float:
+    reply = webhook_tawk._reply
+    t0 = time.perf_counter()
+    for i in range(n):
+        reply(f"{prefix}{i % 200}", MSGS[(i // 200) % len(MSGS)])
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=20000)
+    ap.add_argument("--threads", type=int, default=8)
+    a = ap.parse_args()
+
+    turns(2000, "warm")
+    for rate in (0.0, 0.01, 1.0):
+        tracing.SAMPLE_RATE = rate
+        tracing._RING.clear()
+        per = turns(a.turns)
+        print(f"sample rate {rate:4.2f}: {per * 1e6:7.2f} us/turn, {len(tracing._RING)} traces stored")
+
+    tracing.SAMPLE_RATE = 1.0
+    tracing._RING.clear()
+    with ThreadPoolExecutor(a.threads) as ex:
+        list(ex.map(lambda t: turns(a.turns // a.threads, f"th{t}-"), range(a.threads)))
+    stored = len(tracing._RING)
+    assert stored == min(tracing.BUFFER_SIZE, a.turns // a.threads * a.threads), stored
+    records = tracing.recent(limit=tracing.BUFFER_SIZE)
+    for r in records:
+        assert r["name"] == "webhook.turn" and r["duration_ms"] is not None, r
+        for child in r.get("children", ()):
+            assert child["duration_ms"] is not None, r
+    sid = records[0]["session_id"]
+    one = tracing.recent(session_id=sid, limit=tracing.BUFFER_SIZE)
+    assert one and all(r["session_id"] == sid for r in one)
+    print(f"{a.threads} threads: ring holds {stored} of {tracing.BUFFER_SIZE}, "
+          f"{len(records)} complete traces, {len(one)} for session {sid}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Walidacja slotów: dawne validate_slot (lookupy w defs + if po typie,
+cztery strptime na zakres dat) vs walidatory kompilowane w Slots.load.
+
+Przepuszcza pełną rozmowę przez BotEngine (wszystkie 12 slotów, z gałęzią
+Other -> VPN i konkretną wersją OS), nagrywa każde wywołanie walidatora
+i mierzy czas ich odtworzenia obiema implementacjami. Zgodność wyników
+(golden, także na EDGE_CASES) sprawdza tests/test_validators.py.
+
+    python -m bench.bench_validators --conversations 200
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import Any, List, Tuple
+
+import regex as re
+
+from app.core.fsm import BotEngine
+from app.core.slots import Slots
+from app.core.validators import EMAIL_RE, MAX_QTY, MAX_RENTAL_DAYS, MIN_RENTAL_DAYS
+
+CONVERSATION = [
+    "Hi, we need Android",
+    "Pixel 7",
+    "I need 3 devices",
+    "yes",
+    "2025-03-01 to 2025-03-14",
+    "other",
+    "yes",
+    "yes",
+    "14",
+    "SIM and charger please",
+    "qa@example.com",
+    "yes",
+]
+
+
+def _legacy_valid_date(s: str) -> bool:
+    try:
+        datetime.strptime(s, "%Y-%m-%d")
+        return True
+    except:
+        return False
+
+
+def legacy_validate_slot(slot: str, value: Any, slots: Slots) -> bool:
+    if value in (None, "", []):
+        return False if slots.defs[slot].get("required", False) else True
+    if slot == "device_model" and str(value).strip().upper() == "TBD":
+        return True
+    typ = slots.defs[slot]["type"]
+    if typ == "enum":
+        return str(value) in slots.defs[slot]["values"]
+    if typ == "multienum":
+        vals = slots.defs[slot]["values"]
+        if not isinstance(value, list):
+            return False
+        cleaned = [v for v in value if v in vals]
+        return len(cleaned) == len(value)
+    if typ == "int":
+        try:
+            q = int(value)
+            return 1 <= q <= MAX_QTY
+        except:
+            return False
+    if typ == "email":
+        return EMAIL_RE.search(str(value)) is not None
+    if typ == "daterange":
+        m = re.search(r"^(\d{4}-\d{2}-\d{2})\s*→\s*(\d{4}-\d{2}-\d{2})$", str(value))
+        if not m: return False
+        d1s, d2s = m.group(1), m.group(2)
+        if not (_legacy_valid_date(d1s) and _legacy_valid_date(d2s)): return False
+        d1, d2 = datetime.strptime(d1s, "%Y-%m-%d"), datetime.strptime(d2s, "%Y-%m-%d")
+        if d2 < d1: return False
+        days = (d2 - d1).days + 1
+        return MIN_RENTAL_DAYS <= days <= MAX_RENTAL_DAYS
+    if typ == "yesno":
+        v = str(value).strip().lower()
+        return v in ("yes", "no")
+    return True
+
+
+# wartości brzegowe — obie implementacje muszą się zgadzać także tu
+EDGE_CASES = [
+    ("rental_dates", "2025-02-28 → 2025-03-01"), ("rental_dates", "2025-02-30 → 2025-03-01"),
+    ("rental_dates", "2025-03-02 → 2025-03-01"), ("rental_dates", "2025-01-01 → 2025-12-31"),
+    ("rental_dates", "2025-01-01→2025-01-01"), ("rental_dates", "2025-1-01 → 2025-01-02"),
+    ("rental_dates", "0000-01-01 → 2025-01-02"), ("rental_dates", "2025-01-01 → 2025-01-02\n"),
+    ("quantity", "0"), ("quantity", 201), ("quantity", "12"), ("quantity", True), ("quantity", "x"),
+    ("accessories", ["SIM", {"x": 1}]), ("accessories", "SIM"), ("accessories", []), ("accessories", ["Case"]),
+    ("platform", "ios"), ("platform", "iOS"), ("location", "Other"), ("device_model", " tbd "),
+    ("device_model", ""), ("note", None), ("need_same_model", " YES "), ("contact_email", "a@b"),
+]
+
+
+def record(engine: BotEngine, conversations: int) -> List[Tuple[str, Any]]:
+    calls: List[Tuple[str, Any]] = []
+    original = dict(engine.slots.validators)
+
+    def recording(slot):
+        fn = original[slot]
+        def wrapped(value):
+            calls.append((slot, value))
+            return fn(value)
+        return wrapped
+
+    engine.slots.validators.update({slot: recording(slot) for slot in original})
+    try:
+        for i in range(conversations):
+            for msg in CONVERSATION:
+                engine.handle_message(f"s{i}", msg)
+    finally:
+        engine.slots.validators.update(original)
+    return calls
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=200)
+    ap.add_argument("--reps", type=int, default=5)
+    a = ap.parse_args()
+
+    engine = BotEngine()
+    slots = engine.slots
+    calls = record(engine, a.conversations)
+    per_conv = len(calls) / a.conversations
+    compiled = slots.validators
+
+    def run_legacy():
+        for slot, value in calls:
+            legacy_validate_slot(slot, value, slots)
+
+    def run_compiled():
+        for slot, value in calls:
+            compiled[slot](value)
+
+    results = {}
+    for name, fn in (("legacy", run_legacy), ("compiled", run_compiled)):
+        t0 = time.perf_counter()
+        for _ in range(a.reps):
+            fn()
+        results[name] = (time.perf_counter() - t0) / (a.reps * a.conversations)
+
+    print(f"{per_conv:.0f} validations per 12-slot conversation ({len(CONVERSATION)} turns)")
+    for name, t in results.items():
+        print(f"{name:9s}: {t * 1e6:8.1f} us/conversation")
+    print(f"speedup  : {results['legacy'] / results['compiled']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
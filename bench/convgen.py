@@ -0,0 +1,131 @@
+"""
+Generator syntetycznych rozmów dla benchmarków i testów obciążeniowych.
+
+Każda rozmowa to "persona" (platforma, model, ilość, daty, lokalizacja...)
+wypowiedziana jako ciąg wiadomości: czasem kilka slotów w jednej
+wiadomości, odpowiedzi nie zawsze w kolejności pytań, literówki, wtrącenia,
+reset w połowie i potwierdzenie na końcu. Deterministyczny dla danego seed.
+
+    from bench.convgen import generate
+    convs = generate(1000, seed=1)   # List[List[str]]
+"""
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+MODELS = {
+    "Android": ["Pixel 7", "Pixel 8 Pro", "Galaxy S23", "Galaxy A54", "OnePlus 11", "Xiaomi 13"],
+    "iOS": ["iPhone 13", "iPhone 14 Pro", "iPhone 15", "iPhone 15 Pro Max", "iPad Air"],
+}
+OS = {"Android": ["11", "12", "13", "14"], "iOS": ["16", "17", "17.5", "18"]}
+LOCATIONS = ["Poland", "Germany", "Ghana", "Other"]
+ACCESSORIES = ["SIM", "Tripod", "Charger", "Case"]
+FILLERS = ["hmm", "what?", "wait", "ok", "not sure yet", "can you repeat?", "thanks"]
+NOTES = ["rugged cases please", "need them charged", "for a demo day", "asap", "no scratches please"]
+
+
+def _typo(rnd: random.Random, text: str) -> str:
+    words = text.split(" ")
+    idx = [i for i, w in enumerate(words) if len(w) >= 4 and w.isalpha()]
+    if not idx:
+        return text
+    i = rnd.choice(idx)
+    w = words[i]
+    j = rnd.randrange(1, len(w) - 1)
+    kind = rnd.randrange(3)
+    if kind == 0:
+        w = w[:j] + w[j + 1] + w[j] + w[j + 2:]   # zamiana sąsiednich
+    elif kind == 1:
+        w = w[:j] + w[j + 1:]                       # brak litery
+    else:
+        w = w[:j] + w[j] + w[j:]                    # podwójna litera
+    words[i] = w
+    return " ".join(words)
+
+
+def _persona(rnd: random.Random) -> Dict[str, str]:
+    platform = rnd.choice(("Android", "iOS"))
+    start = date(2025, 1, 1) + timedelta(days=rnd.randrange(300))
+    end = start + timedelta(days=rnd.randrange(2, 40))
+    return {
+        "platform": platform,
+        "model": rnd.choice(MODELS[platform]) if rnd.random() < 0.8 else "",
+        "qty": str(rnd.choice((1, 2, 3, 5, 10, 25))),
+        "same": rnd.choice(("yes", "no")),
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "location": rnd.choice(LOCATIONS),
+        "vpn": rnd.choice(("yes", "no")),
+        "need_os": rnd.choice(("yes", "no")),
+        "os": rnd.choice(OS[platform]),
+        "acc": ", ".join(rnd.sample(ACCESSORIES, rnd.randrange(0, 3))),
+        "note": rnd.choice(NOTES) if rnd.random() < 0.3 else "",
+        "email": f"qa{rnd.randrange(10000)}@example.com",
+    }
+
+
+def _answers(rnd: random.Random, p: Dict[str, str]) -> List[Tuple[str, str]]:
+    """(slot, wiadomość) w kolejności pytań bota."""
+    out = [
+        ("platform", rnd.choice((p["platform"], p["platform"].lower(), f"we need {p['platform']}"))),
+        ("device_model", p["model"] or rnd.choice(("I don't know", "idk", "any"))),
+        ("quantity", rnd.choice((p["qty"], f"I need {p['qty']} devices", f"{p['qty']} units"))),
+        ("need_same_model", p["same"]),
+        ("rental_dates", rnd.choice((f"{p['start']} to {p['end']}", f"{p['start']} → {p['end']}",
+                                     f"from {p['start']} until {p['end']}"))),
+        ("location", p["location"] if p["location"] != "Other" else rnd.choice(("other", "Kenya", "somewhere else"))),
+    ]
+    if p["location"] == "Other":
+        out.append(("vpn_ok", p["vpn"]))
+    out.append(("need_os_version", p["need_os"]))
+    if p["need_os"] == "yes":
+        out.append(("os_version", rnd.choice((f"{p['platform']} {p['os']}", p["os"]))))
+    out.append(("accessories", p["acc"] or "none"))
+    out.append(("note", p["note"] or "no"))
+    out.append(("contact_email", rnd.choice((p["email"], f"mail me at {p['email']}"))))
+    return out
+
+
+def _opener(rnd: random.Random, p: Dict[str, str]) -> Tuple[str, int]:
+    """Jedna wiadomość z kilkoma slotami naraz; zwraca też, ile pierwszych odpowiedzi pokrywa."""
+    parts = [f"I want {p['qty']} {p['model'] or p['platform']} devices"]
+    covered = 3
+    if rnd.random() < 0.6:
+        parts.append(f"from {p['start']} to {p['end']}")
+    if p["location"] != "Other" and rnd.random() < 0.6:
+        parts.append(f"in {p['location']}")
+    if rnd.random() < 0.3:
+        parts.append(f"email {p['email']}")
+    return " ".join(parts), covered
+
+
+def conversation(rnd: random.Random) -> List[str]:
+    p = _persona(rnd)
+    answers = _answers(rnd, p)
+    msgs: List[str] = []
+    if rnd.random() < 0.4:
+        opener, covered = _opener(rnd, p)
+        msgs.append(opener)
+        rest = [a for _, a in answers[covered:]]
+    else:
+        rest = [a for _, a in answers]
+    # część odpowiedzi nie po kolei
+    for _ in range(rnd.randrange(0, 3)):
+        if len(rest) > 2:
+            i = rnd.randrange(len(rest) - 1)
+            rest[i], rest[i + 1] = rest[i + 1], rest[i]
+    for a in rest:
+        if rnd.random() < 0.08:
+            msgs.append(rnd.choice(FILLERS))
+        msgs.append(_typo(rnd, a) if rnd.random() < 0.12 else a)
+    if rnd.random() < 0.05:
+        # reset w połowie i rozmowa od nowa
+        cut = rnd.randrange(1, len(msgs))
+        msgs = msgs[:cut] + ["reset"] + msgs
+    msgs.append(rnd.choice(("yes", "yes", "ok", "no")))
+    return msgs
+
+
+def generate(n: int, seed: int = 1) -> List[List[str]]:
+    rnd = random.Random(seed)
+    return [conversation(rnd) for _ in range(n)]
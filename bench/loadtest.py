@@ -0,0 +1,274 @@
+"""
+Test obciążeniowy całego serwisu: stub SD API (bench.sd_stub) + aplikacja
+w procesie (httpx.ASGITransport, z lifespanem) albo pod uvicornem
+(osobny proces, --workers N), a przez POST /webhook/tawk leci N rozmów
+z bench.convgen, C naraz — każda wiadomość czeka na odpowiedź poprzedniej,
+jak w prawdziwym czacie.
+
+Raport: przepustowość, p50/p95/p99/max latencji webhooka, błędy (HTTP
+i odpowiedzi "(dev) Error"), RSS (uvicorn: per worker; w procesie: cały
+proces razem z generatorem ruchu) i statystyki stuba. Z --sd-latency-ms,
+--sd-error-rate i --no-refresher widać, ile wolny SD przecieka do
+latencji webhooka (bez refreshera snapshot odświeża ścieżka requestu).
+Generator ruchu zjada CPU — przy mierzeniu przepustowości uvicorna
+powinien mieć własne rdzenie (albo maszynę).
+
+    python -m bench.loadtest --conversations 2000 --concurrency 500
+    python -m bench.loadtest --mode uvicorn --workers 2 --sd-latency-ms 300 --no-refresher --out load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+from bench import sd_stub
+from bench.convgen import generate
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_kib(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _workers(pid: int) -> List[int]:
+    """Dzieci procesu uvicorna, które obsługują requesty (bez resource_trackera multiprocessing)."""
+    out = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # pole 4 to ppid; nazwa w nawiasach może mieć spacje
+                if int(f.read().rsplit(")", 1)[1].split()[1]) != pid:
+                    continue
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                if b"resource_tracker" in f.read():
+                    continue
+            out.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            pass
+    return out
+
+
+class RssSampler:
+    """Co interval próbkuje RSS procesów (pid -> max KiB)."""
+
+    def __init__(self, pids_fn, interval: float = 0.5):
+        self.pids_fn = pids_fn
+        self.interval = interval
+        self.peak: Dict[int, int] = {}
+        self.last: Dict[int, int] = {}
+
+    def sample(self):
+        for pid in self.pids_fn():
+            kib = _rss_kib(pid)
+            if kib:
+                self.last[pid] = kib
+                self.peak[pid] = max(self.peak.get(pid, 0), kib)
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+def percentile(s: List[float], q: float) -> float:
+    return s[min(len(s) - 1, int(q * len(s)))] if s else 0.0
+
+
+async def drive(client: httpx.AsyncClient, convs: List[List[str]], concurrency: int, think_ms: float):
+    lat: List[float] = []
+    status: Counter = Counter()
+    soft_errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def converse(i: int, msgs: List[str]):
+        nonlocal soft_errors
+        async with sem:
+            for msg in msgs:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/webhook/tawk", json={"session_id": f"load{i}", "message": msg})
+                    code = r.status_code
+                    if code == 200 and r.json().get("reply", "").startswith("(dev) Error"):
+                        soft_errors += 1
+                except httpx.HTTPError as e:
+                    code = type(e).__name__
+                lat.append(time.perf_counter() - t0)
+                status[code] += 1
+                if think_ms:
+                    await asyncio.sleep(think_ms / 1000.0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(converse(i, c) for i, c in enumerate(convs)))
+    return lat, status, soft_errors, time.perf_counter() - t0
+
+
+def app_env(a, sd_base: str) -> Dict[str, str]:
+    env = {
+        "SD_API_BASE": sd_base,
+        "RECOMMENDER_ENABLED": "true",
+        "INVENTORY_REFRESHER": "false" if a.no_refresher else "true",
+        # generator ruchu to jedno IP, a rozmowy są szybsze niż ludzkie — limity by je cięły
+        "RATE_LIMIT_MAX_REQUESTS": "1000000000",
+        "RATE_LIMIT_BURST": "1000000000",
+        "RATE_LIMIT_SESSION_MAX_REQUESTS": "0",
+    }
+    if a.inventory_ttl is not None:
+        env["INVENTORY_TTL_SEC"] = str(a.inventory_ttl)
+    return env
+
+
+async def run_inproc(a, convs, env) -> Dict[str, Any]:
+    os.environ.update(env)
+    from app.main import app
+
+    sampler = RssSampler(lambda: [os.getpid()])
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60.0) as client:
+            sampler.sample()
+            task = asyncio.create_task(sampler.run())
+            try:
+                result = await drive(client, convs, a.concurrency, a.think_ms)
+            finally:
+                task.cancel()
+            sampler.sample()
+    return {"result": result, "rss": sampler, "workers": [os.getpid()]}
+
+
+async def run_uvicorn(a, convs, env) -> Dict[str, Any]:
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(a.workers), "--log-level", "warning", "--no-access-log"]
+    proc = subprocess.Popen(cmd, env={**os.environ, **env})
+    base = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=min(a.concurrency, a.max_connections),
+                              max_keepalive_connections=min(a.concurrency, a.max_connections))
+        async with httpx.AsyncClient(base_url=base, timeout=60.0, limits=limits) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline or proc.poll() is not None:
+                    raise RuntimeError("uvicorn did not start")
+                await asyncio.sleep(0.2)
+
+            # przy --workers > 1 requesty obsługują dzieci procesu głównego
+            workers = lambda: _workers(proc.pid) if a.workers > 1 else [proc.pid]
+            sampler = RssSampler(workers)
+            sampler.sample()
+            task = asyncio.create_task(sampler.run())
+            try:
+                result = await drive(client, convs, a.concurrency, a.think_ms)
+            finally:
+                task.cancel()
+            sampler.sample()
+            return {"result": result, "rss": sampler, "workers": workers()}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def report(a, run: Dict[str, Any], stub: sd_stub.StubState) -> Dict[str, Any]:
+    lat, status, soft_errors, wall = run["result"]
+    s = sorted(lat)
+    sampler: RssSampler = run["rss"]
+    workers = run["workers"] or list(sampler.peak)
+    return {
+        "config": {
+            "mode": a.mode, "workers": a.workers if a.mode == "uvicorn" else 1,
+            "conversations": a.conversations, "concurrency": a.concurrency, "seed": a.seed,
+            "think_ms": a.think_ms, "refresher": not a.no_refresher,
+            "sd": {"latency_ms": a.sd_latency_ms, "jitter_ms": a.sd_jitter_ms, "error_rate": a.sd_error_rate,
+                   "shape": a.sd_shape, "devices": a.sd_devices, "pad_bytes": a.sd_pad_bytes},
+        },
+        "requests": len(lat),
+        "wall_sec": round(wall, 3),
+        "throughput_rps": round(len(lat) / wall, 1) if wall else None,
+        "latency_ms": {q: round(percentile(s, v) * 1000, 3) for q, v in
+                       (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+        "status": {str(k): v for k, v in sorted(status.items(), key=str)},
+        "soft_errors": soft_errors,
+        "rss_mib": {
+            "scope": "worker" if a.mode == "uvicorn" else "process (app + load generator)",
+            "peak": {str(pid): round(sampler.peak.get(pid, 0) / 1024, 1) for pid in workers},
+            "end": {str(pid): round(sampler.last.get(pid, 0) / 1024, 1) for pid in workers},
+        },
+        "sd_stub": stub.stats(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=("inproc", "uvicorn"), default="inproc")
+    ap.add_argument("--workers", type=int, default=1, help="workery uvicorna (--mode uvicorn)")
+    ap.add_argument("--conversations", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=500, help="ile rozmów naraz")
+    ap.add_argument("--max-connections", type=int, default=200, help="pula połączeń klienta HTTP (uvicorn)")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="pauza między wiadomościami rozmowy")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--no-refresher", action="store_true", help="INVENTORY_REFRESHER=false")
+    ap.add_argument("--inventory-ttl", type=float, help="INVENTORY_TTL_SEC dla aplikacji")
+    ap.add_argument("--sd-latency-ms", type=float, default=0.0)
+    ap.add_argument("--sd-jitter-ms", type=float, default=0.0)
+    ap.add_argument("--sd-error-rate", type=float, default=0.0)
+    ap.add_argument("--sd-shape", choices=sd_stub.SHAPES, default="list")
+    ap.add_argument("--sd-devices", type=int, default=500)
+    ap.add_argument("--sd-pad-bytes", type=int, default=0)
+    ap.add_argument("--out", help="zapisz raport jako JSON")
+    a = ap.parse_args()
+
+    srv, stub, sd_base = sd_stub.start(devices=a.sd_devices, latency_ms=a.sd_latency_ms, jitter_ms=a.sd_jitter_ms,
+                                       error_rate=a.sd_error_rate, shape=a.sd_shape, pad_bytes=a.sd_pad_bytes)
+    convs = generate(a.conversations, a.seed)
+    env = app_env(a, sd_base)
+    try:
+        runner = run_inproc if a.mode == "inproc" else run_uvicorn
+        rep = report(a, asyncio.run(runner(a, convs, env)), stub)
+    finally:
+        srv.shutdown()
+
+    lat = rep["latency_ms"]
+    print(f"{rep['config']['mode']} x{rep['config']['workers']}: {rep['requests']} requests "
+          f"({a.conversations} conversations, {a.concurrency} concurrent) in {rep['wall_sec']:.1f} s "
+          f"-> {rep['throughput_rps']:,.0f} req/s")
+    print(f"latency ms: p50 {lat['p50']:.2f}  p95 {lat['p95']:.2f}  p99 {lat['p99']:.2f}  max {lat['max']:.2f}")
+    print(f"status: {rep['status']}  soft errors: {rep['soft_errors']}")
+    print(f"RSS MiB ({rep['rss_mib']['scope']}): peak {rep['rss_mib']['peak']}")
+    print(f"SD stub: {rep['sd_stub']}")
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+        print(f"written {a.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Sprawdza, że klient SD używa puli/keep-alive: N pobrań ze stuba
+powinno otworzyć tylko kilka połączeń TCP (discovery + pula).
+
+    python -m bench.sd_pool_check --fetches 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from bench import sd_stub
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fetches", type=int, default=50)
+    a = ap.parse_args()
+
+    srv, state, base = sd_stub.start(devices=100)
+    os.environ["SD_API_BASE"] = base
+    from app.services import sd_api
+
+    t0 = time.perf_counter()
+    for _ in range(a.fetches):
+        assert sd_api.fetch_devices_raw(), sd_api.get_last_fetch_log()
+    sync_dt = time.perf_counter() - t0
+    sync_conns = state.connections
+    print(f"sync : {a.fetches} fetches, {state.requests} requests, {sync_conns} connections, {sync_dt * 1000 / a.fetches:.2f} ms/fetch")
+
+    async def run_async():
+        t0 = time.perf_counter()
+        for _ in range(a.fetches):
+            assert await sd_api.afetch_devices_raw()
+        dt = time.perf_counter() - t0
+        await sd_api.aclose_clients()
+        return dt
+
+    async_dt = asyncio.run(run_async())
+    async_conns = state.connections - sync_conns
+    print(f"async: {a.fetches} fetches, {async_conns} connections, {async_dt * 1000 / a.fetches:.2f} ms/fetch")
+    srv.shutdown()
+
+    # discovery otwiera max 4 połączenia równolegle; reszta musi iść po keep-alive
+    ok = sync_conns <= 4 and async_conns <= 4
+    print("connection reuse:", "OK" if ok else "FAILED")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
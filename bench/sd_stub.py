@@ -0,0 +1,155 @@
+"""
+Lokalny zamiennik SD API (GET /api/v1/devices itd.) do benchmarków
+i testów obciążeniowych. Da się ustawić:
+  --latency-ms / --jitter-ms — opóźnienie każdej odpowiedzi,
+  --error-rate              — ułamek odpowiedzi 503,
+  --devices / --pad-bytes   — rozmiar payloadu (liczba urządzeń, balast w każdym),
+  --shape                   — list | devices ({"devices": [...]}) | data.items ({"data": {"items": [...]}}).
+
+    python -m bench.sd_stub --port 8765 --devices 500 --latency-ms 200 --error-rate 0.05 --shape data.items
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+PATHS = ("/api/v1/devices", "/api/devices", "/devices", "/api/public/devices")
+
+MODELS = {
+    "android": ["Galaxy S23", "Galaxy S22", "Galaxy A54", "Pixel 7", "Pixel 8 Pro", "OnePlus 11", "Xiaomi 13"],
+    "ios": ["iPhone 13", "iPhone 14", "iPhone 14 Pro", "iPhone 15", "iPhone 15 Pro Max", "iPad Air"],
+}
+VERSIONS = {
+    "android": ["11", "12", "13", "14", "14.0.1"],
+    "ios": ["16.7.2", "17.0", "17.4.1", "17.5", "18.6.1\nProductVersion"],
+}
+
+
+SHAPES = ("list", "devices", "data.items")
+
+
+def make_devices(n: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        plat = rnd.choice(("android", "ios"))
+        out.append({
+            "id": i,
+            "model": rnd.choice(MODELS[plat]),
+            "platform": plat,
+            "version": rnd.choice(VERSIONS[plat]),
+            "group": rnd.choice(({"name": "CLEAN"}, "CLEAN", "TOCLEAN", "RESERVED")),
+            "status": rnd.choice((3, 3, 3, 1)),
+            "ready": rnd.random() > 0.1,
+            "present": rnd.random() > 0.05,
+        })
+    return out
+
+
+def shaped(devices: List[Dict[str, Any]], shape: str) -> Any:
+    if shape == "list":
+        return devices
+    if shape == "devices":
+        return {"devices": devices, "total": len(devices)}
+    if shape == "data.items":
+        return {"data": {"items": devices, "page": 1}, "status": "ok"}
+    raise ValueError(f"unknown shape: {shape!r} (expected one of {SHAPES})")
+
+
+class StubState:
+    def __init__(self, devices: List[Dict[str, Any]], latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, shape: str = "list", pad_bytes: int = 0):
+        if pad_bytes:
+            devices = [dict(d, notes="x" * pad_bytes) for d in devices]
+        self.body = json.dumps(shaped(devices, shape)).encode()
+        self.latency = max(0.0, latency_ms) / 1000.0
+        self.jitter = max(0.0, jitter_ms) / 1000.0
+        self.error_rate = error_rate
+        self.rnd = random.Random(2)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+
+    def delay(self) -> float:
+        with self.lock:
+            return self.latency + (self.rnd.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self.lock:
+            if self.rnd.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "errors": self.errors, "connections": self.connections,
+                "body_bytes": len(self.body)}
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+
+        def do_GET(self):
+            with state.lock:
+                state.requests += 1
+            if self.path.split("?")[0] not in PATHS:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            delay = state.delay()
+            if delay:
+                time.sleep(delay)
+            if state.fail():
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(state.body)))
+            self.end_headers()
+            self.wfile.write(state.body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start(port: int = 0, devices: int = 200, **opts):
+    """Startuje stub w wątku; zwraca (server, state, base_url). opts — jak StubState."""
+    state = StubState(make_devices(devices), **opts)
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="sd-stub", daemon=True).start()
+    return srv, state, f"http://127.0.0.1:{srv.server_port}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--devices", type=int, default=200)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--shape", choices=SHAPES, default="list")
+    ap.add_argument("--pad-bytes", type=int, default=0)
+    a = ap.parse_args()
+    srv, state, base = start(a.port, a.devices, latency_ms=a.latency_ms, jitter_ms=a.jitter_ms,
+                             error_rate=a.error_rate, shape=a.shape, pad_bytes=a.pad_bytes)
+    print(f"SD stub on {base} ({len(state.body)} bytes per response)")
+    srv.serve_forever()
@@ -0,0 +1,137 @@
+"""
+Stres locków sesji (BotEngine.lock_for / handle_message).
+
+  1. przeplot: wiele wątków, każdy prowadzi swoje sesje po kolei, ale tury
+     różnych sesji przeplatają się w jednym BotEngine — stan końcowy każdej
+     sesji musi być identyczny z przebiegiem jednowątkowym,
+  2. kolizja: wiele wątków naraz wysyła wiadomości do tych samych sesji —
+     żadna tura nie może zginąć (turns == liczba wysłanych wiadomości).
+
+Domyślnie na sqlite bez LRU (SESSION_CACHE_SIZE=0): każdy get czyta świeżą
+kopię, więc bez locków zgubione zapisy widać od razu. --unlocked podmienia
+locki na atrapę — wtedy faza 2 pokaże zgubione tury. Poprawność (w małej
+skali) sprawdza tests/test_session_locks.py; tu tylko przepustowość i liczby.
+
+    python -m bench.stress_session_locks --threads 16 --sessions 400
+"""
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.fsm import BotEngine, SessionState
+from app.db.repo import MemorySessionRepo, SqliteSessionRepo
+from bench.bench_validators import CONVERSATION
+
+# na slocie platform nie pasuje nic — każda tura to _bump + ponowne pytanie
+NOISE = "hmm"
+
+
+class _NoLocks:
+    contended = 0
+
+    def lock_for(self, session_id):
+        return contextlib.nullcontext()
+
+    def acquire(self, session_id):
+        return _NoLock()
+
+    def stats(self):
+        return {}
+
+
+class _NoLock:
+    def release(self):
+        pass
+
+
+def make_engine(store: str, tmp: str, unlocked: bool) -> BotEngine:
+    if store == "sqlite":
+        repo = SqliteSessionRepo(os.path.join(tmp, f"stress{time.monotonic_ns()}.db"), SessionState.from_dict, cache_size=0)
+    else:
+        repo = MemorySessionRepo()
+    e = BotEngine(sessions=repo)
+    if unlocked:
+        e.locks = _NoLocks()
+    return e
+
+
+def snapshot(e: BotEngine, sids):
+    out = {}
+    for sid in sids:
+        d = e.sessions.get(sid).to_dict()
+        d.pop("updated_at")
+        out[sid] = json.dumps(d, sort_keys=True)
+    return out
+
+
+def interleaved(e: BotEngine, threads: int, sessions: int):
+    sids = [f"s{i}" for i in range(sessions)]
+    ref = make_engine("memory", "", False)
+    for sid in sids:
+        for msg in CONVERSATION:
+            ref.handle_message(sid, msg)
+
+    def worker(k):
+        mine = sids[k::threads]
+        # tura po turze, na zmianę po wszystkich swoich sesjach
+        for msg in CONVERSATION:
+            for sid in mine:
+                e.handle_message(sid, msg)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(worker, range(threads)))
+    dt = time.perf_counter() - t0
+    got, want = snapshot(e, sids), snapshot(ref, sids)
+    bad = [sid for sid in sids if got[sid] != want[sid]]
+    return dt, len(sids) * len(CONVERSATION), bad
+
+
+def contended(e: BotEngine, threads: int, sessions: int, per_thread: int):
+    sids = [f"hot{i}" for i in range(sessions)]
+    barrier = threading.Barrier(threads)
+
+    def worker(k):
+        barrier.wait()
+        for j in range(per_thread):
+            e.handle_message(sids[(k + j) % sessions], NOISE)
+
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(worker, range(threads)))
+    sent = threads * per_thread
+    turns = sum(e.sessions.get(sid).turns for sid in sids)
+    return sent, turns
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--sessions", type=int, default=400)
+    ap.add_argument("--store", choices=("sqlite", "memory"), default="sqlite")
+    ap.add_argument("--unlocked", action="store_true")
+    a = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        e = make_engine(a.store, tmp, a.unlocked)
+        dt, turns, bad = interleaved(e, a.threads, a.sessions)
+        print(f"interleaved: {turns} turns over {a.sessions} sessions, {a.threads} threads, "
+              f"{turns / dt:,.0f} turns/s, {len(bad)} sessions differ from serial run")
+        e.sessions.close()
+
+        # 4 gorące sesje; MAX_TURNS (40) nie może zresetować sesji w trakcie
+        hot = 4
+        per_thread = max(1, 36 * hot // a.threads)
+        e = make_engine(a.store, tmp, a.unlocked)
+        sent, counted = contended(e, a.threads, hot, per_thread)
+        print(f"contended:   {sent} messages to {hot} sessions, {counted} turns recorded "
+              f"({sent - counted} lost), {e.locks.contended} contended acquires")
+        e.sessions.close()
+
+
+if __name__ == "__main__":
+    main()
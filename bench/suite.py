@@ -0,0 +1,239 @@
+"""
+Zestaw benchmarków gorącej ścieżki silnika rozmów.
+
+Rozmowy z bench.convgen (seed), inwentarz z lokalnego fixture'a
+(bench.sd_stub.make_devices albo --inventory plik.json w formacie SD API),
+bez żadnego I/O. Mierzy:
+  handle_message   — pełna tura BotEngine (repo memory),
+  parse_message    — ekstrakcja slotów,
+  validate_slot    — skompilowane walidatory slotów,
+  suggest_devices  — rekomendacje z indeksu inwentarza,
+  render_summary   — podsumowanie przed potwierdzeniem.
+Etapy 2-5 odtwarzane osobno z wejść nagranych podczas przebiegu tur,
+każde wywołanie mierzone perf_counter: percentyle p50/p90/p99, max,
+średnia i przepustowość.
+
+Wynik w JSON (--out), do porównania między commitami (--compare):
+różnica p50 powyżej --threshold dla któregoś etapu = exit code 1.
+
+    python -m bench.suite --conversations 500 --out bench-$(git rev-parse --short HEAD).json
+    python -m bench.suite --compare bench-abc123.json
+"""
+import os
+
+# rekomendacje włączone, a inwentarz podstawiamy sami — zanim zaimportuje się recommender
+os.environ["RECOMMENDER_ENABLED"] = "true"
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import app.core.fsm as fsm
+import app.services.inventory as inventory
+from app.core.fsm import BotEngine
+from app.core.parsers import parse_message
+from app.services.recommender import suggest_devices
+from app.services.summarizer import render_summary
+from bench.convgen import generate
+from bench.sd_stub import make_devices
+
+STAGES = ("handle_message", "parse_message", "validate_slot", "suggest_devices", "render_summary")
+
+
+def install_inventory(path: Optional[str], devices: int) -> int:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    else:
+        raw = make_devices(devices)
+    snap = inventory._install([inventory._normalize_from_sd(d) for d in raw])
+    # jak przy działającym refresherze: get_snapshot() oddaje bieżący snapshot bez I/O
+    inventory._REFRESHER_ACTIVE = True
+    return len(snap.items)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    n = len(s)
+    if not n:
+        return {"calls": 0}
+    pick = lambda q: s[min(n - 1, int(q * n))]
+    total = sum(s)
+    return {
+        "calls": n,
+        "mean_us": round(total / n * 1e6, 3),
+        "p50_us": round(pick(0.50) * 1e6, 3),
+        "p90_us": round(pick(0.90) * 1e6, 3),
+        "p99_us": round(pick(0.99) * 1e6, 3),
+        "max_us": round(s[-1] * 1e6, 3),
+        "ops_per_sec": round(n / total, 1) if total else None,
+    }
+
+
+class Recorder:
+    """Podmienia funkcje etapów w fsm na nagrywające argumenty (tylko w przebiegu nagrywającym)."""
+
+    def __init__(self, engine: BotEngine):
+        self.engine = engine
+        self.calls: Dict[str, List[tuple]] = {name: [] for name in STAGES[1:]}
+
+    def __enter__(self):
+        calls, engine = self.calls, self.engine
+        self._saved = (fsm.parse_message, fsm.suggest_devices, fsm.render_summary, dict(engine.slots.validators))
+
+        def rec_parse(text, slots, expecting=None):
+            calls["parse_message"].append((text, expecting))
+            return parse_message(text, slots, expecting=expecting)
+
+        def rec_suggest(data):
+            calls["suggest_devices"].append((dict(data),))
+            return suggest_devices(data)
+
+        def rec_render(data, rec):
+            calls["render_summary"].append((dict(data), rec))
+            return render_summary(data, rec)
+
+        def rec_validator(slot, fn):
+            def wrapped(value):
+                calls["validate_slot"].append((slot, value))
+                return fn(value)
+            return wrapped
+
+        fsm.parse_message, fsm.suggest_devices, fsm.render_summary = rec_parse, rec_suggest, rec_render
+        engine.slots.validators.update({k: rec_validator(k, fn) for k, fn in self._saved[3].items()})
+        return self
+
+    def __exit__(self, *exc):
+        fsm.parse_message, fsm.suggest_devices, fsm.render_summary, validators = self._saved
+        self.engine.slots.validators.update(validators)
+
+
+def run_turns(convs: List[List[str]], prefix: str) -> List[float]:
+    engine = BotEngine()
+    lat = []
+    for i, conv in enumerate(convs):
+        sid = f"{prefix}{i}"
+        for msg in conv:
+            t0 = time.perf_counter()
+            engine.handle_message(sid, msg)
+            lat.append(time.perf_counter() - t0)
+    return lat
+
+
+def replay(fn: Callable[..., Any], calls: List[tuple], reps: int) -> List[float]:
+    lat = []
+    clock = time.perf_counter
+    for _ in range(reps):
+        for args in calls:
+            t0 = clock()
+            fn(*args)
+            lat.append(clock() - t0)
+    return lat
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run(conversations: int, seed: int, reps: int, inventory_path: Optional[str], devices: int) -> Dict[str, Any]:
+    n_items = install_inventory(inventory_path, devices)
+    convs = generate(conversations, seed)
+
+    # nagranie wejść etapów (osobny przebieg — nagrywanie nie wlicza się do czasów tur)
+    engine = BotEngine()
+    with Recorder(engine) as rec:
+        for i, conv in enumerate(convs):
+            for msg in conv:
+                engine.handle_message(f"rec{i}", msg)
+    slots, validators = engine.slots, engine.slots.validators
+
+    run_turns(convs[: max(1, conversations // 10)], "warm")
+    t0 = time.perf_counter()
+    turn_lat = run_turns(convs, "run")
+    wall = time.perf_counter() - t0
+
+    stages = {"handle_message": percentiles(turn_lat)}
+    stages["handle_message"]["wall_turns_per_sec"] = round(len(turn_lat) / wall, 1)
+    stages["parse_message"] = percentiles(replay(
+        lambda text, expecting: parse_message(text, slots, expecting=expecting), rec.calls["parse_message"], reps))
+    stages["validate_slot"] = percentiles(replay(
+        lambda slot, value: validators[slot](value), rec.calls["validate_slot"], reps))
+    stages["suggest_devices"] = percentiles(replay(suggest_devices, rec.calls["suggest_devices"], reps))
+    stages["render_summary"] = percentiles(replay(render_summary, rec.calls["render_summary"], reps))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": seed,
+            "conversations": conversations,
+            "turns": len(turn_lat),
+            "replay_reps": reps,
+            "inventory_items": n_items,
+            "inventory_source": inventory_path or f"sd_stub.make_devices({devices})",
+        },
+        "stages": stages,
+    }
+
+
+def compare(base: Dict[str, Any], cur: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    print(f"{'stage':16s} {'base p50':>10s} {'now p50':>10s} {'delta':>8s}   "
+          f"{'base p99':>10s} {'now p99':>10s}")
+    for name in STAGES:
+        b, c = base["stages"].get(name), cur["stages"].get(name)
+        if not b or not c or not b.get("p50_us"):
+            continue
+        delta = c["p50_us"] / b["p50_us"] - 1.0
+        flag = "  REGRESSION" if delta > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:16s} {b['p50_us']:10.2f} {c['p50_us']:10.2f} {delta * 100:+7.1f}%   "
+              f"{b['p99_us']:10.2f} {c['p99_us']:10.2f}{flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--reps", type=int, default=3, help="powtórzenia odtwarzania etapów 2-5")
+    ap.add_argument("--inventory", help="fixture inwentarza: JSON z listą urządzeń w formacie SD API")
+    ap.add_argument("--devices", type=int, default=500, help="rozmiar generowanego fixture'a bez --inventory")
+    ap.add_argument("--out", help="zapisz wynik jako JSON")
+    ap.add_argument("--compare", help="porównaj z wcześniejszym wynikiem JSON")
+    ap.add_argument("--threshold", type=float, default=0.10, help="dopuszczalny wzrost p50 (0.10 = 10%%)")
+    a = ap.parse_args()
+
+    result = run(a.conversations, a.seed, a.reps, a.inventory, a.devices)
+    meta = result["meta"]
+    print(f"commit {meta['commit']}  {meta['conversations']} conversations, {meta['turns']} turns, "
+          f"{meta['inventory_items']} inventory items, seed {meta['seed']}")
+    for name, st in result["stages"].items():
+        print(f"{name:16s} {st['calls']:>8} calls  p50 {st['p50_us']:8.2f}  p90 {st['p90_us']:8.2f}  "
+              f"p99 {st['p99_us']:8.2f}  max {st['max_us']:9.2f} us  {st['ops_per_sec']:>12,.0f} ops/s")
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"written {a.out}")
+    if a.compare:
+        with open(a.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        regressions = compare(base, result, a.threshold)
+        if regressions:
+            print(f"p50 regressed by more than {a.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+
+# limity IP/sesji zdejmujemy przed importem app — testy, które je sprawdzają,
+# budują własne limitery
+os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", "1000000000")
+os.environ.setdefault("RATE_LIMIT_BURST", "1000000000")
+os.environ.setdefault("RATE_LIMIT_SESSION_MAX_REQUESTS", "0")
+os.environ.setdefault("SESSION_STORE", "memory")
+os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
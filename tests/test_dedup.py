@@ -0,0 +1,133 @@
+import itertools
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.api import webhook_tawk
+from app.core.dedup import DedupCache
+
+_SIDS = itertools.count()
+
+
+# ---------- DedupCache ----------
+
+def test_hit_and_miss():
+    c = DedupCache(ttl_sec=10, max_entries=10)
+    assert c.get("s1", "k1", now=0.0) is None
+    c.put("s1", "k1", {"reply": "a"}, now=0.0)
+    assert c.get("s1", "k1", now=1.0) == {"reply": "a"}
+    # klucz jest per sesja
+    assert c.get("s2", "k1", now=1.0) is None
+    assert (c.hits, c.misses) == (1, 2)
+
+
+def test_entry_expires_after_ttl():
+    c = DedupCache(ttl_sec=10, max_entries=10)
+    c.put("s1", "k1", "a", now=0.0)
+    assert c.get("s1", "k1", now=9.9) == "a"
+    assert c.get("s1", "k1", now=10.0) is None
+    # wygasłe zdejmowane przy następnym put
+    c.put("s1", "k2", "b", now=10.0)
+    assert len(c) == 1 and c.evicted_ttl == 1
+
+
+def test_capacity_evicts_oldest():
+    c = DedupCache(ttl_sec=100, max_entries=3)
+    for i in range(5):
+        c.put("s", f"k{i}", i, now=float(i))
+    assert len(c) == 3 and c.evicted_cap == 2
+    assert c.get("s", "k0", now=5.0) is None and c.get("s", "k1", now=5.0) is None
+    assert c.get("s", "k4", now=5.0) == 4
+
+
+def test_put_again_refreshes_position_and_ttl():
+    c = DedupCache(ttl_sec=10, max_entries=2)
+    c.put("s", "a", 1, now=0.0)
+    c.put("s", "b", 2, now=1.0)
+    c.put("s", "a", 3, now=2.0)  # "a" na koniec kolejki
+    c.put("s", "c", 4, now=3.0)  # wypada "b", nie "a"
+    assert c.get("s", "a", now=11.0) == 3
+    assert c.get("s", "b", now=3.0) is None
+
+
+# ---------- webhook ----------
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(webhook_tawk, "_dedup", DedupCache(ttl_sec=600, max_entries=1000))
+    monkeypatch.setattr(webhook_tawk, "_session_limiter", None)
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def sid():
+    return f"t-dedup-{next(_SIDS)}"
+
+
+def _turns(sid):
+    return webhook_tawk.get_engine().sessions.get(sid).turns
+
+
+def _post(client, sid, msg, message_id=None, header=None):
+    body = {"session_id": sid, "message": msg}
+    if message_id is not None:
+        body["message_id"] = message_id
+    headers = {"Idempotency-Key": header} if header is not None else {}
+    r = client.post("/webhook/tawk", json=body, headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_retry_with_same_message_id_does_not_advance_fsm(client, sid):
+    first = _post(client, sid, "android", message_id="m1")
+    assert _post(client, sid, "android", message_id="m1") == first
+    assert _turns(sid) == 1
+    _post(client, sid, "android", message_id="m2")
+    assert _turns(sid) == 2
+
+
+def test_idempotency_key_header(client, sid):
+    first = _post(client, sid, "android", header="h1")
+    assert _post(client, sid, "android", header="h1") == first
+    assert _turns(sid) == 1
+
+
+def test_message_id_wins_over_header(client, sid):
+    _post(client, sid, "android", message_id="m1", header="h1")
+    # ten sam nagłówek, inny message_id — nowa wiadomość
+    _post(client, sid, "android", message_id="m2", header="h1")
+    assert _turns(sid) == 2
+    # ten sam message_id, inny nagłówek — powtórka
+    _post(client, sid, "android", message_id="m2", header="h2")
+    assert _turns(sid) == 2
+
+
+def test_without_key_nothing_is_cached(client, sid):
+    _post(client, sid, "hmm")
+    _post(client, sid, "hmm")
+    assert _turns(sid) == 2
+    assert len(webhook_tawk._dedup) == 0
+
+
+def test_errors_are_not_cached(client, sid, monkeypatch):
+    engine = webhook_tawk.get_engine()
+    handle = engine.handle_message
+    calls = []
+
+    def flaky(session_id, msg):
+        calls.append(msg)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return handle(session_id, msg)
+
+    monkeypatch.setattr(engine, "handle_message", flaky)
+    monkeypatch.setattr(webhook_tawk, "DEV_SOFT_ERRORS", True)
+    failed = _post(client, sid, "android", message_id="m1")
+    assert failed["reply"].startswith("(dev) Error")
+    retried = _post(client, sid, "android", message_id="m1")
+    assert not retried["reply"].startswith("(dev) Error")
+    assert len(calls) == 2
+    # a udana odpowiedź już tak
+    assert _post(client, sid, "android", message_id="m1") == retried
+    assert len(calls) == 2
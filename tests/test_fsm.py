@@ -0,0 +1,76 @@
+"""
+Golden replay FSM: rozmowy z bench.convgen (stały seed) przepuszczone przez
+BotEngine na stałym inwentarzu; odpowiedzi porównujemy z zapisanymi w
+tests/data/fsm_golden.json. Zmiana odpowiedzi bota = świadome przegranie:
+
+    python -m tests.test_fsm
+"""
+import json
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from app.core.fsm import BotEngine
+from app.services import recommender
+from app.services.inventory import InventorySnapshot, _normalize_from_sd
+from app.services.inventory_index import InventoryIndex
+from app.services.model_search import ModelSearchIndex
+from bench.convgen import generate
+from bench.sd_stub import make_devices
+
+GOLDEN = Path(__file__).parent / "data" / "fsm_golden.json"
+SEED = 7
+CONVERSATIONS = 100
+
+
+def _snapshot() -> InventorySnapshot:
+    items = tuple(_normalize_from_sd(d) for d in make_devices(200, seed=SEED))
+    return InventorySnapshot(items=items, version=1, fetched_at=1.0, index=InventoryIndex(items),
+                             models=ModelSearchIndex(d["name"] for d in items if d["available"]))
+
+
+def replay(conversations: List[List[str]]) -> List[List[str]]:
+    engine = BotEngine()
+    return [[engine.handle_message(f"golden-{i}", msg) for msg in conv] for i, conv in enumerate(conversations)]
+
+
+@pytest.fixture
+def inventory(monkeypatch):
+    snap = _snapshot()
+    monkeypatch.setenv("RECOMMENDER_ENABLED", "true")
+    monkeypatch.setattr(recommender, "_snapshot", lambda: snap)
+    return snap
+
+
+def test_golden_replies(inventory):
+    golden = json.loads(GOLDEN.read_text(encoding="utf-8"))
+    assert golden["seed"] == SEED
+    convs = [c["messages"] for c in golden["conversations"]]
+    for conv, want, got in zip(convs, golden["conversations"], replay(convs)):
+        assert len(got) == len(want["replies"])
+        for turn, (expected, reply) in enumerate(zip(want["replies"], got)):
+            assert reply == expected, conv[:turn + 1]
+
+
+def test_golden_messages_match_generator():
+    # zmiana convgen nie może po cichu podmienić korpusu — wtedy przegrywamy plik
+    golden = json.loads(GOLDEN.read_text(encoding="utf-8"))
+    assert [c["messages"] for c in golden["conversations"]] == generate(CONVERSATIONS, seed=SEED)
+
+
+def _record():
+    snap = _snapshot()
+    os.environ.setdefault("SESSION_STORE", "memory")
+    os.environ["RECOMMENDER_ENABLED"] = "true"
+    recommender._snapshot = lambda: snap
+    convs = generate(CONVERSATIONS, seed=SEED)
+    out = {"seed": SEED, "conversations": [{"messages": c, "replies": r} for c, r in zip(convs, replay(convs))]}
+    GOLDEN.parent.mkdir(exist_ok=True)
+    GOLDEN.write_text(json.dumps(out, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+    print(f"recorded {len(convs)} conversations -> {GOLDEN}")
+
+
+if __name__ == "__main__":
+    _record()
@@ -0,0 +1,142 @@
+import pytest
+
+from app.services import inventory, sd_api
+from app.services.sd_api import CircuitBreaker
+
+
+def _dev(name, platform, version, available=True):
+    return {"name": name, "platform": platform, "versions": [version], "available": available}
+
+
+@pytest.fixture
+def clean_inventory(monkeypatch):
+    monkeypatch.setattr(inventory, "_SNAPSHOT", inventory.EMPTY_SNAPSHOT)
+    monkeypatch.setattr(inventory, "_CHECKED_AT", 0.0)
+    monkeypatch.setattr(inventory, "_REFRESHER_ACTIVE", False)
+    return inventory
+
+
+# ---------- circuit breaker ----------
+
+def test_breaker_opens_after_threshold(monkeypatch):
+    monkeypatch.setenv("SD_CB_FAILURES", "3")
+    monkeypatch.setenv("SD_CB_COOLDOWN_SEC", "60")
+    cb = CircuitBreaker()
+    for _ in range(2):
+        assert cb.allow()
+        cb.record(False)
+    assert cb.state == cb.CLOSED
+    assert cb.allow()
+    cb.record(False)
+    assert cb.state == cb.OPEN
+    assert not cb.allow()
+    assert cb.retry_in() > 0
+
+
+def test_breaker_success_resets_failures(monkeypatch):
+    monkeypatch.setenv("SD_CB_FAILURES", "2")
+    cb = CircuitBreaker()
+    cb.record(False)
+    cb.record(True)
+    cb.record(False)
+    assert cb.state == cb.CLOSED and cb.failures == 1
+
+
+def test_breaker_half_open_single_trial(monkeypatch):
+    monkeypatch.setenv("SD_CB_FAILURES", "1")
+    monkeypatch.setenv("SD_CB_COOLDOWN_SEC", "0")
+    cb = CircuitBreaker()
+    cb.record(False)
+    assert cb.state == cb.OPEN
+    assert cb.allow()  # cooldown minął — jedna próba
+    assert cb.state == cb.HALF_OPEN
+    assert not cb.allow()  # druga czeka na wynik pierwszej
+    cb.record(False)
+    assert cb.state == cb.OPEN
+    assert cb.allow()
+    cb.record(True)
+    assert cb.state == cb.CLOSED
+    assert [t["to"] for t in cb.transitions] == ["open", "half_open", "open", "half_open", "closed"]
+
+
+def test_open_breaker_short_circuits_fetch(monkeypatch):
+    monkeypatch.setenv("SD_API_BASE", "http://sd.invalid")
+    cb = CircuitBreaker()
+    cb.opened_at = float("inf")
+    cb.state = cb.OPEN
+    monkeypatch.setattr(sd_api, "_BREAKER", cb)
+    monkeypatch.setattr(sd_api, "_fetch", lambda *a: pytest.fail("fetch while circuit is open"))
+    assert sd_api.fetch_devices_raw() == []
+    assert sd_api.get_last_fetch_log()[-1]["url"] == "<circuit-open>"
+
+
+# ---------- snapshot / indeks ----------
+
+def test_successful_refresh_rebuilds_index(clean_inventory, monkeypatch):
+    monkeypatch.setattr(inventory, "fetch_devices_raw", lambda: [
+        {"model": "Pixel 7", "platform": "android", "version": "Android 14",
+         "status": 3, "group": "CLEAN", "ready": True, "present": True},
+    ])
+    first = inventory.refresh_now()
+    assert first.ok and first.version == 1
+    assert first.index.candidates("Android") == (0,)
+    assert first.models.canonical("pixel 7") == "Pixel 7"
+
+    monkeypatch.setattr(inventory, "fetch_devices_raw", lambda: [
+        {"model": "iPhone 15", "platform": "ios", "version": "17.4",
+         "status": 3, "group": "CLEAN", "ready": True, "present": True},
+    ])
+    second = inventory.refresh_now()
+    assert second.version == 2
+    assert second.index is not first.index
+    assert second.index.candidates("Android") == ()
+    assert second.index.take(second.index.candidates("iOS")) == list(second.items)
+    # stary snapshot (czytany jeszcze przez trwające tury) się nie zmienia
+    assert first.index.candidates("Android") == (0,)
+
+
+def test_failed_refresh_keeps_last_good_snapshot(clean_inventory):
+    good = clean_inventory._install([_dev("Pixel 7", "Android", "Android 14")])
+    failed = clean_inventory._install(None)
+    assert failed.items == good.items
+    assert failed.index is good.index
+    assert failed.version == good.version
+    assert not failed.ok and failed.stale
+    assert clean_inventory.current_snapshot() is failed
+    # kolejna porażka nie tworzy nowego obiektu
+    assert clean_inventory._install(None) is failed
+    # sukces po awarii wraca do ok=True z nowym indeksem
+    recovered = clean_inventory._install([_dev("iPhone 15", "iOS", "iOS 17.4")])
+    assert recovered.ok and recovered.version == good.version + 1
+    assert recovered.index.candidates("iOS") == (0,)
+
+
+def test_index_skips_unavailable_devices(clean_inventory):
+    snap = clean_inventory._install([
+        _dev("Pixel 7", "Android", "Android 14", available=False),
+        _dev("Pixel 8", "Android", "Android 14"),
+    ])
+    assert snap.index.candidates("Android", "Android 14") == (1,)
+    assert list(snap.index.os_match("Android", "Android 14")) == [1]
+
+
+def test_refresher_active_without_data_fetches_synchronously(clean_inventory, monkeypatch):
+    monkeypatch.setattr(inventory, "_REFRESHER_ACTIVE", True)
+    monkeypatch.setattr(inventory, "_load", lambda: [_dev("Pixel 7", "Android", "Android 14")])
+    snap = inventory.get_snapshot()
+    assert snap.ok and len(snap.items) == 1
+    # potem już bez I/O — snapshot odświeża refresher
+    monkeypatch.setattr(inventory, "_load", lambda: pytest.fail("request path did I/O"))
+    assert inventory.get_snapshot() is snap
+
+
+def test_async_install_does_not_overwrite_newer_snapshot(clean_inventory):
+    base = clean_inventory._install([_dev("Pixel 7", "Android", "Android 14")])
+    # async fetch wystartował przy `base`, a w międzyczasie refresh_now() wstawił nowsze dane
+    newer = clean_inventory._install([_dev("Pixel 8", "Android", "Android 14")])
+    raw = [{"model": "Pixel 6", "platform": "android", "version": "Android 13",
+            "status": 3, "group": "CLEAN", "ready": True, "present": True}]
+    assert clean_inventory._install_raw(raw, base.version) is newer
+    assert clean_inventory.current_snapshot() is newer
+    installed = clean_inventory._install_raw(raw, newer.version)
+    assert installed.version == newer.version + 1 and installed.items[0]["name"] == "Pixel 6"
@@ -0,0 +1,67 @@
+import pytest
+
+from app.services.model_search import ModelSearchIndex, key_tokens, normalize_model
+
+NAMES = ["Galaxy Z Fold5 Pro Max", "Galaxy Z Flip5", "Galaxy Z Fold5", "Pixel 7", "Pixel 7 Pro",
+         "iPhone 15", "iPhone 15 Pro", "iPhone 15 Pro Max", "Galaxy S23", "Galaxy S23 Ultra", "Galaxy A23"]
+
+
+@pytest.fixture(scope="module")
+def idx():
+    return ModelSearchIndex(NAMES)
+
+
+def test_normalize_and_key_tokens():
+    assert normalize_model("iphone15pro") == "iphone 15 pro"
+    assert normalize_model("Galaxy-S23 Ultra") == "galaxy s 23 ultra"
+    assert key_tokens("galaxy s 23 ultra") == {"s", "23"}
+
+
+def test_names_deduplicated_first_spelling_wins():
+    idx = ModelSearchIndex(["Pixel 7", "PIXEL 7", "", None, "Pixel 8"])
+    assert idx.names == ["Pixel 7", "Pixel 8"]
+    assert idx.canonical("pixel 7") == "Pixel 7"
+
+
+def test_rank_substring_first_exact_name_on_top(idx):
+    assert idx.rank("pixel 7") == ["pixel 7", "pixel 7 pro"]
+    assert idx.rank("iPhone 15 Pro") == ["iphone 15 pro", "iphone 15 pro max"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("galxy s23", ["galaxy s23"]),
+    ("iphon 15 pro", ["iphone 15 pro"]),
+    ("pixle 7 pro", ["pixel 7 pro"]),
+    ("samsung galaxy z flip 5", ["galaxy z flip5"]),
+    ("apple iphon 15 proo max", ["iphone 15 pro max"]),
+])
+def test_rank_typos(idx, query, expected):
+    assert idx.rank(query) == expected
+
+
+@pytest.mark.parametrize("names, query", [
+    # Flip vs Fold
+    (["Galaxy Z Fold5 Pro Max", "Galaxy Z Fold5"], "samsung galaxy z flip 5"),
+    (["Galaxy Z Flip5"], "galxy z fold 5"),
+    # Pro vs non-Pro
+    (["Pixel 7"], "pixle 7 pro"),
+    (["Pixel 7 Pro"], "pixle 7"),
+    # słowo wariantu musi być znane z jakiejś nazwy w indeksie
+    (["iPhone 15", "Pixel 7 Pro"], "iphon 15 proo"),
+    (["Galaxy S23", "Galaxy S22 Ultra"], "galaxy s23 ultraa"),
+    # inny numer / seria
+    (["Pixel 9"], "pixle 7"),
+    (["Galaxy A23"], "galxy s23"),
+])
+def test_rank_near_misses(names, query):
+    assert ModelSearchIndex(names).rank(query) == []
+
+
+def test_rank_threshold(idx):
+    # sam wspólny numer to za mało
+    assert idx.rank("nokia 15") == []
+
+
+def test_search_containment_finds_model_in_message(idx):
+    hit = idx.canonical("hi, we need two iphone 15 pro max for a week", min_score=0.7, containment=True)
+    assert hit == "iPhone 15 Pro Max"
@@ -0,0 +1,48 @@
+"""
+Golden: skompilowany parse_message vs dawna implementacja (legacy_parse_message
+z bench.bench_parser) na korpusie wiadomości do 2000 znaków.
+"""
+import pytest
+
+from app.core import parsers
+from app.core.parsers import parse_message
+from app.core.slots import Slots
+from app.services.model_search import ModelSearchIndex
+from bench import bench_parser
+from bench.bench_parser import legacy_parse_message, make_corpus
+
+MODELS = ModelSearchIndex(["iPhone 15 Pro", "iPhone 14", "Galaxy S23", "Galaxy S23 Ultra", "Pixel 7 Pro", "Pixel 8"])
+
+
+@pytest.fixture(scope="module")
+def slots():
+    return Slots.load()
+
+
+@pytest.fixture(params=["no-models", "models"])
+def models(request, monkeypatch):
+    idx = MODELS if request.param == "models" else None
+    # obie implementacje czytają indeks modeli przez swój import model_index
+    monkeypatch.setattr(parsers, "model_index", lambda: idx)
+    monkeypatch.setattr(bench_parser, "model_index", lambda: idx)
+    return idx
+
+
+@pytest.mark.parametrize("expecting", [None, "device_model"])
+def test_golden_corpus(slots, models, expecting):
+    for msg in make_corpus(1000):
+        assert parse_message(msg, slots, expecting) == legacy_parse_message(msg, slots, expecting), msg
+
+
+@pytest.mark.parametrize("msg", [
+    "", "android", "I want 2 iphone 15 pro in Germany from 2025-03-01 to 2025-03-10 with SIM, email qa@corp.io",
+    "pineapple", "ſim and KABEL", "Androİd 14", "İPHONE 15", "need 999 phones", "other country",
+    "i don't know", "galxy s23 please", "deutschland tripod case charger",
+])
+def test_golden_edge_messages(slots, models, msg):
+    for expecting in (None, "device_model"):
+        assert parse_message(msg, slots, expecting) == legacy_parse_message(msg, slots, expecting)
+
+
+def test_extractor_built_once_per_slots(slots):
+    assert parsers._extractor(slots) is parsers._extractor(slots)
@@ -0,0 +1,88 @@
+import importlib
+import itertools
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.api import routes
+from app.core.profiling import PROFILER
+
+_SIDS = itertools.count()
+
+
+@pytest.fixture
+def client():
+    # conftest nie ustawia APP_ENV — domyślnie dev, więc /debug jest w aplikacji
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    PROFILER.stop()
+    monkeypatch.setattr(PROFILER, "_session", None)
+    yield PROFILER
+    PROFILER.stop()
+
+
+def _turns(client, n):
+    sid = f"t-profile-{next(_SIDS)}"
+    for msg in ("android", "pixel 7", "3")[:n]:
+        assert client.post("/webhook/tawk", json={"session_id": sid, "message": msg}).status_code == 200
+
+
+def test_cprofile_session_start_report_stop(client, profiler):
+    assert client.get("/debug/profile").status_code == 404
+
+    r = client.post("/debug/profile", params={"mode": "cprofile", "requests": 2, "seconds": 60})
+    assert r.status_code == 200
+    assert r.json()["running"] and r.json()["mode"] == "cprofile"
+    assert client.post("/debug/profile").status_code == 409
+
+    _turns(client, 1)
+    partial = client.get("/debug/profile").json()
+    assert partial["running"] and partial["turns_profiled"] == 1
+
+    _turns(client, 3)
+    # po `requests` turach sesja kończy się sama
+    done = client.get("/debug/profile").json()
+    assert not done["running"] and done["turns_profiled"] == 2 and not profiler.active
+    report = done["report"]
+    assert report["mode"] == "cprofile" and report["total_ms"] > 0
+    assert "parse_message" in report["stages"] and report["hot"]
+
+    stopped = client.delete("/debug/profile", params={"top": 5})
+    assert stopped.status_code == 200 and len(stopped.json()["report"]["hot"]) <= 5
+
+
+def test_sample_session_stopped_early(client, profiler):
+    r = client.post("/debug/profile", params={"mode": "sample", "requests": 100, "seconds": 60, "interval_ms": 1})
+    assert r.status_code == 200 and profiler.active
+    _turns(client, 3)
+    stopped = client.delete("/debug/profile").json()
+    assert not stopped["running"] and stopped["turns_profiled"] == 3 and not profiler.active
+    assert stopped["report"]["mode"] == "sample" and "samples" in stopped["report"]
+    # nowa sesja po zatrzymaniu
+    assert client.post("/debug/profile", params={"requests": 1}).status_code == 200
+
+
+def test_unknown_mode_rejected(client, profiler):
+    assert client.post("/debug/profile", params={"mode": "perf"}).status_code == 422
+    assert not profiler.active
+
+
+def test_debug_router_absent_outside_dev(monkeypatch):
+    monkeypatch.setenv("APP_ENV", "prod")
+    try:
+        prod = importlib.reload(routes).router
+    finally:
+        monkeypatch.undo()
+        importlib.reload(routes)
+    assert not [r.path for r in prod.routes if r.path.startswith("/debug")]
+    app = FastAPI()
+    app.include_router(prod)
+    client = TestClient(app)
+    assert client.post("/debug/profile").status_code == 404
+    assert client.get("/debug/traces").status_code == 404
+    assert client.post("/webhook/tawk", json={"session_id": "t-prod", "message": "android"}).status_code == 200
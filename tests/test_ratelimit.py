@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.core import ratelimit
+from app.core.ratelimit import MemoryRateLimiter, SqliteRateLimiter
+
+
+def _make(kind, tmp_path, monkeypatch, burst=3):
+    if kind == "memory":
+        return MemoryRateLimiter("t", 60, 60, burst)
+    # SQLite < 3.35: bez RETURNING, UPSERT + SELECT w transakcji
+    monkeypatch.setattr(ratelimit, "_SQLITE_RETURNING", kind == "sqlite")
+    return SqliteRateLimiter("t", 60, 60, burst, path=str(tmp_path / "rl.db"))
+
+
+@pytest.fixture(params=["memory", "sqlite", "sqlite-no-returning"])
+def limiter(request, tmp_path, monkeypatch):
+    lim = _make(request.param, tmp_path, monkeypatch)
+    yield lim
+    lim.close()
+
+
+def test_burst_then_refill(limiter):
+    assert [limiter.allow("k", 100.0) for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("other", 100.0)
+    # 1 żeton/s
+    assert limiter.allow("k", 101.0)
+    assert not limiter.allow("k", 101.0)
+    assert (limiter.allowed, limiter.rejected) == (5, 2)
+
+
+def test_take_grants_what_is_in_the_bucket(limiter):
+    assert limiter.take("k", 5, 100.0) == 3
+    assert limiter.take("k", 2, 100.0) == 0
+    # 1,5 żetonu po 1,5 s — wydajemy jeden, pół zostaje
+    assert limiter.take("k", 5, 101.5) == 1
+    assert limiter.allow("k", 102.0)
+    assert limiter.take("k", 0, 200.0) == 0
+    assert (limiter.allowed, limiter.rejected) == (5, 8)
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "sqlite-no-returning"])
+def test_sqlite_concurrent_callers_share_one_bucket(kind, tmp_path, monkeypatch):
+    lim = _make(kind, tmp_path, monkeypatch, burst=50)
+    results = []
+
+    def worker():
+        # każdy wątek ma własne połączenie — jak osobne workery na jednym pliku
+        results.extend(lim.allow("k", 100.0) for _ in range(25))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        lim.close()
+    assert results.count(True) == 50 and len(results) == 100
+
+
+def test_sqlite_aallow_runs_off_the_event_loop(tmp_path):
+    lim = SqliteRateLimiter("t", 60, 60, 3, path=str(tmp_path / "rl.db"))
+    seen = []
+    allow = lim.allow
+    lim.allow = lambda key, now=None: seen.append(threading.get_ident()) or allow(key, now)
+
+    async def run():
+        return threading.get_ident(), [await lim.aallow("k") for _ in range(4)]
+
+    try:
+        loop_thread, results = asyncio.run(run())
+    finally:
+        lim.close()
+    assert results == [True, True, True, False]
+    assert seen and loop_thread not in seen
+
+
+def test_middleware_rejects_over_ip_budget(monkeypatch, tmp_path):
+    lim = SqliteRateLimiter("ip_test", 60, 60, 2, path=str(tmp_path / "rl.db"))
+    monkeypatch.setattr(main, "_ip_limiter", lim)
+    try:
+        client = TestClient(main.app)
+        codes = [client.get("/health").status_code for _ in range(3)]
+    finally:
+        lim.close()
+    assert codes == [200, 200, 429]
@@ -0,0 +1,83 @@
+import pytest
+
+from app.services import recommender
+from app.services.inventory import InventorySnapshot
+from app.services.inventory_index import InventoryIndex
+from app.services.model_search import ModelSearchIndex
+
+ITEMS = (
+    {"name": "iPhone 15", "platform": "iOS", "versions": ["iOS 17.4"], "available": True},
+    {"name": "iPhone 15", "platform": "iOS", "versions": ["iOS 17.5"], "available": True},
+    {"name": "iPhone 14", "platform": "iOS", "versions": ["iOS 17.0"], "available": True},
+    {"name": "iPhone 13", "platform": "iOS", "versions": ["iOS 16.7"], "available": True},
+    {"name": "iPhone 12", "platform": "iOS", "versions": ["iOS 18.1"], "available": True},
+    {"name": "iPhone 11", "platform": "iOS", "versions": ["iOS 15.8"], "available": True},
+    {"name": "Pixel 8", "platform": "Android", "versions": ["Android 14"], "available": True},
+    {"name": "Pixel 7", "platform": "Android", "versions": ["Android 13"], "available": True},
+)
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    snap = InventorySnapshot(items=ITEMS, version=1, fetched_at=1.0, index=InventoryIndex(ITEMS),
+                             models=ModelSearchIndex(d["name"] for d in ITEMS))
+    monkeypatch.setattr(recommender, "_snapshot", lambda: snap)
+    monkeypatch.setenv("SUGGESTION_LIMIT", "3")
+    return snap
+
+
+def _suggest(**payload):
+    payload.setdefault("need_os_version", "Yes")
+    return recommender.suggest_devices(payload)
+
+
+def test_nearest_versions_skip_requested_prefix():
+    idx = InventoryIndex(ITEMS)
+    near = idx.nearest_versions("iOS", "iOS 17", 3)
+    assert all(not v.startswith("iOS 17") for _, v in near)
+    assert [v for _, v in near] == ["iOS 16.7", "iOS 18.1", "iOS 15.8"]
+    # dokładniejszy prefiks: 17.4 wypada, 17.5 i 17.0 to już alternatywy
+    assert [v for _, v in idx.nearest_versions("iOS", "iOS 17.4", 2)] == ["iOS 17.5", "iOS 17.0"]
+
+
+def test_missing_os_offers_nearest_versions(snapshot):
+    out = _suggest(platform="iOS", os_version="iOS 16.2")
+    assert out["status"] == "no_match"
+    assert out["reason"] == "No CLEAN device with iOS 16.2 is available right now."
+    assert [d["versions"][0] for d in out["alternatives"]] == ["iOS 16.7", "iOS 15.8", "iOS 17.0"]
+
+
+def test_missing_os_keeps_model_when_possible(snapshot):
+    out = _suggest(platform="iOS", os_version="iOS 16.2", device_model="iPhone 14")
+    assert out["status"] == "no_match"
+    assert out["reason"] == "No CLEAN device with iOS 16.2 is available right now."
+    assert [(d["name"], d["versions"][0]) for d in out["alternatives"]] == [("iPhone 14", "iOS 17.0")]
+
+
+def test_model_filter_reason_and_other_models_on_requested_os(snapshot):
+    out = _suggest(platform="iOS", os_version="iOS 17", device_model="iPhone 13")
+    assert out["status"] == "no_match"
+    assert out["reason"] == "No available CLEAN units of 'iPhone 13' with iOS 17 right now."
+    alts = out["alternatives"]
+    # inne modele na żądanym OS, po jednym na model
+    assert [d["name"] for d in alts] == ["iPhone 15", "iPhone 14"]
+    assert all(d["versions"][0].startswith("iOS 17") for d in alts)
+
+
+def test_model_filter_with_unknown_model(snapshot):
+    out = _suggest(platform="Android", os_version="Android 14", device_model="Galaxy S23")
+    assert out["reason"] == "No available CLEAN units of 'Galaxy S23' with Android 14 right now."
+    assert [d["name"] for d in out["alternatives"]] == ["Pixel 8"]
+
+
+def test_platform_conflict_has_no_alternatives(snapshot):
+    out = _suggest(platform="iOS", os_version="Android 14")
+    assert out["alternatives"] == []
+    assert out["reason"] == "No CLEAN device with Android 14 is available right now."
+
+
+def test_match_has_no_alternatives(snapshot):
+    out = _suggest(platform="iOS", os_version="iOS 17", device_model="iPhone 14")
+    assert out["status"] == "match"
+    assert [d["name"] for d in out["matches"]] == ["iPhone 14"]
+    assert out["alternatives"] == []
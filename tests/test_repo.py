@@ -0,0 +1,173 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.core.fsm import BotEngine, SessionState
+from app.core.slots import SlotData
+from app.db import repo as repo_mod
+from app.db.repo import SqliteSessionRepo
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+@pytest.fixture
+def open_repos():
+    repos = []
+
+    def make(*args, **kw):
+        r = SqliteSessionRepo(*args, **kw)
+        repos.append(r)
+        return r
+
+    yield make
+    for r in repos:
+        r.close()
+
+
+def _state(turns: int, updated_at: int = None) -> SessionState:
+    s = SessionState(turns=turns)
+    if updated_at is not None:
+        s.updated_at = updated_at
+    return s
+
+
+def test_sqlite_defaults_to_no_lru(db, monkeypatch):
+    monkeypatch.setenv("SESSION_STORE", "sqlite")
+    monkeypatch.setenv("SESSION_DB_PATH", db)
+    monkeypatch.delenv("SESSION_CACHE_SIZE", raising=False)
+    r = repo_mod.make_repo(SessionState.from_dict)
+    try:
+        assert r.stats()["cache_size"] == 0
+    finally:
+        r.close()
+
+
+def test_two_workers_see_each_others_writes(db, open_repos):
+    # dwa procesy na jednym pliku, bez sticky routingu
+    a = open_repos(db, SessionState.from_dict)
+    b = open_repos(db, SessionState.from_dict)
+    a.put("s1", _state(1))
+    a.flush()
+    assert b.get("s1").turns == 1
+    b.put("s1", _state(2))
+    b.flush()
+    assert a.get("s1").turns == 2
+    a.put("s1", _state(3))
+    a.flush()
+    assert b.get("s1").turns == 3
+
+
+
+def test_sweep_evicts_expired_sessions_from_lru(db, open_repos):
+    r = open_repos(db, SessionState.from_dict, cache_size=100, ttl_sec=60)
+    r.put("old", _state(1, updated_at=int(time.time()) - 3600))
+    r.put("fresh", _state(2))
+    r.flush()
+    assert r.get("old").turns == 1  # w LRU
+    assert r.sweep() == 1
+    assert r.get("old") is None
+    assert r.get("fresh").turns == 2
+    assert r.stats()["cached"] == 1 and r.evicted_ttl == 1
+
+
+def test_sweep_keeps_newer_queued_state(db, open_repos):
+    r = open_repos(db, SessionState.from_dict, cache_size=100, ttl_sec=60, flush_ms=60000, batch=1000)
+    r.put("s1", _state(1, updated_at=int(time.time()) - 3600))
+    r.flush()
+    r.put("s1", _state(2))  # nowszy stan jeszcze w kolejce
+    assert r.sweep() == 1
+    assert r.get("s1").turns == 2
+    r.flush()
+    assert len(r) == 1
+
+
+def test_stats_does_not_flush_or_count(db, open_repos, monkeypatch):
+    r = open_repos(db, SessionState.from_dict, flush_ms=60000, batch=1000)
+    r.put("s1", _state(1))
+    r.put("s2", _state(1))
+    monkeypatch.setattr(r, "flush", lambda: pytest.fail("stats() must not flush"))
+    monkeypatch.setattr(r, "_reader", lambda: pytest.fail("stats() must not query the database"))
+    st = r.stats()
+    assert st["live"] == 0  # liczone przy starcie, zapisy jeszcze w kolejce
+    monkeypatch.undo()
+    r.flush()
+    assert r.sweep() == 0  # bez TTL tylko odświeża licznik
+    assert r.stats()["live"] == 2
+
+
+def test_live_count_survives_restart_and_follows_sweep(db, open_repos):
+    r = open_repos(db, SessionState.from_dict, ttl_sec=60)
+    r.put("old", _state(1, updated_at=int(time.time()) - 3600))
+    r.put("fresh", _state(1))
+    r.close()
+    r = open_repos(db, SessionState.from_dict, ttl_sec=60)
+    assert r.stats()["live"] == 2
+    assert r.sweep() == 1
+    assert r.stats()["live"] == 1
+
+
+def test_close_closes_reader_connections_of_other_threads(db):
+    r = SqliteSessionRepo(db, SessionState.from_dict)
+    conns = []
+    # jak sweeper: sweep() w osobnym wątku otwiera własne połączenie
+    t = threading.Thread(target=lambda: conns.append((r.sweep(), r._reader())[1]))
+    t.start()
+    t.join()
+    conns.append(r._reader())
+    assert conns[0] is not conns[1]
+    r.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def _live_state() -> SessionState:
+    # stan z prawdziwej rozmowy: int, lista (accessories), maska validated
+    engine = BotEngine()
+    for msg in ("I want 2 iphone 15 pro in Germany from 2025-03-01 to 2025-03-10 with SIM, email qa@corp.io",
+                "yes", "sim and tripod"):
+        engine.handle_message("rt", msg)
+    return engine.sessions.get("rt")
+
+
+def _assert_same(a: SessionState, b: SessionState):
+    assert b is not a
+    assert not hasattr(b, "__dict__") and isinstance(b.data, SlotData)
+    assert b.to_dict() == a.to_dict()
+    assert dict(b.data.items()) == dict(a.data.items())
+    assert b.validated == a.validated
+
+
+def test_state_round_trips_through_json():
+    s = _live_state()
+    assert s.validated and isinstance(s.data["accessories"], list)
+    d = s.to_dict()
+    _assert_same(s, SessionState.from_dict(json.loads(json.dumps(d))))
+    # to_dict() to kopia — FSM dalej mutuje stan po put()
+    s.data["accessories"].append("Case")
+    assert d["data"]["accessories"] == ["SIM", "Tripod"]
+
+
+def test_from_dict_ignores_unknown_and_defaults_missing():
+    d = _live_state().to_dict()
+    d["from_newer_version"] = 1
+    del d["errors_in_row"]
+    back = SessionState.from_dict(d)
+    assert back.errors_in_row == 0 and back.data["quantity"] == 2
+
+
+def test_state_round_trips_through_sqlite(db, open_repos):
+    s = _live_state()
+    r = open_repos(db, SessionState.from_dict)
+    r.put("rt", s)
+    r.flush()
+    _assert_same(s, r.get("rt"))
+    r.close()
+    # po restarcie — stan czytany z pliku
+    _assert_same(s, open_repos(db, SessionState.from_dict).get("rt"))
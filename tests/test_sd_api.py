@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services import sd_api
+from app.services.sd_api import CircuitBreaker
+
+BASE = "http://sd.test"
+V1 = f"{BASE}/api/v1/devices"
+CLEAN = f"{BASE}/api/public/devices?group=clean"
+
+FULL = [{"model": "Pixel 7"}, {"model": "iPhone 15"}]
+SUBSET = [{"model": "Pixel 7"}]
+
+
+class FakeSD:
+    """Odpowiedzi per URL: (status, body, opóźnienie w s); licznik wywołań."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+
+    def _respond(self, request):
+        url = str(request.url)
+        self.calls.append(url)
+        status, body, _ = self.routes.get(url, (404, None, 0.0))
+        return httpx.Response(status, json=body) if body is not None else httpx.Response(status)
+
+    def handler(self, request):
+        time.sleep(self.routes.get(str(request.url), (0, None, 0.0))[2])
+        return self._respond(request)
+
+    async def ahandler(self, request):
+        await asyncio.sleep(self.routes.get(str(request.url), (0, None, 0.0))[2])
+        return self._respond(request)
+
+
+@pytest.fixture
+def sd(monkeypatch):
+    fake = FakeSD({})
+    monkeypatch.setenv("SD_API_BASE", BASE)
+    monkeypatch.setattr(sd_api, "_WINNER", None)
+    monkeypatch.setattr(sd_api, "_BREAKER", CircuitBreaker())
+    monkeypatch.setattr(sd_api, "_CLIENT", httpx.Client(transport=httpx.MockTransport(fake.handler)))
+    monkeypatch.setattr(sd_api, "_ACLIENT", None)
+    yield fake
+    sd_api._CLIENT.close()
+
+
+def _use_async(monkeypatch, fake):
+    monkeypatch.setattr(sd_api, "_ACLIENT", httpx.AsyncClient(transport=httpx.MockTransport(fake.ahandler)))
+
+
+def test_earlier_candidate_wins_over_faster_subset(sd):
+    sd.routes.update({V1: (200, FULL, 0.1), CLEAN: (200, SUBSET, 0.0)})
+    assert sd_api.fetch_devices_raw() == FULL
+    assert sd_api._WINNER == (BASE, V1)
+
+
+def test_winner_is_memoized(sd):
+    sd.routes.update({V1: (200, FULL, 0.0)})
+    sd_api.fetch_devices_raw()
+    # porzucone próby discovery mogą jeszcze dobiegać w wątkach puli
+    deadline = time.monotonic() + 2.0
+    while len(sd.calls) < len(sd_api._candidates(BASE)) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sd.calls.clear()
+    assert sd_api.fetch_devices_raw() == FULL
+    assert sd.calls == [V1]
+    assert sd_api.get_last_fetch_log()[-1]["note"] == "memoized"
+
+
+def test_rediscovery_after_memoized_url_fails(sd):
+    sd.routes.update({V1: (200, FULL, 0.0)})
+    sd_api.fetch_devices_raw()
+    sd.routes[V1] = (500, None, 0.0)
+    sd.routes[CLEAN] = (200, SUBSET, 0.0)
+    assert sd_api.fetch_devices_raw() == SUBSET
+    assert sd_api._WINNER == (BASE, CLEAN)
+
+
+def test_no_winner_when_all_candidates_fail(sd):
+    assert sd_api.fetch_devices_raw() == []
+    assert sd_api._WINNER is None
+
+
+def test_async_earlier_candidate_wins(sd, monkeypatch):
+    sd.routes.update({V1: (200, FULL, 0.1), CLEAN: (200, SUBSET, 0.0)})
+    _use_async(monkeypatch, sd)
+
+    async def run():
+        try:
+            arr = await sd_api.afetch_devices_raw()
+            # przegrani domknięci przed powrotem z discovery
+            others = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            return arr, others
+        finally:
+            await sd_api._ACLIENT.aclose()
+
+    arr, others = asyncio.run(run())
+    assert arr == FULL and others == []
+    assert sd_api._WINNER == (BASE, V1)
+
+
+def test_async_abandons_slow_later_candidates(sd, monkeypatch):
+    slow = f"{BASE}/devices"
+    sd.routes.update({V1: (200, FULL, 0.0), slow: (200, FULL, 5.0)})
+    _use_async(monkeypatch, sd)
+
+    async def run():
+        try:
+            t0 = time.perf_counter()
+            arr = await sd_api.afetch_devices_raw()
+            return arr, time.perf_counter() - t0
+        finally:
+            await sd_api._ACLIENT.aclose()
+
+    arr, took = asyncio.run(run())
+    assert arr == FULL and took < 2.0
+    assert any(e["url"] == slow and e["note"] == "abandoned (winner found)" for e in sd_api.get_last_fetch_log())
+
+
+def test_empty_200_keeps_breaker_closed(sd, monkeypatch):
+    monkeypatch.setenv("SD_CB_FAILURES", "1")
+    sd.routes.update({V1: (200, [], 0.0)})
+    for _ in range(3):
+        assert sd_api.fetch_devices_raw() == []
+    assert sd_api._BREAKER.state == CircuitBreaker.CLOSED
+    assert sd_api._BREAKER.failures == 0
+
+
+def test_async_empty_200_keeps_breaker_closed(sd, monkeypatch):
+    monkeypatch.setenv("SD_CB_FAILURES", "1")
+    sd.routes.update({V1: (200, [], 0.0)})
+    _use_async(monkeypatch, sd)
+
+    async def run():
+        try:
+            return await sd_api.afetch_devices_raw()
+        finally:
+            await sd_api._ACLIENT.aclose()
+
+    assert asyncio.run(run()) == []
+    assert sd_api._BREAKER.state == CircuitBreaker.CLOSED
+
+
+def test_errors_still_open_breaker(sd, monkeypatch):
+    monkeypatch.setenv("SD_CB_FAILURES", "1")
+    sd.routes.update({V1: (500, None, 0.0)})
+    assert sd_api.fetch_devices_raw() == []
+    assert sd_api._BREAKER.state == CircuitBreaker.OPEN
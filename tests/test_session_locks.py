@@ -0,0 +1,85 @@
+"""
+Współbieżne tury tej samej sesji (BotEngine.lock_for): na sqlite bez LRU
+każdy get czyta świeżą kopię, więc zgubiony zapis od razu zaniża `turns`.
+Pomocnicze przebiegi z bench.stress_session_locks w małej skali.
+"""
+import threading
+import time
+
+import pytest
+
+from app.core.locks import StripedLocks
+from bench.stress_session_locks import contended, interleaved, make_engine
+
+
+def _slow_get(e):
+    # poszerza okno get -> put, żeby wyścig wyszedł także na jednym rdzeniu
+    get = e.sessions.get
+
+    def slow(sid):
+        s = get(sid)
+        time.sleep(0.001)
+        return s
+
+    e.sessions.get = slow
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def engine(request, tmp_path):
+    e = make_engine(request.param, str(tmp_path), unlocked=False)
+    yield e
+    e.sessions.close()
+
+
+def test_same_session_from_many_threads_loses_no_turns(engine):
+    _slow_get(engine)
+    # 2 gorące sesje; MAX_TURNS (40) nie może zresetować sesji w trakcie
+    sent, counted = contended(engine, threads=8, sessions=2, per_thread=8)
+    assert counted == sent == 64
+
+
+def test_without_locks_turns_are_lost(tmp_path):
+    # kontrola: ten sam przebieg bez locków gubi zapisy, więc test wyżej coś sprawdza
+    e = make_engine("sqlite", str(tmp_path), unlocked=True)
+    _slow_get(e)
+    try:
+        sent, counted = contended(e, threads=8, sessions=2, per_thread=8)
+    finally:
+        e.sessions.close()
+    assert counted < sent
+
+
+def test_interleaved_sessions_match_serial_run(engine):
+    _, turns, bad = interleaved(engine, threads=4, sessions=20)
+    assert turns == 20 * 12
+    assert bad == []
+
+
+def test_lock_is_reentrant_per_session():
+    locks = StripedLocks(4)
+    assert locks.lock_for("s1") is locks.lock_for("s1")
+    with locks.lock_for("s1"):
+        # batch trzyma lock sesji i woła handle_message, które bierze go ponownie
+        lock = locks.acquire("s1")
+        lock.release()
+    assert locks.contended == 0
+
+
+def test_contended_acquire_waits_and_is_counted():
+    locks = StripedLocks(1)
+    held = threading.Event()
+    release = threading.Event()
+
+    def holder():
+        with locks.lock_for("a"):
+            held.set()
+            release.wait(5)
+
+    t = threading.Thread(target=holder)
+    t.start()
+    held.wait(5)
+    threading.Timer(0.05, release.set).start()
+    lock = locks.acquire("b")  # ten sam pasek (1 stripe) — musi poczekać
+    lock.release()
+    t.join(5)
+    assert locks.contended == 1
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.main import SizeLimitMiddleware
+
+LIMIT = 1024
+
+
+@pytest.fixture(autouse=True)
+def small_limit(monkeypatch):
+    monkeypatch.setattr(main, "MAX_BODY_BYTES", LIMIT)
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _chunks(total: int, size: int = 100):
+    # generator bez długości — httpx wysyła Transfer-Encoding: chunked
+    body = json.dumps({"session_id": "t-size", "message": "x" * total}).encode()
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def test_content_length_over_limit(client):
+    r = client.post("/webhook/tawk", json={"session_id": "t-size", "message": "x" * (2 * LIMIT)})
+    assert r.status_code == 413
+    assert r.json() == {"detail": "Payload too large"}
+
+
+def test_chunked_body_over_limit(client):
+    r = client.post("/webhook/tawk", content=_chunks(2 * LIMIT), headers={"content-type": "application/json"})
+    assert r.status_code == 413
+
+
+def test_chunked_body_under_limit_passes(client):
+    r = client.post("/webhook/tawk", content=_chunks(LIMIT // 4), headers={"content-type": "application/json"})
+    assert r.status_code == 200
+
+
+def _run_raw(messages, headers=()):
+    """SizeLimitMiddleware nad surową aplikacją ASGI, która czyta całe body."""
+    seen = {"called": False, "body": b""}
+
+    async def app(scope, receive, send):
+        seen["called"] = True
+        while True:
+            message = await receive()
+            seen["body"] += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    sent = []
+    pending = list(messages)
+
+    async def receive():
+        return pending.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": list(headers)}
+    asyncio.run(SizeLimitMiddleware(app)(scope, receive, send))
+    return sent[0]["status"], seen
+
+
+def test_raw_app_content_length_rejected_before_reading():
+    status, seen = _run_raw([{"type": "http.request", "body": b"x"}],
+                            headers=[(b"content-length", str(LIMIT + 1).encode())])
+    assert status == 413 and not seen["called"]
+
+
+def test_raw_app_chunked_body_over_limit():
+    chunk = b"x" * (LIMIT // 2)
+    status, seen = _run_raw([{"type": "http.request", "body": chunk, "more_body": True}] * 3
+                            + [{"type": "http.request", "body": b""}])
+    assert status == 413
+    # czytanie przerwane na pierwszym chunku ponad limit
+    assert len(seen["body"]) <= LIMIT
+
+
+def test_raw_app_chunked_body_at_limit():
+    chunk = b"x" * (LIMIT // 2)
+    status, seen = _run_raw([{"type": "http.request", "body": chunk, "more_body": True},
+                             {"type": "http.request", "body": chunk}])
+    assert status == 200 and len(seen["body"]) == LIMIT
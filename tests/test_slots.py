@@ -0,0 +1,76 @@
+import hashlib
+import marshal
+import sys
+
+import pytest
+
+from app.core import slots
+from app.core.slots import _read_schema, _schema_cache_path
+
+SCHEMA = "order: [platform, quantity]\ndefinitions:\n  platform: {type: enum, values: [Android, iOS]}\n"
+EDITED = "order: [platform]\ndefinitions:\n  platform: {type: enum, values: [Android]}\n"
+
+
+class _NoYaml:
+    """Podstawiany za PyYAML — trafienie w cache nie może parsować."""
+
+    @staticmethod
+    def safe_load(raw):
+        raise AssertionError("YAML parsed despite a valid cache")
+
+
+@pytest.fixture
+def schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(slots, "SCHEMA_CACHE", True)
+    p = tmp_path / "slots.yaml"
+    p.write_text(SCHEMA, encoding="utf-8")
+    return p
+
+
+def _without_yaml(monkeypatch):
+    monkeypatch.setitem(sys.modules, "yaml", _NoYaml)
+
+
+def test_cache_written_then_used(schema, monkeypatch):
+    first = _read_schema(schema)
+    assert first["order"] == ["platform", "quantity"]
+    assert _schema_cache_path(schema).exists()
+    _without_yaml(monkeypatch)
+    assert _read_schema(schema) == first
+
+
+def test_edited_schema_rebuilds_cache(schema, monkeypatch):
+    _read_schema(schema)
+    old = _schema_cache_path(schema).read_bytes()
+    schema.write_text(EDITED, encoding="utf-8")
+    edited = _read_schema(schema)
+    assert edited["order"] == ["platform"]
+    assert _schema_cache_path(schema).read_bytes() != old
+    # nowy artefakt trafia przy następnym odczycie
+    _without_yaml(monkeypatch)
+    assert _read_schema(schema) == edited
+
+
+@pytest.mark.parametrize("garbage", [b"", b"\x00not marshal", marshal.dumps("just a string"),
+                                     marshal.dumps((b"wrong digest", {"order": ["stale"]}))])
+def test_corrupt_or_stale_cache_falls_back_to_parsing(schema, garbage):
+    cache = _schema_cache_path(schema)
+    cache.parent.mkdir()
+    cache.write_bytes(garbage)
+    assert _read_schema(schema)["order"] == ["platform", "quantity"]
+    # i naprawia artefakt
+    digest, y = marshal.loads(cache.read_bytes())
+    assert digest == hashlib.sha256(schema.read_bytes()).digest() and y["order"] == ["platform", "quantity"]
+
+
+def test_unmarshalable_schema_is_not_cached(schema):
+    # data z YAML to datetime.date — marshal jej nie zapisze, parsujemy co raz
+    schema.write_text(SCHEMA + "since: 2025-01-01\n", encoding="utf-8")
+    assert str(_read_schema(schema)["since"]) == "2025-01-01"
+    assert not _schema_cache_path(schema).exists()
+
+
+def test_cache_disabled(schema, monkeypatch):
+    monkeypatch.setattr(slots, "SCHEMA_CACHE", False)
+    assert _read_schema(schema)["order"] == ["platform", "quantity"]
+    assert not _schema_cache_path(schema).exists()
@@ -0,0 +1,75 @@
+import itertools
+from collections import deque
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.core import tracing
+
+_SIDS = itertools.count()
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    # conftest wyłącza próbkowanie (TRACE_SAMPLE_RATE=0) — tu śledzimy każdą turę
+    monkeypatch.setattr(tracing, "SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "_RING", deque(maxlen=tracing.BUFFER_SIZE))
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _sid():
+    return f"t-trace-{next(_SIDS)}"
+
+
+def _names(node):
+    yield node["name"]
+    for child in node.get("children", ()):
+        yield from _names(child)
+
+
+def test_webhook_turn_is_traced_and_queryable_by_session(client, traced):
+    sid, other = _sid(), _sid()
+    for s, msg in ((sid, "android"), (other, "ios"), (sid, "pixel 7")):
+        assert client.post("/webhook/tawk", json={"session_id": s, "message": msg}).status_code == 200
+
+    body = client.get("/debug/traces", params={"session_id": sid}).json()
+    assert body["sample_rate"] == 1.0 and body["stored"] == 3
+    traces = body["traces"]
+    assert [t["session_id"] for t in traces] == [sid, sid]
+    # najnowsze pierwsze
+    assert traces[0]["trace_id"] > traces[1]["trace_id"]
+    turn = traces[0]
+    assert turn["name"] == "webhook.turn" and turn["duration_ms"] >= 0
+    assert "handle_message" in _names(turn) and "parse_message" in _names(turn)
+
+    assert len(client.get("/debug/traces", params={"limit": 2}).json()["traces"]) == 2
+
+
+def test_dedup_hit_is_marked(client, traced):
+    sid = _sid()
+    item = {"session_id": sid, "message": "android", "message_id": "m1"}
+    client.post("/webhook/tawk", json=item)
+    client.post("/webhook/tawk", json=item)
+    retry, first = tracing.recent(sid)
+    assert retry["attrs"]["dedup"] == "hit" and "children" not in retry
+    assert "dedup" not in first.get("attrs", {})
+
+
+def test_nothing_recorded_when_not_sampled(client, traced, monkeypatch):
+    monkeypatch.setattr(tracing, "SAMPLE_RATE", 0.0)
+    sid = _sid()
+    client.post("/webhook/tawk", json={"session_id": sid, "message": "android"})
+    assert tracing.recent(sid) == [] and tracing.stats()["stored"] == 0
+
+
+def test_ring_buffer_keeps_latest(traced, monkeypatch):
+    monkeypatch.setattr(tracing, "_RING", deque(maxlen=3))
+    for i in range(5):
+        with tracing.trace("t", session_id=f"s{i}"):
+            pass
+    assert [t["session_id"] for t in tracing.recent()] == ["s4", "s3", "s2"]
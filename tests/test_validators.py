@@ -0,0 +1,33 @@
+"""
+Golden: walidatory kompilowane w Slots.load vs dawne validate_slot
+(legacy_validate_slot z bench.bench_validators) — na wywołaniach nagranych
+z pełnych rozmów i na wartościach brzegowych.
+"""
+import pytest
+
+from app.core.fsm import BotEngine
+from bench.bench_validators import EDGE_CASES, legacy_validate_slot, record
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return BotEngine()
+
+
+def test_recorded_conversation_covers_all_slots(engine):
+    calls = record(engine, 3)
+    last = engine.sessions.get("s2")
+    assert last.current_slot == "confirm" and last.data.get("os_version") == "Android 14"
+    assert {slot for slot, _ in calls} >= {"platform", "device_model", "quantity", "rental_dates",
+                                           "location", "os_version", "contact_email"}
+
+
+def test_golden_recorded_calls(engine):
+    compiled = engine.slots.validators
+    for slot, value in record(engine, 20):
+        assert compiled[slot](value) == legacy_validate_slot(slot, value, engine.slots), (slot, value)
+
+
+@pytest.mark.parametrize("slot, value", EDGE_CASES)
+def test_golden_edge_cases(engine, slot, value):
+    assert engine.slots.validators[slot](value) == legacy_validate_slot(slot, value, engine.slots)
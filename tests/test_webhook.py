@@ -0,0 +1,117 @@
+import itertools
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.api import webhook_tawk
+from app.core.dedup import DedupCache
+from app.core.ratelimit import MemoryRateLimiter
+
+BURST = 10
+_SIDS = itertools.count()
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def sid():
+    return f"t-webhook-{next(_SIDS)}"
+
+
+@pytest.fixture
+def session_limiter(monkeypatch):
+    # 30/min, burst 10 — jak w przykładzie RATE_LIMIT_SESSION_* (domyślnie limit per sesja wyłączony)
+    lim = MemoryRateLimiter("session_test", 30, 60, BURST)
+    monkeypatch.setattr(webhook_tawk, "_session_limiter", lim)
+    return lim
+
+
+@pytest.fixture
+def dedup(monkeypatch):
+    cache = DedupCache(ttl_sec=600, max_entries=1000)
+    monkeypatch.setattr(webhook_tawk, "_dedup", cache)
+    return cache
+
+
+def _batch(client, sid, n, prefix="m"):
+    items = [{"session_id": sid, "message": "hmm", "message_id": f"{prefix}{i}"} for i in range(n)]
+    r = client.post("/webhook/tawk/batch", json=items)
+    assert r.status_code == 200
+    return r.json()["results"]
+
+
+def test_single_webhook_is_rate_limited_per_session(client, sid, session_limiter, dedup):
+    codes = [client.post("/webhook/tawk", json={"session_id": sid, "message": "hmm"}).status_code
+             for _ in range(BURST + 1)]
+    assert codes == [200] * BURST + [429]
+
+
+def test_batch_is_charged_per_item(client, sid, session_limiter, dedup):
+    results = _batch(client, sid, BURST + 6)
+    # jak BURST + 6 osobnych webhooków: batch nie omija limitu sesji
+    assert all("reply" in r for r in results[:BURST]), results
+    assert results[BURST:] == [{"error": "Too many requests", "status": 429}] * 6
+    assert session_limiter.allowed == BURST and session_limiter.rejected == 6
+
+
+def test_batch_group_rejected_when_session_bucket_empty(client, sid, session_limiter, dedup):
+    for _ in range(BURST):
+        assert session_limiter.allow("sid:" + sid)
+    results = _batch(client, sid, 3)
+    assert results == [{"error": "Too many requests", "status": 429}] * 3
+
+
+def test_batch_retry_served_from_dedup_without_a_token(client, sid, session_limiter, dedup):
+    first = _batch(client, sid, 4)
+    for _ in range(BURST):
+        session_limiter.allow("sid:" + sid)
+    # pusty kubełek, ale wszystkie elementy to powtórki — odpowiedzi z cache
+    assert _batch(client, sid, 4) == first
+
+
+def test_batch_groups_are_charged_separately(client, session_limiter, dedup):
+    a, b = f"t-webhook-{next(_SIDS)}", f"t-webhook-{next(_SIDS)}"
+    items = [{"session_id": s, "message": "hmm", "message_id": f"{s}-{i}"} for i in range(6) for s in (a, b)]
+    results = client.post("/webhook/tawk/batch", json=items).json()["results"]
+    assert all("reply" in r for r in results)
+    assert session_limiter.allowed == 12
+
+
+def test_batch_duplicate_message_id_charged_once(client, sid, session_limiter, dedup):
+    items = [{"session_id": sid, "message": "hmm", "message_id": "same"}] * 3
+    results = client.post("/webhook/tawk/batch", json=items).json()["results"]
+    assert results[0] == results[1] == results[2] and "reply" in results[0]
+    assert session_limiter.allowed == 1
+
+
+def test_batch_charges_ip_limit_per_item(client, sid, monkeypatch):
+    ip = MemoryRateLimiter("ip_batch_test", 60, 60, 5)
+    monkeypatch.setattr(main, "_ip_limiter", ip)
+    results = _batch(client, sid, 8)
+    # 1 żeton za request (middleware) + 4 za kolejne elementy
+    assert all("reply" in r for r in results[:5]), results
+    assert results[5:] == [{"error": "Too many requests", "status": 429}] * 3
+    assert ip.allowed == 5 and ip.rejected == 3
+    assert client.get("/health").status_code == 429
+
+
+def test_batch_invalid_item_fails_alone(client, sid):
+    items = [{"session_id": sid, "message": "hmm"}, {"session_id": sid}, "nope",
+             {"session_id": sid, "message": "x" * 3000}, {"session_id": sid, "message": "android"}]
+    r = client.post("/webhook/tawk/batch", json=items)
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert "reply" in results[0] and "reply" in results[4]
+    for bad, field in ((1, "message"), (2, None), (3, "message")):
+        assert results[bad]["status"] == 422
+        if field:
+            assert results[bad]["error"][0]["loc"] == [field]
+
+
+def test_batch_too_many_items(client, sid):
+    r = client.post("/webhook/tawk/batch", json=[{"session_id": sid, "message": "hmm"}] * (webhook_tawk.BATCH_MAX + 1))
+    assert r.status_code == 413